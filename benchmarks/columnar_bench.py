@@ -0,0 +1,102 @@
+"""
+Output format benchmark on a synthetic inventory: JSON + CSV (StreamingWriter) against
+the columnar output.scol (ColumnarWriter). Reports write time, size on disk and load time.
+
+    python -m benchmarks.columnar_bench [--rows N]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from contextlib import redirect_stdout
+from output.writer import StreamingWriter
+from output.columnar import ColumnarWriter, ColumnarReader
+
+REGIONS = ["us-east-1", "us-east-2", "us-west-2", "eu-west-1", "eu-central-1", "ap-southeast-1", "ap-northeast-1"]
+INSTANCE_TYPES = ["t3.micro", "t3.large", "m5.large", "m5.xlarge", "c5.2xlarge", "r5.large", "m6i.4xlarge"]
+
+
+def make_rows(count, accounts=2000, seed=0):
+    rng = random.Random(seed)
+    account_ids = [str(100000000000 + i * 7919) for i in range(accounts)]
+    for _ in range(count):
+        row = {"account_id": rng.choice(account_ids), "region": rng.choice(REGIONS)}
+        roll = rng.random()
+        if roll < 0.5:
+            row.update(resource="ec2", instance_type=rng.choice(INSTANCE_TYPES))
+        elif roll < 0.85:
+            row.update(resource="ebs", ebs_state=rng.choice(["in-use", "available"]),
+                       ebs_size_gb=rng.choice([8, 20, 100, 500]), ebs_type=rng.choice(["gp2", "gp3", "io1"]))
+        elif roll < 0.98:
+            row.update(resource="lambda", function_memory_mb=rng.choice([128, 256, 512, 1024]))
+        else:
+            row.update(resource="s3_bucket", bucket_size_gb=round(rng.random() * 1000, 3),
+                       bucket_doc_num=rng.randint(0, 10 ** 7), bucket_size_gb_by_class={})
+        yield row
+
+
+def _size(*paths):
+    return sum(os.path.getsize(p) for p in paths) / 1024 ** 2
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="columnar-bench-") as work_dir, open(os.devnull, "w") as devnull:
+        def write_json_csv():
+            writer = StreamingWriter(output_dir=work_dir)
+            writer.write(make_rows(args.rows))
+            with redirect_stdout(devnull):
+                writer.close()
+
+        def write_columnar():
+            writer = ColumnarWriter(output_dir=work_dir)
+            writer.write(make_rows(args.rows))
+            with redirect_stdout(devnull):
+                writer.close()
+
+        json_path, csv_path = os.path.join(work_dir, "output.json"), os.path.join(work_dir, "output.csv")
+        scol_path = os.path.join(work_dir, "output.scol")
+        generate, _ = _timed(lambda: sum(1 for _ in make_rows(args.rows)))
+        write_plain, _ = _timed(write_json_csv)
+        write_scol, _ = _timed(write_columnar)
+
+        def load_json():
+            with open(json_path, "r", encoding="utf-8") as f:
+                return len(json.load(f))
+
+        def load_csv():
+            with open(csv_path, "r", encoding="utf-8") as f:
+                return sum(1 for _ in csv.DictReader(f))
+
+        load_json_s, _ = _timed(load_json)
+        load_csv_s, _ = _timed(load_csv)
+        reader = ColumnarReader(scol_path)
+        load_rows_s, _ = _timed(lambda: sum(1 for _ in reader.rows()))
+        load_columns_s, _ = _timed(lambda: reader.read(["account_id", "region", "resource", "instance_type"]))
+        load_encoded_s, _ = _timed(lambda: reader.read_encoded("resource"))
+
+        print(f"{args.rows} rows ({generate:.2f}s to generate, included in write times)")
+        print(f"{'format':<34}{'write s':>10}{'size MiB':>10}{'load s':>10}")
+        print(f"{'JSON + CSV':<34}{write_plain:>10.2f}{_size(json_path, csv_path):>10.1f}{'':>10}")
+        print(f"{'  json.load(output.json)':<34}{'':>10}{_size(json_path):>10.1f}{load_json_s:>10.2f}")
+        print(f"{'  csv.DictReader(output.csv)':<34}{'':>10}{_size(csv_path):>10.1f}{load_csv_s:>10.2f}")
+        print(f"{'columnar (output.scol)':<34}{write_scol:>10.2f}{_size(scol_path):>10.1f}{'':>10}")
+        print(f"{'  rows()':<34}{'':>10}{'':>10}{load_rows_s:>10.2f}")
+        print(f"{'  read(4 key columns)':<34}{'':>10}{'':>10}{load_columns_s:>10.2f}")
+        print(f"{'  read_encoded(resource)':<34}{'':>10}{'':>10}{load_encoded_s:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Cost estimation benchmark on a synthetic inventory: the pure-Python row loop against the
+vectorized NumPy engine. Rows are written to a temporary output.scol first; load and
+compute times are reported separately. '--scale K' also prices the loaded columns tiled
+K times with the vectorized engine, to show it on tens of millions of rows.
+
+    python -m benchmarks.cost_estimate_bench [--rows N] [--scale K]
+"""
+import argparse
+import os
+import tempfile
+import time
+from contextlib import redirect_stdout
+from benchmarks.columnar_bench import make_rows
+from output.columnar import ColumnarWriter, ColumnarReader
+from utils import cost_estimate
+from utils.pricing import PricingTable
+
+
+def _timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def _tile(loaded, times):
+    num_rows, encoded, numbers = loaded
+    np = cost_estimate.np
+    return (num_rows * times,
+            {name: (dictionary, np.tile(codes, times)) for name, (dictionary, codes) in encoded.items()},
+            {name: np.tile(values, times) for name, values in numbers.items()})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--scale", type=int, default=20,
+                        help="Also price the loaded columns repeated this many times (vectorized engine only).")
+    args = parser.parse_args()
+    pricing = PricingTable()
+
+    with tempfile.TemporaryDirectory(prefix="cost-bench-") as work_dir, open(os.devnull, "w") as devnull:
+        writer = ColumnarWriter(output_dir=work_dir)
+        writer.write(make_rows(args.rows))
+        with redirect_stdout(devnull):
+            writer.close()
+
+        print(f"{args.rows} rows")
+        print(f"{'engine':<40}{'load s':>10}{'price s':>10}{'rows/s':>14}{'total $/month':>18}")
+        load_s, rows = _timed(lambda: list(ColumnarReader(writer.path).rows()))
+        price_s, reference = _timed(lambda: cost_estimate.estimate_rows_python(rows, pricing))
+        print(f"{'pure Python loop':<40}{load_s:>10.2f}{price_s:>10.2f}{args.rows / price_s:>14,.0f}"
+              f"{reference.total:>18,.2f}")
+        del rows
+
+        if not cost_estimate.vectorized_available():
+            print("numpy is not installed; skipping the vectorized engine.")
+            return
+        load_s, loaded = _timed(lambda: cost_estimate._load_columnar(writer.path, pricing))
+        price_s, estimate = _timed(lambda: cost_estimate.estimate_columns(*loaded, pricing))
+        print(f"{'vectorized (NumPy)':<40}{load_s:>10.2f}{price_s:>10.2f}{args.rows / price_s:>14,.0f}"
+              f"{estimate.total:>18,.2f}")
+        for level in cost_estimate.LEVELS:
+            if estimate.by(level) != reference.by(level):
+                print(f"  warning: {level} roll-up differs from the pure-Python result")
+
+        if args.scale > 1:
+            tiled = _tile(loaded, args.scale)
+            del loaded
+            price_s, estimate = _timed(lambda: cost_estimate.estimate_columns(*tiled, pricing))
+            label = f"vectorized, {tiled[0]:,} rows"
+            print(f"{label:<40}{'':>10}{price_s:>10.2f}{tiled[0] / price_s:>14,.0f}{estimate.total:>18,.2f}")
+
+
+if __name__ == "__main__":
+    main()
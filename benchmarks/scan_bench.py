@@ -0,0 +1,196 @@
+"""
+End-to-end scan benchmark against a simulated organization (no AWS access needed).
+
+Runs the full main() path (account discovery, AssumeRole, every collector and the
+output writer) in a temporary directory and reports wall time, API calls, throttles,
+peak RSS and output size. Each run is appended to benchmarks/results/scan_bench.jsonl
+together with the current commit, and --compare shows the change against the last
+run with the same settings.
+
+    python -m benchmarks.scan_bench --accounts 1000 --latency-ms 20 --compare -- --engine async --workers 256
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from benchmarks.simulated_org import SimulationConfig, SimulatedOrganization, RUNNER_ACCESS_KEY
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_PATH = os.path.join(REPO_DIR, "benchmarks", "results", "scan_bench.jsonl")
+COMPARED_METRICS = ["wall_seconds", "api_calls", "throttles", "peak_rss_mb", "output_bytes", "rows"]
+
+
+def _git_commit():
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                                         stderr=subprocess.DEVNULL, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             cwd=REPO_DIR, stderr=subprocess.DEVNULL, text=True).strip())
+        return commit + ("-dirty" if dirty else "")
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _output_stats(output_dir):
+    size = 0
+    rows = 0
+    for name in os.listdir(output_dir):
+        path = os.path.join(output_dir, name)
+        if os.path.isfile(path):
+            size += os.path.getsize(path)
+        if name == "output.csv":
+            with open(path, "r", encoding="utf-8") as f:
+                rows = sum(1 for _ in f) - 1
+    return size, rows
+
+
+def run_scan(config, main_args, verbose=False):
+    """Runs main() against a simulated organization and returns the measured metrics."""
+    simulation = SimulatedOrganization(config)
+    os.environ.update({
+        "AWS_ACCESS_KEY_ID": RUNNER_ACCESS_KEY,
+        "AWS_SECRET_ACCESS_KEY": "simulated",
+        "AWS_DEFAULT_REGION": "us-east-1",
+    })
+    for name in ("AWS_SESSION_TOKEN", "AWS_PROFILE"):
+        os.environ.pop(name, None)
+
+    previous_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="scan-bench-") as work_dir:
+        os.chdir(work_dir)
+        sys.path.insert(0, REPO_DIR)
+        simulation.install()
+        try:
+            import main
+            if not verbose:
+                main.logger.setLevel(logging.WARNING)
+                for name in ("botocore", "boto3"):
+                    logging.getLogger(name).setLevel(logging.WARNING)
+            sys.argv = ["main.py"] + list(main_args)
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(sys.stdout if verbose else open(os.devnull, "w")):
+                main.main()
+            wall = time.perf_counter() - start
+            output_bytes, rows = _output_stats(os.path.join(work_dir, "output"))
+            calls, throttles = dict(simulation.calls), sum(simulation.throttles.values())
+            if "--processes" in main_args:
+                # The simulation's counters live in the worker processes; the scanner's own
+                # metrics are merged in the parent (attempts = calls + retries).
+                calls, throttles = _measured_calls(os.path.join(work_dir, "output", "api_metrics.json"))
+        finally:
+            simulation.uninstall()
+            os.chdir(previous_dir)
+
+    # With --processes, the peak RSS of the largest worker is added to the parent's.
+    peak_rss = sum(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN))
+    return {
+        "wall_seconds": round(wall, 3),
+        "api_calls": sum(calls.values()),
+        "throttles": throttles,
+        "peak_rss_mb": round(peak_rss / 1024, 1),
+        "output_bytes": output_bytes,
+        "rows": rows,
+        "calls_by_operation": {f"{s}:{op}": n for (s, op), n in sorted(calls.items())},
+    }
+
+
+def _measured_calls(path):
+    with open(path, "r", encoding="utf-8") as f:
+        entries = json.load(f)["calls"]
+    calls = {}
+    for entry in entries:
+        key = (entry["service"], entry["operation"])
+        calls[key] = calls.get(key, 0) + entry["calls"] + entry["retries"]
+    return calls, sum(entry["throttles"] for entry in entries)
+
+
+def load_results(path=RESULTS_PATH):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def save_result(record, path=RESULTS_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def print_report(record, baseline=None):
+    metrics = record["metrics"]
+    print(f"\nScan benchmark @ {record['commit']}  main args: {' '.join(record['main_args']) or '(defaults)'}")
+    header = f"{'metric':<14}{'value':>14}"
+    if baseline:
+        header += f"{'baseline':>14}{'change':>10}   (baseline {baseline['commit']}, {baseline['timestamp']})"
+    print(header)
+    for name in COMPARED_METRICS:
+        line = f"{name:<14}{metrics[name]:>14}"
+        if baseline:
+            before = baseline["metrics"][name]
+            change = f"{(metrics[name] - before) / before:+.1%}" if before else "n/a"
+            line += f"{before:>14}{change:>10}"
+        print(line)
+    print("\nAPI calls by operation:")
+    for operation, count in metrics["calls_by_operation"].items():
+        print(f"  {operation:<45}{count:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--regions", type=int, default=17)
+    parser.add_argument("--active-regions", type=int, default=3, help="Regions with resources per account.")
+    parser.add_argument("--instances", type=int, default=20, help="Average EC2 instances per active region.")
+    parser.add_argument("--volumes", type=int, default=25, help="Average EBS volumes per active region.")
+    parser.add_argument("--functions", type=int, default=10, help="Average Lambda functions per active region.")
+    parser.add_argument("--asgs", type=int, default=2, help="Average Auto Scaling groups per active region.")
+    parser.add_argument("--buckets", type=int, default=5, help="Average S3 buckets per account.")
+    parser.add_argument("--latency-ms", type=float, default=20.0, help="Average simulated latency per API call.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Probability that a call is throttled.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--compare", action="store_true",
+                        help="Compare with the last stored run that used the same settings.")
+    parser.add_argument("--no-save", action="store_true", help="Don't append this run to the results file.")
+    parser.add_argument("--verbose", action="store_true", help="Show the scanner's own output.")
+    parser.add_argument("main_args", nargs=argparse.REMAINDER,
+                        help="Arguments for main.py, after '--' (e.g. -- --engine async).")
+    args = parser.parse_args()
+
+    main_args = args.main_args[1:] if args.main_args[:1] == ["--"] else args.main_args
+    config = SimulationConfig(
+        accounts=args.accounts, regions=args.regions, active_regions=args.active_regions,
+        instances=args.instances, volumes=args.volumes, functions=args.functions, asgs=args.asgs,
+        buckets=args.buckets, latency_ms=args.latency_ms, throttle_rate=args.throttle_rate, seed=args.seed
+    )
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "commit": _git_commit(),
+        "config": config.as_dict(),
+        "main_args": main_args,
+        "metrics": run_scan(config, main_args, verbose=args.verbose),
+    }
+
+    baseline = None
+    if args.compare:
+        previous = [r for r in load_results()
+                    if r["config"] == record["config"] and r["main_args"] == record["main_args"]]
+        baseline = previous[-1] if previous else None
+        if baseline is None:
+            print("No stored run with the same settings to compare against.")
+    print_report(record, baseline)
+    if not args.no_save:
+        save_result(record)
+
+
+if __name__ == "__main__":
+    main()
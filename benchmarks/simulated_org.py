@@ -0,0 +1,327 @@
+"""
+In-process stand-in for the AWS APIs the scanner calls, for offline benchmarks.
+
+Every botocore client created while the simulation is installed answers its calls from
+a deterministic synthetic organization through the 'before-send' event, so the real
+client, paginator, retry and event machinery still runs but nothing leaves the process.
+Latency and throttling are injected per attempt: a throttled attempt gets the service's
+throttling error right away and botocore's retries and the scanner's rate limiters handle
+it as they would against AWS. Throttled attempts are counted separately.
+"""
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+import botocore.session
+from botocore.awsrequest import AWSResponse
+
+DEFAULT_REGIONS = ['ap-northeast-1', 'ap-northeast-2', 'ap-northeast-3', 'ap-south-1', 'ap-southeast-1',
+                   'ap-southeast-2', 'ca-central-1', 'eu-central-1', 'eu-north-1', 'eu-west-1', 'eu-west-2',
+                   'eu-west-3', 'sa-east-1', 'us-east-1', 'us-east-2', 'us-west-1', 'us-west-2']
+RUNNER_ACCOUNT = "100000000000"
+RUNNER_ACCESS_KEY = "AKIABENCHRUNNER"
+INSTANCE_TYPES = ["t3.micro", "t3.large", "m5.large", "m5.xlarge", "c5.2xlarge", "r5.large"]
+VOLUME_TYPES = ["gp2", "gp3", "io1", "st1"]
+STORAGE_TYPES = ["StandardStorage", "StandardIAStorage", "GlacierStorage"]
+CONTEXT_KEY = "simulated_call"
+RESPONSE_ID_HEADER = "x-simulated-response-id"
+THROTTLE_MESSAGE = "Rate exceeded (simulated)"
+SEARCH_SERIES_LIMIT = 500
+SEARCH_STORAGE_TYPE = re.compile(r'StorageType="([^"]+)"')
+
+
+class SimulationConfig:
+    """Shape of the synthetic organization and the injected network behavior."""
+
+    def __init__(self, accounts=1000, regions=17, active_regions=3, instances=20, volumes=25, functions=10,
+                 asgs=2, buckets=5, latency_ms=20.0, throttle_rate=0.0, seed=1):
+        self.accounts = accounts
+        self.regions = regions
+        self.active_regions = active_regions
+        self.instances = instances
+        self.volumes = volumes
+        self.functions = functions
+        self.asgs = asgs
+        self.buckets = buckets
+        self.latency_ms = latency_ms
+        self.throttle_rate = throttle_rate
+        self.seed = seed
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class _RawBody:
+    def __init__(self, body):
+        self._body = body
+
+    def stream(self, **kwargs):
+        yield self._body
+
+
+def _http_response(url, status_code, headers, body):
+    return AWSResponse(url, status_code, headers, _RawBody(body))
+
+
+def _empty_body(protocol, operation):
+    """An empty successful reply; the simulated result is merged in by the 'before-parse' handler."""
+    if protocol in ("json", "rest-json"):
+        return b"{}"
+    if protocol in ("query", "ec2"):
+        return b"<Response><%sResult/></Response>" % operation.encode()
+    return b""
+
+
+def _throttle_response(url, protocol):
+    """The throttling error the service returns, in its protocol's wire format."""
+    if protocol in ("json", "rest-json"):
+        body = b'{"__type": "ThrottlingException", "message": "%s"}' % THROTTLE_MESSAGE.encode()
+        return _http_response(url, 400, {"x-amzn-ErrorType": "ThrottlingException"}, body)
+    if protocol == "smithy-rpc-v2-cbor":
+        return _http_response(url, 400, {"x-amzn-query-error": "Throttling;Sender"}, b"")
+    if protocol == "rest-xml":
+        body = b"<Error><Code>SlowDown</Code><Message>%s</Message></Error>" % THROTTLE_MESSAGE.encode()
+        return _http_response(url, 503, {}, body)
+    error = b"<Error><Code>Throttling</Code><Message>%s</Message></Error>" % THROTTLE_MESSAGE.encode()
+    if protocol == "ec2":
+        return _http_response(url, 503, {}, b"<Response><Errors>%s</Errors></Response>" % error)
+    return _http_response(url, 400, {}, b"<ErrorResponse>%s</ErrorResponse>" % error)
+
+
+def _page(items, params, size_param, default_size, token_param):
+    start = int(params.get(token_param) or 0)
+    size = int(params.get(size_param) or default_size)
+    end = start + size
+    return items[start:end], (str(end) if end < len(items) else None)
+
+
+class SimulatedOrganization:
+    """
+    A synthetic organization of 'config.accounts' accounts (the runner is the first one).
+    Each account uses 'active_regions' of its regions; resource counts per (account, region)
+    vary deterministically around the configured averages.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.regions = DEFAULT_REGIONS[:config.regions] if config.regions <= len(DEFAULT_REGIONS) else \
+            DEFAULT_REGIONS + [f"xx-sim-{i}" for i in range(config.regions - len(DEFAULT_REGIONS))]
+        self.account_ids = [RUNNER_ACCOUNT] + [str(200000000000 + i) for i in range(1, config.accounts)]
+        self.calls = Counter()
+        self.throttles = Counter()
+        self._lock = threading.Lock()
+        self._original_create_client = None
+        # Simulated results between the attempt that produced them and the parser, by response id
+        self._responses = {}
+        self._next_response = 0
+
+    # Synthetic data
+
+    def _rng(self, *parts):
+        digest = hashlib.sha1("|".join(map(str, (self.config.seed,) + parts)).encode()).hexdigest()
+        return random.Random(int(digest, 16))
+
+    def active_regions(self, account_id):
+        rng = self._rng("regions", account_id)
+        return set(rng.sample(self.regions, min(self.config.active_regions, len(self.regions))))
+
+    def _count(self, account_id, region, kind, average):
+        if region not in self.active_regions(account_id):
+            return 0
+        return self._rng(kind, account_id, region).randint(average // 2, average + average // 2)
+
+    def _instances(self, account_id, region, running_only):
+        rng = self._rng("instances", account_id, region)
+        instances = []
+        for i in range(self._count(account_id, region, "instances", self.config.instances)):
+            roll = rng.random()
+            tags = [{"Key": "Name", "Value": f"app-{i}"}, {"Key": "team", "Value": rng.choice(["web", "data", "ops"])}]
+            if roll < 0.15:
+                tags.append({"Key": "aws:autoscaling:groupName", "Value": f"asg-{i % 3}"})
+            elif roll < 0.25:
+                tags.append({"Key": "kubernetes.io/cluster/prod", "Value": "owned"})
+            state = "stopped" if rng.random() < 0.2 else "running"
+            if running_only and state != "running":
+                continue
+            instances.append({"InstanceId": f"i-{account_id}{i:08x}", "InstanceType": rng.choice(INSTANCE_TYPES),
+                              "State": {"Name": state}, "Tags": tags})
+        return instances
+
+    def _volumes(self, account_id, region):
+        rng = self._rng("volumes", account_id, region)
+        return [{"VolumeId": f"vol-{i:08x}", "Size": rng.choice([8, 20, 100, 500]),
+                 "VolumeType": rng.choice(VOLUME_TYPES), "State": rng.choice(["in-use", "in-use", "available"])}
+                for i in range(self._count(account_id, region, "volumes", self.config.volumes))]
+
+    def _functions(self, account_id, region):
+        rng = self._rng("functions", account_id, region)
+        return [{"FunctionName": f"fn-{i}", "MemorySize": rng.choice([128, 256, 512, 1024])}
+                for i in range(self._count(account_id, region, "functions", self.config.functions))]
+
+    def _asgs(self, account_id, region):
+        rng = self._rng("asgs", account_id, region)
+        groups = []
+        for i in range(self._count(account_id, region, "asgs", self.config.asgs)):
+            tags = [{"Key": "k8s.io/cluster-autoscaler/enabled", "Value": "true"}] if rng.random() < 0.3 else []
+            groups.append({"AutoScalingGroupName": f"asg-{i}", "DesiredCapacity": rng.randint(0, 6), "Tags": tags})
+        return groups
+
+    def _buckets(self, account_id):
+        rng = self._rng("buckets", account_id)
+        active = sorted(self.active_regions(account_id))
+        count = rng.randint(self.config.buckets // 2, self.config.buckets + self.config.buckets // 2)
+        return [{"Name": f"bucket-{account_id}-{i}", "BucketRegion": rng.choice(active) if active else "us-east-1"}
+                for i in range(count)]
+
+    # API dispatch
+
+    def _respond(self, account_id, region, service, operation, params):
+        if service == "sts":
+            if operation == "AssumeRole":
+                target = params["RoleArn"].split(":")[4]
+                return {"Credentials": {
+                    "AccessKeyId": f"ASIA{target}", "SecretAccessKey": "simulated", "SessionToken": "simulated",
+                    "Expiration": datetime.now(timezone.utc) + timedelta(hours=1)}}
+            return {"Account": account_id, "Arn": f"arn:aws:iam::{account_id}:user/bench", "UserId": "bench"}
+
+        if service == "organizations" and operation == "ListAccounts":
+            accounts = [{"Id": a, "Name": f"bench-{a}", "Status": "ACTIVE", "State": "ACTIVE"}
+                        for a in self.account_ids]
+            page, token = _page(accounts, params, "MaxResults", 20, "NextToken")
+            return {"Accounts": page, "NextToken": token}
+
+        if service == "ec2":
+            if operation == "DescribeRegions":
+                return {"Regions": [{"RegionName": r} for r in self.regions]}
+            if operation == "DescribeInstances":
+                running_only = any(f.get("Name") == "instance-state-name" for f in params.get("Filters", []))
+                page, token = _page(self._instances(account_id, region, running_only), params,
+                                    "MaxResults", 1000, "NextToken")
+                return {"Reservations": [{"Instances": page}] if page else [], "NextToken": token}
+            if operation == "DescribeVolumes":
+                page, token = _page(self._volumes(account_id, region), params, "MaxResults", 500, "NextToken")
+                return {"Volumes": page, "NextToken": token}
+
+        if service == "lambda":
+            functions = self._functions(account_id, region)
+            if operation == "GetAccountSettings":
+                return {"AccountUsage": {"FunctionCount": len(functions)}}
+            if operation == "ListFunctions":
+                page, token = _page(functions, params, "MaxItems", 50, "Marker")
+                return {"Functions": page, "NextMarker": token}
+
+        if service == "autoscaling" and operation == "DescribeAutoScalingGroups":
+            page, token = _page(self._asgs(account_id, region), params, "MaxRecords", 100, "NextToken")
+            return {"AutoScalingGroups": page, "NextToken": token}
+
+        if service == "s3":
+            if operation == "ListBuckets":
+                page, token = _page(self._buckets(account_id), params, "MaxBuckets", 10000, "ContinuationToken")
+                return {"Buckets": page, "ContinuationToken": token}
+            if operation == "HeadBucket":
+                regions = {b["Name"]: b["BucketRegion"] for b in self._buckets(account_id)}
+                return {"ResponseMetadata": {"HTTPHeaders": {"x-amz-bucket-region": regions.get(params["Bucket"])}}}
+
+        if service == "cloudwatch" and operation == "GetMetricData":
+            return self._metric_data(account_id, region, params)
+
+        return {}
+
+    def _metric_data(self, account_id, region, params):
+        buckets = [b["Name"] for b in self._buckets(account_id) if b["BucketRegion"] == region]
+        results = []
+        for query in params["MetricDataQueries"]:
+            if "Expression" in query:
+                metric = "BucketSizeBytes" if "BucketSizeBytes" in query["Expression"] else "NumberOfObjects"
+                storage_types = STORAGE_TYPES if metric == "BucketSizeBytes" else ["AllStorageTypes"]
+                wanted = SEARCH_STORAGE_TYPE.search(query["Expression"])
+                if wanted:
+                    storage_types = [t for t in storage_types if t == wanted.group(1)]
+                series = [(name, storage) for name in buckets for storage in storage_types]
+                # Like CloudWatch, a single SEARCH returns at most SEARCH_SERIES_LIMIT series.
+                for name, storage in series[:SEARCH_SERIES_LIMIT]:
+                    label = query["Label"]
+                    for prop, value in (("MetricName", metric), ("Dim.BucketName", name), ("Dim.StorageType", storage)):
+                        label = label.replace("${PROP('%s')}" % prop, value)
+                    results.append({"Id": query["Id"], "Label": label, "Values": [self._metric(name, metric, storage)]})
+            else:
+                metric = query["MetricStat"]["Metric"]["MetricName"]
+                dimensions = {d["Name"]: d["Value"] for d in query["MetricStat"]["Metric"]["Dimensions"]}
+                name, storage = dimensions.get("BucketName"), dimensions.get("StorageType")
+                # Like CloudWatch, storage types a bucket doesn't use have no data points.
+                if name not in buckets or storage not in STORAGE_TYPES and storage != "AllStorageTypes":
+                    results.append({"Id": query["Id"], "Label": query["Label"], "Values": []})
+                    continue
+                value = self._metric(name, metric, storage)
+                results.append({"Id": query["Id"], "Label": query["Label"], "Values": [value]})
+        return {"MetricDataResults": results}
+
+    def _metric(self, name, metric, storage):
+        return self._rng("metric", name, metric, storage).randint(1, 10 ** 9)
+
+    # botocore integration
+
+    def _account_of(self, request_signer):
+        access_key = request_signer._credentials.access_key
+        return access_key[4:] if access_key.startswith("ASIA") else RUNNER_ACCOUNT
+
+    def _capture_params(self, params, context, **kwargs):
+        context["simulated_params"] = dict(params)
+
+    def _before_call(self, model, context, request_signer, **kwargs):
+        # Records the call; every attempt of it is answered by _before_send.
+        service = model.service_model.service_name
+        with self._lock:
+            self.calls[(service, model.name)] += 1
+        context[CONTEXT_KEY] = (self._account_of(request_signer), context.get("client_region") or "us-east-1",
+                                service, model.name, context.get("simulated_params", {}),
+                                model.service_model.resolved_protocol)
+
+    def _before_send(self, request, **kwargs):
+        call = (request.context or {}).get(CONTEXT_KEY)
+        if call is None:
+            return None
+        account_id, region, service, operation, params, protocol = call
+        rng = random.Random()
+        time.sleep(self.config.latency_ms / 1000.0 * rng.uniform(0.5, 1.5))
+        if rng.random() < self.config.throttle_rate:
+            with self._lock:
+                self.throttles[(service, operation)] += 1
+            return _throttle_response(request.url, protocol)
+        parsed = self._respond(account_id, region, service, operation, params)
+        with self._lock:
+            response_id = str(self._next_response)
+            self._next_response += 1
+            self._responses[response_id] = parsed
+        return _http_response(request.url, 200, {RESPONSE_ID_HEADER: response_id}, _empty_body(protocol, operation))
+
+    def _before_parse(self, response_dict, customized_response_dict, **kwargs):
+        response_id = response_dict["headers"].get(RESPONSE_ID_HEADER)
+        if response_id is None:
+            return
+        with self._lock:
+            parsed = self._responses.pop(response_id)
+        customized_response_dict.update(parsed)
+
+    def install(self):
+        """Routes every botocore client created from now on to the simulated organization."""
+        simulation = self
+        original = self._original_create_client = botocore.session.Session.create_client
+
+        def create_client(session, *args, **kwargs):
+            client = original(session, *args, **kwargs)
+            client.meta.events.register("before-parameter-build", simulation._capture_params)
+            client.meta.events.register("before-call", simulation._before_call)
+            client.meta.events.register("before-send", simulation._before_send)
+            client.meta.events.register("before-parse", simulation._before_parse)
+            return client
+
+        botocore.session.Session.create_client = create_client
+
+    def uninstall(self):
+        if self._original_create_client is not None:
+            botocore.session.Session.create_client = self._original_create_client
+            self._original_create_client = None
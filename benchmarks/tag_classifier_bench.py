@@ -0,0 +1,70 @@
+"""
+Micro-benchmark of the tag classifier on pages of 1000 EC2 instances.
+Compares the shared TagClassifier with the previous str(tags).lower() substring checks.
+
+    python -m benchmarks.tag_classifier_bench [--pages N] [--tags N]
+"""
+import argparse
+import random
+import time
+from utils.tag_classifier import TagClassifier, AUTOSCALING, KUBERNETES
+
+PAGE_SIZE = 1000
+
+
+def make_page(tags_per_instance, seed=0):
+    rng = random.Random(seed)
+    plain_keys = ["Name", "team", "env", "cost-center", "owner", "service", "version", "backup", "schedule"]
+    page = []
+    for i in range(PAGE_SIZE):
+        tags = [{"Key": rng.choice(plain_keys), "Value": f"value-{rng.randint(0, 10000)}"}
+                for _ in range(tags_per_instance)]
+        if rng.random() < 0.05:
+            # Harmless values that merely contain a marker substring ("weeks" contains "eks").
+            tags.append({"Key": "retention", "Value": "4-weeks"})
+        roll = rng.random()
+        if roll < 0.1:
+            tags.append({"Key": "aws:autoscaling:groupName", "Value": f"asg-{i}"})
+        elif roll < 0.2:
+            tags.append({"Key": "kubernetes.io/cluster/prod", "Value": "owned"})
+        elif roll < 0.25:
+            tags.append({"Key": "Name", "Value": "eks-node"})
+        page.append(tags)
+    return page
+
+
+def legacy_is_excluded(tag_list):
+    tags = {t['Key']: t['Value'] for t in tag_list}
+    if 'aws:autoscaling:groupName' in tags:
+        return True
+    return any(k in str(tags).lower() for k in ['eks', 'k8s', 'kubernetes'])
+
+
+def bench(label, func, page, pages):
+    start = time.perf_counter()
+    excluded = 0
+    for _ in range(pages):
+        for tags in page:
+            excluded += func(tags)
+    elapsed = time.perf_counter() - start
+    per_resource = elapsed / (pages * PAGE_SIZE) * 1e6
+    print(f"{label:<16} {per_resource:8.2f} us/resource  {elapsed / pages * 1e3:8.2f} ms/page  "
+          f"excluded {excluded // pages}/{PAGE_SIZE}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--tags", type=int, default=8, help="Plain tags per instance.")
+    args = parser.parse_args()
+
+    page = make_page(args.tags)
+    classifier = TagClassifier()
+    categories = (AUTOSCALING, KUBERNETES)
+
+    bench("legacy", legacy_is_excluded, page, args.pages)
+    bench("TagClassifier", lambda tags: classifier.is_excluded(tags, categories), page, args.pages)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+# Importing a collector module registers its collectors; this import order is the
+# order of every account's results. New collector modules only need to be added here.
+from collectors import ec2, ebs, lambda_functions, asgConverter, s3
+from collectors.registry import GLOBAL, REGIONAL, Collector, failed_call, register_collector, registered_collectors
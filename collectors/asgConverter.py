@@ -1,35 +1,83 @@
+import jmespath
 from utils.config_helper import get_client
+from utils.rate_limit import rate_limiter
+from utils.summary import ResourceSummary
+from utils.tag_classifier import is_excluded, KUBERNETES
+from collectors.registry import failed_call, register_collector, REGIONAL
 
+PAGINATE_KWARGS = {'PaginationConfig': {'PageSize': 100}}
+PROJECTION = jmespath.compile("AutoScalingGroups[].[DesiredCapacity, Tags]")
 
-def collect_asg_as_ec2_equivalent(session, region, account_id):
+
+def _asg_rows(page, account_id, region):
+    for desired_capacity, tag_list in PROJECTION.search(page) or []:
+        # Skip inactive groups
+        if not desired_capacity:
+            continue
+
+        if is_excluded(tag_list, (KUBERNETES,)):
+            continue
+
+        yield {
+            "account_id": account_id,
+            "resource": "asg_ec2_equivalent",
+            "region": region,
+            "asg_instance_count": desired_capacity
+        }
+
+
+def _error(e):
+    if "AccessDenied" in str(e):
+        return "autoscaling:DescribeAutoScalingGroups"
+    return None
+
+
+def probe_asg_as_ec2_equivalent(session, region):
+    """One single-page DescribeAutoScalingGroups call; returns the denied action, or None."""
+    try:
+        get_client(session, "autoscaling", region_name=region).describe_auto_scaling_groups(MaxRecords=1)
+    except Exception as e:
+        return _error(e)
+    return None
+
+
+def collect_asg_as_ec2_equivalent(session, region, account_id, summary=False):
     client = get_client(session, "autoscaling", region_name=region)
     results = []
+    aggregate = ResourceSummary() if summary else None
+    add_row = aggregate.add_resource if summary else results.append
     error = None
     try:
         paginator = client.get_paginator('describe_auto_scaling_groups')
-        for page in paginator.paginate():
-            for asg in page['AutoScalingGroups']:
-                # Skip inactive groups
-                if asg.get('DesiredCapacity', 0) == 0:
-                    continue
-
-                asg_tags = {t['Key'].lower(): str(t.get('Value', '')).lower() for t in asg.get('Tags', [])}
+        for page in paginator.paginate(**PAGINATE_KWARGS):
+            for row in _asg_rows(page, account_id, region):
+                add_row(row)
+    except Exception as e:
+        error = _error(e) or failed_call("autoscaling:DescribeAutoScalingGroups", e)
+    if aggregate is not None:
+        results = aggregate.rows()
+    return results, error
 
-                k8s_markers = ['eks', 'k8s', 'kubernetes', 'cluster-autoscaler']
 
-                is_k8s = any(marker in str(asg_tags) for marker in k8s_markers) or \
-                         any('k8s.io' in key or 'kubernetes.io' in key for key in asg_tags.keys())
+async def collect_asg_as_ec2_equivalent_async(session, region, account_id, engine, summary=False):
+    client = await engine.call(None, get_client, session, "autoscaling", region_name=region)
+    results = []
+    aggregate = ResourceSummary() if summary else None
+    add_row = aggregate.add_resource if summary else results.append
+    error = None
+    try:
+        paginator = client.get_paginator('describe_auto_scaling_groups')
+        limiter = rate_limiter(account_id, "autoscaling", region)
+        async for page in engine.paginate("autoscaling", paginator, limiter=limiter, **PAGINATE_KWARGS):
+            for row in _asg_rows(page, account_id, region):
+                add_row(row)
+    except Exception as e:
+        error = _error(e) or failed_call("autoscaling:DescribeAutoScalingGroups", e)
+    if aggregate is not None:
+        results = aggregate.rows()
+    return results, error
 
-                if is_k8s:
-                    continue
 
-                results.append({
-                    "account_id": account_id,
-                    "resource": "asg_ec2_equivalent",
-                    "region": region,
-                    "asg_instance_count": asg.get('DesiredCapacity')
-                })
-    except Exception as e:
-        if "AccessDenied" in str(e):
-            error = "autoscaling:DescribeAutoScalingGroups"
-    return results, error
\ No newline at end of file
+register_collector(collect_asg_as_ec2_equivalent, collect_asg_as_ec2_equivalent_async, scope=REGIONAL,
+                   service="autoscaling", permissions=["autoscaling:DescribeAutoScalingGroups"],
+                   probe=probe_asg_as_ec2_equivalent)
@@ -1,22 +1,76 @@
+import jmespath
 from utils.config_helper import get_client
+from utils.rate_limit import rate_limiter
+from utils.summary import ResourceSummary
+from collectors.registry import failed_call, register_collector, REGIONAL
 
-def collect_ebs_volumes(session, region, account_id):
+PAGINATE_KWARGS = {'PaginationConfig': {'PageSize': 500}}
+PROJECTION = jmespath.compile("Volumes[].[State, Size, VolumeType]")
+
+
+def _volume_rows(page, account_id, region):
+    for state, size, volume_type in PROJECTION.search(page) or []:
+        yield {
+            "account_id": account_id,
+            "resource": "ebs",
+            "region": region,
+            "ebs_state": state,
+            "ebs_size_gb": size,
+            "ebs_type": volume_type
+        }
+
+
+def _error(e):
+    if any(err in str(e) for err in ["AccessDenied", "UnauthorizedOperation"]):
+        return "ec2:DescribeVolumes"
+    return None
+
+
+def probe_ebs_volumes(session, region):
+    """One single-page DescribeVolumes call; returns the denied action, or None."""
+    try:
+        get_client(session, "ec2", region_name=region).describe_volumes(MaxResults=5)
+    except Exception as e:
+        return _error(e)
+    return None
+
+
+def collect_ebs_volumes(session, region, account_id, summary=False):
     client = get_client(session, "ec2", region_name=region)
     results = []
+    aggregate = ResourceSummary() if summary else None
+    add_row = aggregate.add_resource if summary else results.append
     error = None
     try:
         paginator = client.get_paginator('describe_volumes')
-        for page in paginator.paginate():
-            for vol in page['Volumes']:
-                results.append({
-                    "account_id": account_id,
-                    "resource": "ebs",
-                    "region": region,
-                    "ebs_state": vol['State'],
-                    "ebs_size_gb": vol['Size'],
-                    "ebs_type": vol['VolumeType']
-                })
+        for page in paginator.paginate(**PAGINATE_KWARGS):
+            for row in _volume_rows(page, account_id, region):
+                add_row(row)
     except Exception as e:
-        if any(err in str(e) for err in ["AccessDenied", "UnauthorizedOperation"]):
-            error = "ec2:DescribeVolumes"
-    return results, error
\ No newline at end of file
+        error = _error(e) or failed_call("ec2:DescribeVolumes", e)
+    if aggregate is not None:
+        results = aggregate.rows()
+    return results, error
+
+
+async def collect_ebs_volumes_async(session, region, account_id, engine, summary=False):
+    client = await engine.call(None, get_client, session, "ec2", region_name=region)
+    results = []
+    aggregate = ResourceSummary() if summary else None
+    add_row = aggregate.add_resource if summary else results.append
+    error = None
+    try:
+        paginator = client.get_paginator('describe_volumes')
+        limiter = rate_limiter(account_id, "ec2", region)
+        async for page in engine.paginate("ec2", paginator, limiter=limiter, **PAGINATE_KWARGS):
+            for row in _volume_rows(page, account_id, region):
+                add_row(row)
+    except Exception as e:
+        error = _error(e) or failed_call("ec2:DescribeVolumes", e)
+    if aggregate is not None:
+        results = aggregate.rows()
+    return results, error
+
+
+register_collector(collect_ebs_volumes, collect_ebs_volumes_async, scope=REGIONAL, service="ec2",
+                   permissions=["ec2:DescribeVolumes"], probe=probe_ebs_volumes)
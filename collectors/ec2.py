@@ -1,32 +1,88 @@
+import jmespath
 from utils.config_helper import get_client
+from utils.rate_limit import rate_limiter
+from utils.summary import ResourceSummary
+from utils.tag_classifier import is_excluded, AUTOSCALING, KUBERNETES
+from collectors.registry import failed_call, register_collector, REGIONAL
 
-def collect_ec2_instances(session, region, account_id):
+# Only running instances are counted, so the API filters out the rest.
+PAGINATE_KWARGS = {
+    'Filters': [{'Name': 'instance-state-name', 'Values': ['running']}],
+    'PaginationConfig': {'PageSize': 1000}
+}
+# Each page is reduced to the few fields a row needs as soon as it arrives.
+PROJECTION = jmespath.compile("Reservations[].Instances[].[InstanceType, State.Name, Tags]")
+# ASG members are counted by the ASG collector; Kubernetes nodes are out of scope.
+EXCLUDED = (AUTOSCALING, KUBERNETES)
+
+
+def _instance_rows(page, account_id, region):
+    for instance_type, state, tag_list in PROJECTION.search(page) or []:
+        if state != 'running':
+            continue
+
+        if is_excluded(tag_list, EXCLUDED):
+            continue
+
+        yield {
+            "account_id": account_id,
+            "resource": "ec2",
+            "region": region,
+            "instance_type": instance_type,
+        }
+
+
+def _error(e):
+    if any(err in str(e) for err in ["AccessDenied", "UnauthorizedOperation"]):
+        return "ec2:DescribeInstances"
+    return None
+
+
+def probe_ec2_instances(session, region):
+    """One single-page DescribeInstances call; returns the denied action, or None."""
+    try:
+        get_client(session, "ec2", region_name=region).describe_instances(MaxResults=5)
+    except Exception as e:
+        return _error(e)
+    return None
+
+
+def collect_ec2_instances(session, region, account_id, summary=False):
     client = get_client(session, "ec2", region_name=region)
     results = []
+    aggregate = ResourceSummary() if summary else None
+    add_row = aggregate.add_resource if summary else results.append
+    error = None
+    try:
+        paginator = client.get_paginator('describe_instances')
+        for page in paginator.paginate(**PAGINATE_KWARGS):
+            for row in _instance_rows(page, account_id, region):
+                add_row(row)
+    except Exception as e:
+        error = _error(e) or failed_call("ec2:DescribeInstances", e)
+    if aggregate is not None:
+        results = aggregate.rows()
+    return results, error
+
+
+async def collect_ec2_instances_async(session, region, account_id, engine, summary=False):
+    client = await engine.call(None, get_client, session, "ec2", region_name=region)
+    results = []
+    aggregate = ResourceSummary() if summary else None
+    add_row = aggregate.add_resource if summary else results.append
     error = None
     try:
         paginator = client.get_paginator('describe_instances')
-        for page in paginator.paginate():
-            for reservation in page['Reservations']:
-                for instance in reservation['Instances']:
-                    if instance['State']['Name'] != 'running':
-                        continue
-
-                    tags = {t['Key']: t['Value'] for t in instance.get('Tags', [])}
-
-                    if 'aws:autoscaling:groupName' in tags:
-                        continue
-
-                    if any(k in str(tags).lower() for k in ['eks', 'k8s', 'kubernetes']):
-                        continue
-
-                    results.append({
-                        "account_id": account_id,
-                        "resource": "ec2",
-                        "region": region,
-                        "instance_type": instance['InstanceType'],
-                    })
+        limiter = rate_limiter(account_id, "ec2", region)
+        async for page in engine.paginate("ec2", paginator, limiter=limiter, **PAGINATE_KWARGS):
+            for row in _instance_rows(page, account_id, region):
+                add_row(row)
     except Exception as e:
-        if any(err in str(e) for err in ["AccessDenied", "UnauthorizedOperation"]):
-            error = "ec2:DescribeInstances"
-    return results, error
\ No newline at end of file
+        error = _error(e) or failed_call("ec2:DescribeInstances", e)
+    if aggregate is not None:
+        results = aggregate.rows()
+    return results, error
+
+
+register_collector(collect_ec2_instances, collect_ec2_instances_async, scope=REGIONAL, service="ec2",
+                   permissions=["ec2:DescribeInstances"], probe=probe_ec2_instances)
@@ -1,20 +1,74 @@
+import jmespath
 from utils.config_helper import get_client
+from utils.rate_limit import rate_limiter
+from utils.summary import ResourceSummary
+from collectors.registry import failed_call, register_collector, REGIONAL
 
-def collect_lambda_functions(session, region, account_id):
+PAGINATE_KWARGS = {'PaginationConfig': {'PageSize': 50}}
+PROJECTION = jmespath.compile("Functions[].[MemorySize]")
+
+
+def _function_rows(page, account_id, region):
+    for (memory_size,) in PROJECTION.search(page) or []:
+        yield {
+            "account_id": account_id,
+            "resource": "lambda",
+            "region": region,
+            "function_memory_mb": memory_size
+        }
+
+
+def _error(e):
+    if "AccessDenied" in str(e):
+        return "lambda:ListFunctions"
+    return None
+
+
+def probe_lambda_functions(session, region):
+    """One single-page ListFunctions call; returns the denied action, or None."""
+    try:
+        get_client(session, "lambda", region_name=region).list_functions(MaxItems=1)
+    except Exception as e:
+        return _error(e)
+    return None
+
+
+def collect_lambda_functions(session, region, account_id, summary=False):
     client = get_client(session, "lambda", region_name=region)
     results = []
+    aggregate = ResourceSummary() if summary else None
+    add_row = aggregate.add_resource if summary else results.append
     error = None
     try:
         paginator = client.get_paginator('list_functions')
-        for page in paginator.paginate():
-            for func in page['Functions']:
-                results.append({
-                    "account_id": account_id,
-                    "resource": "lambda",
-                    "region": region,
-                    "function_memory_mb": func.get('MemorySize')
-                })
+        for page in paginator.paginate(**PAGINATE_KWARGS):
+            for row in _function_rows(page, account_id, region):
+                add_row(row)
     except Exception as e:
-        if "AccessDenied" in str(e):
-            error = "lambda:ListFunctions"
-    return results, error
\ No newline at end of file
+        error = _error(e) or failed_call("lambda:ListFunctions", e)
+    if aggregate is not None:
+        results = aggregate.rows()
+    return results, error
+
+
+async def collect_lambda_functions_async(session, region, account_id, engine, summary=False):
+    client = await engine.call(None, get_client, session, "lambda", region_name=region)
+    results = []
+    aggregate = ResourceSummary() if summary else None
+    add_row = aggregate.add_resource if summary else results.append
+    error = None
+    try:
+        paginator = client.get_paginator('list_functions')
+        limiter = rate_limiter(account_id, "lambda", region)
+        async for page in engine.paginate("lambda", paginator, limiter=limiter, **PAGINATE_KWARGS):
+            for row in _function_rows(page, account_id, region):
+                add_row(row)
+    except Exception as e:
+        error = _error(e) or failed_call("lambda:ListFunctions", e)
+    if aggregate is not None:
+        results = aggregate.rows()
+    return results, error
+
+
+register_collector(collect_lambda_functions, collect_lambda_functions_async, scope=REGIONAL, service="lambda",
+                   permissions=["lambda:ListFunctions"], probe=probe_lambda_functions)
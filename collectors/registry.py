@@ -0,0 +1,72 @@
+import botocore.exceptions
+
+GLOBAL = "global"
+REGIONAL = "regional"
+
+
+def failed_call(action, e):
+    """
+    The error a collector returns when a call needing 'action' failed for a reason other than
+    a denial (e.g. still throttled after every retry). A unit with an error is never cached or
+    taken as an empty region, so a transient failure can't pass for an empty result.
+    """
+    if isinstance(e, botocore.exceptions.ClientError):
+        reason = e.response.get("Error", {}).get("Code") or "ClientError"
+    else:
+        reason = type(e).__name__
+    return f"{action} failed ({reason})"
+
+
+def _run_on_engine(func, service):
+    """An async_func for a blocking collector: one engine.call() within the service's concurrency limit."""
+    async def run(*args, engine, **kwargs):
+        return await engine.call(service, func, *args, **kwargs)
+    run.__name__ = f"{func.__name__}_async"
+    return run
+
+
+class Collector:
+    """
+    A resource collector and what the scan needs to schedule it.
+    'scope' is GLOBAL (one unit per account) or REGIONAL (one unit per account and region),
+    'service' is the AWS service it mostly calls and 'permissions' the IAM actions it needs.
+    'options' maps extra keyword arguments of the collector to ScanContext attributes.
+    'probe(session, region)' makes one cheap call with those permissions and returns the
+    denied action or None; it is used by '--permission-check preflight'.
+    A collector without 'async_func' runs 'func' on the async engine's I/O pool under --engine async.
+    """
+
+    def __init__(self, func, async_func=None, scope=REGIONAL, service=None, permissions=(), options=None,
+                 probe=None):
+        self.name = func.__name__
+        self.func = func
+        self.async_func = async_func or _run_on_engine(func, service)
+        self.scope = scope
+        self.service = service
+        self.permissions = tuple(permissions)
+        self.options = dict(options or {})
+        self.probe = probe
+
+    def kwargs(self, ctx):
+        return {name: getattr(ctx, attr) for name, attr in self.options.items()}
+
+    def __repr__(self):
+        return f"Collector({self.name}, {self.scope}, {self.service})"
+
+
+# In registration order, which is also the order of each account's results.
+_COLLECTORS = []
+
+
+def register_collector(func, async_func=None, scope=REGIONAL, service=None, permissions=(), options=None,
+                       probe=None):
+    """Adds a collector to the scan; called once by each collector module when it is imported."""
+    collector = Collector(func, async_func, scope, service, permissions, options, probe)
+    if any(c.name == collector.name for c in _COLLECTORS):
+        raise ValueError(f"Collector '{collector.name}' is already registered")
+    _COLLECTORS.append(collector)
+    return collector
+
+
+def registered_collectors(scope=None):
+    return [c for c in _COLLECTORS if scope is None or c.scope == scope]
@@ -2,127 +2,386 @@ from datetime import datetime, timedelta
 import logging
 import botocore
 from utils.config_helper import get_client
+from utils.json_cache import JsonCache
+from utils.summary import ResourceSummary
+from collectors.registry import failed_call, register_collector, GLOBAL
 
 logger = logging.getLogger("CloudScanner")
 
-def collect_s3_buckets(session, account_id="unknown"):
+METRICS_MODE_BULK = "bulk"
+METRICS_MODE_PER_BUCKET = "per-bucket"
+# GetMetricData returns at most this many time series for a single SEARCH expression.
+SEARCH_SERIES_LIMIT = 500
+GB = 1024 ** 3
+# Every StorageType dimension S3 reports BucketSizeBytes under. A region's size search is split
+# into one search per type when it hits SEARCH_SERIES_LIMIT, and per-bucket mode can't search,
+# so it asks for all of them; types a bucket doesn't use come back without values.
+STORAGE_TYPES = [
+    "StandardStorage", "IntelligentTieringFAStorage", "IntelligentTieringIAStorage", "IntelligentTieringAAStorage",
+    "IntelligentTieringAIAStorage", "IntelligentTieringDAAStorage", "StandardIAStorage", "StandardIASizeOverhead",
+    "StandardIAObjectOverhead", "OneZoneIAStorage", "OneZoneIASizeOverhead", "ReducedRedundancyStorage",
+    "GlacierInstantRetrievalStorage", "GlacierInstantRetrievalSizeOverhead", "GlacierStorage",
+    "GlacierStagingStorage", "GlacierObjectOverhead", "GlacierS3ObjectOverhead", "DeepArchiveStorage",
+    "DeepArchiveObjectOverhead", "DeepArchiveS3ObjectOverhead", "DeepArchiveStagingStorage", "ExpressOneZone"
+]
+# GetMetricData accepts at most this many queries per call.
+MAX_METRIC_QUERIES = 500
+# Bucket regions found by previous runs, per account; saved once per run by save_bucket_regions().
+_region_cache = JsonCache("s3_bucket_regions.json")
+
+
+def _normalize_region(region):
+    # Legacy location constraint for eu-west-1
+    return "eu-west-1" if region == "EU" else region
+
+
+def _resolve_bucket_region(s3, name):
+    try:
+        response = s3.head_bucket(Bucket=name)
+        return response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('x-amz-bucket-region')
+    except botocore.exceptions.ClientError as e:
+        # Attempt to extract region from error headers
+        return e.response.get('Error', {}).get('Region') or \
+               e.response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('x-amz-bucket-region')
+
+
+def _query_metric_data(cw, queries, start_time, end_time):
+    """Runs GetMetricData across all NextToken pages and returns the latest value per label."""
+    latest = {}
+    kwargs = {
+        'MetricDataQueries': queries,
+        'StartTime': start_time,
+        'EndTime': end_time,
+        'ScanBy': 'TimestampDescending'
+    }
+    while True:
+        response = cw.get_metric_data(**kwargs)
+        for res in response['MetricDataResults']:
+            if latest.get(res['Label']) is None:
+                latest[res['Label']] = res['Values'][0] if res['Values'] else None
+        next_token = response.get('NextToken')
+        if not next_token:
+            return latest
+        kwargs['NextToken'] = next_token
+
+
+def _search_query(query_id, metric_name, storage_type=None):
+    """A SEARCH for the 'metric_name' series of every bucket in the region, optionally of one storage type."""
+    storage_filter = f' StorageType="{storage_type}"' if storage_type else ""
+    return {
+        'Id': query_id,
+        'Expression': f"SEARCH('{{AWS/S3,BucketName,StorageType}} MetricName=\"{metric_name}\"{storage_filter}', "
+                      f"'Average', 86400)",
+        'Label': f"{query_id}|${{PROP('Dim.BucketName')}}|${{PROP('Dim.StorageType')}}"
+    }
+
+
+def _metric_stat_query(query_id, b_name, metric_name, storage_type, label):
+    return {
+        'Id': query_id,
+        'MetricStat': {
+            'Metric': {
+                'Namespace': 'AWS/S3',
+                'MetricName': metric_name,
+                'Dimensions': [
+                    {'Name': 'BucketName', 'Value': b_name},
+                    {'Name': 'StorageType', 'Value': storage_type}
+                ]
+            },
+            'Period': 86400,
+            'Stat': 'Average'
+        },
+        'Label': label
+    }
+
+
+def _add_metric(metrics, b_name, metric_name, storage_type, value):
+    bucket = metrics.setdefault(b_name, {"sizes": {}, "count": 0})
+    if metric_name == "BucketSizeBytes":
+        bucket["sizes"][storage_type] = value
+    elif storage_type == "AllStorageTypes":
+        bucket["count"] = value
+
+
+def _query_series(cw, series, metrics, start_time, end_time):
+    """
+    Fetches (bucket, metric name, storage type) series with one MetricStat query each,
+    MAX_METRIC_QUERIES per call, into 'metrics'. Series without data are left out.
+    """
+    for i in range(0, len(series), MAX_METRIC_QUERIES):
+        chunk = series[i:i + MAX_METRIC_QUERIES]
+        queries = [_metric_stat_query(f'm{idx}', b_name, metric_name, storage_type,
+                                      f"{b_name}|{metric_name}|{storage_type}")
+                   for idx, (b_name, metric_name, storage_type) in enumerate(chunk)]
+        latest = _query_metric_data(cw, queries, start_time, end_time)
+        for b_name, metric_name, storage_type in chunk:
+            value = latest.get(f"{b_name}|{metric_name}|{storage_type}")
+            if value is not None:
+                _add_metric(metrics, b_name, metric_name, storage_type, value)
+
+
+def _bucket_metrics_bulk(cw, bucket_names, start_time, end_time):
+    """
+    Fetches size (per storage type) and object count for every bucket in the region with one
+    SEARCH expression per metric. A search that hits the CloudWatch series limit is split by
+    storage type. A single storage type that still hits it is completed with per-bucket
+    queries for the buckets it didn't return, for that storage type only.
+    """
+    wanted = set(bucket_names)
+    metrics = {}
+    # query id -> (metric name, storage type or None for every type)
+    searches = {"count": ("NumberOfObjects", "AllStorageTypes"), "size": ("BucketSizeBytes", None)}
+    remainder = []
+    while searches:
+        queries = [_search_query(query_id, metric_name, storage_type)
+                   for query_id, (metric_name, storage_type) in searches.items()]
+        latest = _query_metric_data(cw, queries, start_time, end_time)
+        found = {query_id: set() for query_id in searches}
+        series = dict.fromkeys(searches, 0)
+        for label, value in latest.items():
+            query_id, b_name, storage_type = label.split("|", 2)
+            found[query_id].add(b_name)
+            series[query_id] += 1
+            if b_name in wanted and value is not None:
+                _add_metric(metrics, b_name, searches[query_id][0], storage_type, value)
+
+        split = {}
+        for query_id, (metric_name, storage_type) in searches.items():
+            if series[query_id] < SEARCH_SERIES_LIMIT:
+                continue
+            if storage_type is None:
+                split.update({f"size{idx}": (metric_name, storage_type)
+                              for idx, storage_type in enumerate(STORAGE_TYPES)})
+            else:
+                remainder += [(b_name, metric_name, storage_type)
+                              for b_name in bucket_names if b_name not in found[query_id]]
+        searches = split
+
+    _query_series(cw, remainder, metrics, start_time, end_time)
+    return metrics
+
+
+def _bucket_metrics_per_bucket(cw, bucket_names, start_time, end_time):
+    """
+    Legacy mode: one MetricStat query per bucket and storage type for the size, and one for the
+    object count. Used with --s3-metrics per-bucket, or when the region's searches fail.
+    Returns the metrics and the error of the last chunk that failed, if any.
+    """
+    metrics = {}
+    error = None
+    chunk_size = MAX_METRIC_QUERIES // (len(STORAGE_TYPES) + 1)
+
+    for i in range(0, len(bucket_names), chunk_size):
+        chunk = bucket_names[i:i + chunk_size]
+        series = [(b_name, "BucketSizeBytes", storage_type) for b_name in chunk for storage_type in STORAGE_TYPES]
+        series += [(b_name, "NumberOfObjects", "AllStorageTypes") for b_name in chunk]
+        try:
+            _query_series(cw, series, metrics, start_time, end_time)
+        except Exception as e:
+            # The chunk's buckets are still listed, with no sizes; the error keeps the unit out of the cache.
+            error = "cloudwatch:GetMetricData" if "AccessDenied" in str(e) else \
+                failed_call("cloudwatch:GetMetricData", e)
+    return metrics, error
+
+
+def _collect_region_metrics(session, region, bucket_names, metrics_mode, start_time, end_time):
+    """Returns the region's bucket metrics and the error of the queries that failed, if any."""
+    cw = get_client(session, "cloudwatch", region_name=region)
+    if metrics_mode == METRICS_MODE_BULK:
+        try:
+            return _bucket_metrics_bulk(cw, bucket_names, start_time, end_time), None
+        except Exception:
+            # e.g. SEARCH throttled or not allowed: the per-bucket queries may still succeed.
+            pass
+    return _bucket_metrics_per_bucket(cw, bucket_names, start_time, end_time)
+
+
+def _bucket_regions(pages, account_id):
+    """Every listed bucket's region from ListBuckets or the cache of previous runs; None when unknown."""
+    cached_regions = _region_cache.get(account_id, {})
+    bucket_regions = {}
+    for page in pages:
+        for b in page.get("Buckets", []):
+            name = b["Name"]
+            bucket_regions[name] = b.get("BucketRegion") or cached_regions.get(name)
+    return bucket_regions
+
+
+def _group_by_region(account_id, bucket_regions):
+    """
+    Returns ({region: bucket names}, buckets whose region is unknown). The known regions replace the
+    account's cache entry, which drops buckets that are no longer listed; an unchanged entry is left as is.
+    """
+    buckets_by_region = {}
+    skipped_buckets = []
+    for name, region in bucket_regions.items():
+        if region:
+            region = _normalize_region(region)
+            bucket_regions[name] = region
+            buckets_by_region.setdefault(region, []).append(name)
+        else:
+            skipped_buckets.append(name)
+
+    known = {name: region for name, region in bucket_regions.items() if region}
+    if known != _region_cache.get(account_id):
+        _region_cache.set(account_id, known)
+
+    # Only notify if there are actual skips
+    if skipped_buckets:
+        logger.info(
+            f"s3:HeadBucket failed to resolve {len(skipped_buckets)} regions (Fetched: {len(known)}). "
+            f"Action required: add 's3:ListBucket' permission.",
+            extra={'account_id': account_id}
+        )
+    return buckets_by_region, skipped_buckets
+
+
+def _bucket_rows(account_id, buckets_by_region, region_metrics, skipped_buckets, add_row, rounded=True):
+    """
+    Adds one row per bucket and returns the error of the metric queries that failed, if any.
+    Rows fed to a ResourceSummary keep full precision ('rounded' False); it rounds its own totals.
+    """
+    def gb(size):
+        return round(size / GB, 2) if rounded else size / GB
+
+    error = None
+    for region, bucket_names in buckets_by_region.items():
+        metrics, metrics_error = region_metrics[region]
+        error = error or metrics_error
+        for b_name in bucket_names:
+            bucket = metrics.get(b_name, {})
+            sizes = bucket.get("sizes", {})
+            add_row({
+                "account_id": account_id,
+                "resource": "s3_bucket",
+                "region": region,
+                "bucket_size_gb": gb(sum(sizes.values())),
+                "bucket_doc_num": int(bucket.get("count", 0)),
+                "bucket_size_gb_by_class": {cls: gb(size) for cls, size in sorted(sizes.items())}
+            })
+
+    for b_name in skipped_buckets:
+        add_row({
+            "account_id": account_id,
+            "resource": "s3_bucket",
+            "region": "Unknown",
+            "bucket_size_gb": 0,
+            "bucket_doc_num": 0,
+            "bucket_size_gb_by_class": {}
+        })
+    return error
+
+
+def _list_error(e):
+    if "AccessDenied" in str(e):
+        return "s3:ListAllMyBuckets"  # Actionable feedback for customer
+    return str(e)
+
+
+def collect_s3_buckets(session, account_id="unknown", metrics_mode=METRICS_MODE_BULK, summary=False,
+                       scheduler=None):
+    """
+    HeadBucket calls for buckets of unknown region and the CloudWatch queries of each region run
+    through scheduler.map(), so they count against the run's and the account's unit limits.
+    """
     s3 = get_client(session, "s3")
     results = []
+    aggregate = ResourceSummary() if summary else None
+    add_row = aggregate.add_resource if summary else results.append
     error = None # Will store 's3:ListAllMyBuckets' or 's3:ListBucket'
-    buckets_by_region = {}
-    skipped_buckets = []
-    fetched_count = 0
+
+    def run_all(func, items):
+        if scheduler is None:
+            return [func(item) for item in items]
+        return scheduler.map(account_id, func, items)
 
     try:
-        paginator = s3.get_paginator('list_buckets')
         now = datetime.utcnow()
         start_time = now - timedelta(days=2)
 
-        for page in paginator.paginate():
-            for b in page.get("Buckets", []):
-                name = b["Name"]
-                region = None
-
-                try:
-                    response = s3.head_bucket(Bucket=name)
-                    region = response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('x-amz-bucket-region')
-                except botocore.exceptions.ClientError as e:
-                    # Attempt to extract region from error headers
-                    region = e.response.get('Error', {}).get('Region') or \
-                             e.response.get('ResponseMetadata', {}).get('HTTPHeaders', {}).get('x-amz-bucket-region')
-
-                if region:
-                    fetched_count += 1
-                    if region == "EU": region = "eu-west-1"
-                    if region not in buckets_by_region:
-                        buckets_by_region[region] = []
-                    buckets_by_region[region].append(name)
-                else:
-                    skipped_buckets.append(name)
-
-        # Only notify if there are actual skips
+        # Step 1: Region resolution. ListBuckets region data and the cache from
+        # previous runs are used first; only the remaining buckets need HeadBucket.
+        bucket_regions = _bucket_regions(s3.get_paginator('list_buckets').paginate(), account_id)
+        unresolved = [name for name, region in bucket_regions.items() if not region]
+        for name, region in zip(unresolved, run_all(lambda n: _resolve_bucket_region(s3, n), unresolved)):
+            bucket_regions[name] = region
+        buckets_by_region, skipped_buckets = _group_by_region(account_id, bucket_regions)
         if skipped_buckets:
-            logger.info(
-                f"s3:HeadBucket failed to resolve {len(skipped_buckets)} regions (Fetched: {fetched_count}). "
-                f"Action required: add 's3:ListBucket' permission.",
-                extra={'account_id': account_id}
-            )
             error = "s3:ListBucket"
 
-        # Step 2: Regional CloudWatch Queries
-        for region, bucket_names in buckets_by_region.items():
-            cw = get_client(session, "cloudwatch", region_name=region)
-            chunk_size = 250
-
-            for i in range(0, len(bucket_names), chunk_size):
-                chunk = bucket_names[i:i + chunk_size]
-                queries = []
-                for idx, b_name in enumerate(chunk):
-                    queries.append({
-                        'Id': f'size_{idx}',
-                        'MetricStat': {
-                            'Metric': {
-                                'Namespace': 'AWS/S3',
-                                'MetricName': 'BucketSizeBytes',
-                                'Dimensions': [
-                                    {'Name': 'BucketName', 'Value': b_name},
-                                    {'Name': 'StorageType', 'Value': 'StandardStorage'}
-                                ]
-                            },
-                            'Period': 86400,
-                            'Stat': 'Average'
-                        },
-                        'Label': f"{b_name}|size"
-                    })
-                    queries.append({
-                        'Id': f'count_{idx}',
-                        'MetricStat': {
-                            'Metric': {
-                                'Namespace': 'AWS/S3',
-                                'MetricName': 'NumberOfObjects',
-                                'Dimensions': [
-                                    {'Name': 'BucketName', 'Value': b_name},
-                                    {'Name': 'StorageType', 'Value': 'AllStorageTypes'}
-                                ]
-                            },
-                            'Period': 86400,
-                            'Stat': 'Average'
-                        },
-                        'Label': f"{b_name}|count"
-                    })
-
-                try:
-                    response = cw.get_metric_data(MetricDataQueries=queries, StartTime=start_time, EndTime=now)
-                    metrics_map = {res['Label']: (res['Values'][0] if res['Values'] else 0) for res in
-                                   response['MetricDataResults']}
-
-                    for b_name in chunk:
-                        results.append({
-                            "account_id": account_id,
-                            "resource": "s3_bucket",
-                            "region": region,
-                            "bucket_size_gb": round(metrics_map.get(f"{b_name}|size", 0) / (1024 ** 3), 2),
-                            "bucket_doc_num": int(metrics_map.get(f"{b_name}|count", 0))
-                        })
-                except Exception:
-                    for b_name in chunk:
-                        results.append(
-                            {"account_id": account_id, "resource": "s3_bucket", "region": region, "bucket_size_gb": 0,
-                             "bucket_doc_num": 0})
-
-        for b_name in skipped_buckets:
-            results.append({
-                "account_id": account_id,
-                "resource": "s3_bucket",
-                "region": "Unknown",
-                "bucket_size_gb": 0,
-                "bucket_doc_num": 0
-            })
+        # Step 2: Regional CloudWatch Queries, one region per unit
+        regions = list(buckets_by_region)
+        region_metrics = dict(zip(regions, run_all(
+            lambda region: _collect_region_metrics(session, region, buckets_by_region[region], metrics_mode,
+                                                   start_time, now), regions)))
+        error = error or _bucket_rows(account_id, buckets_by_region, region_metrics, skipped_buckets, add_row,
+                                      rounded=not summary)
 
     except Exception as e:
-        if "AccessDenied" in str(e):
-            error = "s3:ListAllMyBuckets"  # Actionable feedback for customer
-        else:
-            error = str(e)
+        error = _list_error(e)
+
+    if aggregate is not None:
+        results = aggregate.rows()
+    return results, error
+
+
+async def collect_s3_buckets_async(session, account_id="unknown", metrics_mode=METRICS_MODE_BULK, summary=False,
+                                   engine=None, scheduler=None):
+    """collect_s3_buckets() on the async engine: the HeadBucket and CloudWatch calls go through engine.map()."""
+    s3 = get_client(session, "s3")
+    results = []
+    aggregate = ResourceSummary() if summary else None
+    add_row = aggregate.add_resource if summary else results.append
+    error = None
+
+    try:
+        now = datetime.utcnow()
+        start_time = now - timedelta(days=2)
+
+        pages = [page async for page in engine.paginate("s3", s3.get_paginator('list_buckets'))]
+        bucket_regions = _bucket_regions(pages, account_id)
+        unresolved = [name for name, region in bucket_regions.items() if not region]
+        resolved = await engine.map(account_id, "s3", lambda n: _resolve_bucket_region(s3, n), unresolved)
+        for name, region in zip(unresolved, resolved):
+            bucket_regions[name] = region
+        buckets_by_region, skipped_buckets = _group_by_region(account_id, bucket_regions)
+        if skipped_buckets:
+            error = "s3:ListBucket"
+
+        regions = list(buckets_by_region)
+        region_metrics = dict(zip(regions, await engine.map(
+            account_id, "cloudwatch",
+            lambda region: _collect_region_metrics(session, region, buckets_by_region[region], metrics_mode,
+                                                   start_time, now), regions)))
+        error = error or _bucket_rows(account_id, buckets_by_region, region_metrics, skipped_buckets, add_row,
+                                      rounded=not summary)
+
+    except Exception as e:
+        error = _list_error(e)
+
+    if aggregate is not None:
+        results = aggregate.rows()
+    return results, error
+
+
+def take_bucket_region_stats(account_id):
+    """The account's cached bucket regions, for the parent of a --processes worker."""
+    return _region_cache.get(account_id)
+
+
+def add_bucket_region_stats(account_id, regions):
+    if regions is not None and regions != _region_cache.get(account_id):
+        _region_cache.set(account_id, regions)
+
+
+def save_bucket_regions():
+    """Writes the bucket regions learned by this run; called once at the end of a scan."""
+    try:
+        _region_cache.save()
+    except OSError:
+        pass
+
 
-    return results, error
\ No newline at end of file
+register_collector(collect_s3_buckets, collect_s3_buckets_async, scope=GLOBAL, service="s3",
+                   permissions=["s3:ListAllMyBuckets", "s3:ListBucket", "cloudwatch:GetMetricData"],
+                   options={"metrics_mode": "s3_metrics_mode", "scheduler": "scheduler"})
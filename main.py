@@ -2,19 +2,50 @@ import warnings
 warnings.filterwarnings("ignore", message=".*Boto3 will no longer support Python 3.9.*")
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 import logging
+import math
+import multiprocessing
+import os
+import shutil
 import sys
+import threading
+import time
 import argparse
+import glob
+import heapq
+import json
 import boto3
 import botocore.exceptions
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from utils.regions import list_regions
-from output.writer import write_output
+from concurrent.futures import (Future, ThreadPoolExecutor, wait, CancelledError,
+                                TimeoutError as FutureTimeoutError)
+from utils.regions import DISCOVERY_REGION, list_regions, probe_region
+from utils.region_plan import RegionPlanner, DEFAULT_RECHECK_DAYS
+from utils.scheduler import ScanScheduler
+from utils.async_engine import AsyncEngine
+from utils.config_helper import (prepare_session, release_session, client_pool_stats, take_client_pool_stats,
+                                 add_client_pool_stats)
+from utils.credentials import (get_role_session, prefetch_role_sessions, release_role_session,
+                               credential_stats, take_credential_stats, add_credential_stats)
+from utils.summary import ResourceSummary, SUMMARY_LEVELS, count_resources
+from utils.checkpoint import CheckpointStore, GLOBAL_SCOPE, CHECKPOINT_PATH
+from utils.result_cache import ResultCache, DEFAULT_MAX_ENTRIES
+from utils.tag_classifier import load_tag_rules
+from utils.api_metrics import api_metrics
+from utils.rate_limit import (REPORT_SECONDS, rate_limit_stats, live_rate_limit_stats, take_rate_limit_stats,
+                              add_rate_limit_stats)
+from utils.unit_costs import UnitCostHistory
+from utils.permissions import MIN_DENIED_REGIONS, PermissionCache
+from utils.inventory_service import InventoryService
+from utils.sampling import StratifiedSampler, parse_sample_size
+from utils.worker_pool import ProcessAccountPool, WorkerError
+from utils.sharding import (parse_shard, shard_dir, select_shard, load_shard_costs, longest_first,
+                            record_account_costs, write_shard_meta, read_shard_meta)
+from output.writer import AccountRows, StreamingWriter, make_spill_dir
+from output.columnar import ColumnarWriter
+from utils.cost_estimate import estimate_file, vectorized_available
+from utils.pricing import PricingTable
 
-from collectors.ec2 import collect_ec2_instances
-from collectors.ebs import collect_ebs_volumes
-from collectors.s3 import collect_s3_buckets
-from collectors.lambda_functions import collect_lambda_functions
-from collectors.asgConverter import collect_asg_as_ec2_equivalent
+from collectors import registered_collectors, GLOBAL, REGIONAL
+from collectors.s3 import add_bucket_region_stats, save_bucket_regions, take_bucket_region_stats
 
 logging.basicConfig(
     level=logging.INFO,
@@ -48,100 +79,264 @@ def get_accounts():
 
 
 def get_assumed_session(account_id, role_name):
-    sts = boto3.client("sts")
-    role_arn = f"arn:aws:iam::{account_id}:role/{role_name}"
-    try:
-        response = sts.assume_role(RoleArn=role_arn, RoleSessionName="Scanner")
-        creds = response["Credentials"]
-        return boto3.Session(
-            aws_access_key_id=creds["AccessKeyId"],
-            aws_secret_access_key=creds["SecretAccessKey"],
-            aws_session_token=creds["SessionToken"]
-        ), None
-    except Exception as e:
-        return None, str(e)
+    """
+    Returns (session, error) for the role in 'account_id'. Sessions come from the shared
+    credential broker: they may already be prefetched and renew their credentials before expiry.
+    """
+    return get_role_session(account_id, role_name)
 
 
-def execute_collector(account_id, role_name, func, *args, **kwargs):
+def execute_collector(account_id, func, *args, **kwargs):
     """
     Executes a collector function.
     Explicitly passes account_id as it is required by all collectors.
+    Sessions renew their credentials before they expire, and a collector reports a failed
+    call as its unit's error, so an expired token never reaches this point.
     """
-    try:
-        return func(*args, account_id=account_id, **kwargs)
-    except botocore.exceptions.ClientError as e:
-        if e.response['Error']['Code'] in ['ExpiredToken', 'TokenRefreshRequired']:
-            log_info(f"Session expired mid-scan for {account_id}. Refreshing session.", account_id)
-            new_session = get_assumed_session(account_id, role_name)
-            if not new_session:
-                return [], f"Failed to refresh session"
-
-            kwargs['session'] = new_session
-            return func(*args, account_id=account_id, **kwargs)
-        raise e
-
-
-def scan_region_logic(session, region, account_id, role_name):
-    region_results = []
-    region_errors = set()
-
-    collectors = [
-        collect_ec2_instances,
-        collect_ebs_volumes,
-        collect_lambda_functions,
-        collect_asg_as_ec2_equivalent
-    ]
-
-    for collector in collectors:
-        data, error = execute_collector(
-            account_id,
-            role_name,
-            collector,
-            session=session,
-            region=region
-        )
+    return func(*args, account_id=account_id, **kwargs)
 
-        if data:
-            region_results.extend(data)
-        if error:
-            region_errors.add(error)
 
-    return region_results, list(region_errors)
+async def execute_collector_async(account_id, func, *args, **kwargs):
+    """Async counterpart of execute_collector for the collectors' *_async variants."""
+    return await func(*args, account_id=account_id, **kwargs)
 
 
-def scan_account(account_info, role_name, regions_filter, is_runner_node, progress_prefix):
-    account_id = account_info["id"]
-    name = account_info["name"]
-    suffix = " [Runner Account]" if is_runner_node else ""
+class ScanContext:
+    """
+    Run-wide settings and shared services used by every account scan.
+    'scheduler' is either a ScanScheduler (threads) or an AsyncEngine (asyncio); None in the
+    parent of --processes workers.
+    """
+
+    def __init__(self, role_name, regions_filter, runner_id, scheduler, s3_metrics_mode="bulk", summary=False,
+                 checkpoint=None, result_cache=None, region_planner=None, unit_costs=None, permissions=None,
+                 preflight=False, warm_sessions=False, spill_dir=None):
+        self.role_name = role_name
+        self.regions_filter = regions_filter
+        self.runner_id = runner_id
+        self.scheduler = scheduler
+        self.s3_metrics_mode = s3_metrics_mode
+        self.summary = summary
+        self.checkpoint = checkpoint
+        self.result_cache = result_cache
+        self.region_planner = region_planner
+        self.unit_costs = unit_costs
+        self.permissions = permissions
+        self.preflight = preflight
+        # Service mode keeps every account's session and clients between refreshes.
+        self.warm_sessions = warm_sessions
+        # With a spill directory, account rows go to per-account files instead of lists.
+        self.spill_dir = spill_dir
+        self.runner_session = None
+        # account_id -> seconds spent scanning it, used to balance future shards.
+        self.account_seconds = {}
 
-    log_info(f"{progress_prefix} Starting scan for: {name} ({account_id}){suffix}", account_id)
 
-    if is_runner_node:
-        session = boto3.Session()
+def make_scan_context(args, runner_id, regions_list, checkpoint=None, result_cache=None, processes=1,
+                      scheduler=True, spill_dir=None):
+    """
+    The ScanContext of a scan with the given options; with --processes, that of one of 'processes'
+    workers. The parent of the workers scans nothing itself and passes 'scheduler=False'.
+    """
+    workers = math.ceil(args.workers / processes)
+    if not scheduler:
+        scheduler = None
+    elif args.engine == "async":
+        scheduler = AsyncEngine(max_workers=workers, per_account=args.account_workers,
+                                io_threads=math.ceil(args.io_threads / processes))
     else:
-        session, error_msg = get_assumed_session(account_id, role_name)
-        if not session:
-            log_warn(f"Skipping {name}: Role '{role_name}' cannot be assumed.", account_id)
-            return None, [f"AssumeRole Error: {error_msg}"]
+        scheduler = ScanScheduler(max_workers=workers, per_account=args.account_workers)
+    return ScanContext(args.role, regions_list, runner_id, scheduler, s3_metrics_mode=args.s3_metrics,
+                       summary=bool(args.summary), checkpoint=checkpoint, result_cache=result_cache,
+                       region_planner=RegionPlanner(args.region_recheck_days) if args.prune_regions else None,
+                       unit_costs=UnitCostHistory(),
+                       permissions=PermissionCache(registered_collectors()) if args.permission_check != "off" else None,
+                       preflight=args.permission_check == "preflight",
+                       warm_sessions=args.serve is not None, spill_dir=spill_dir)
+
+
+def start_scan_worker(config):
+    """
+    Sets up a --processes worker: its own default session, scheduler, caches and statistics.
+    Returns the functions ProcessAccountPool calls in the worker, to scan an account and to
+    cancel the scans in progress.
+    """
+    args = config["args"]
+    if multiprocessing.get_start_method() != "fork":
+        # A forked worker inherits these from the parent; a spawned one starts from scratch.
+        for path in [p.strip() for p in (args.tag_rules or "").split(",") if p.strip()]:
+            load_tag_rules(path)
+        if args.trace:
+            api_metrics().enable_trace()
+    boto3.setup_default_session()
+    prepare_session(boto3.DEFAULT_SESSION, "SYSTEM")
+    checkpoint = CheckpointStore(signature=config["signature"], resume=True, path=config["checkpoint_path"])
+    result_cache = None
+    if args.max_age is not None:
+        result_cache = ResultCache(signature=config["signature"], max_age=args.max_age * 3600,
+                                   max_entries=args.cache_size)
+    ctx = make_scan_context(args, config["runner_id"], config["regions"], checkpoint, result_cache,
+                            processes=config["processes"], spill_dir=config["spill_dir"])
+    # Counters inherited from the parent were already reported there.
+    api_metrics().take_stats()
+    take_client_pool_stats()
+    take_credential_stats()
+
+    def scan(acc, progress):
+        results, errors, failure = scan_account_safe(acc, progress, ctx)
+        return results, errors, failure, take_worker_stats(ctx, acc["id"])
+
+    def cancel():
+        ctx.scheduler.shutdown(wait=False, cancel_pending=True)
+
+    return scan, cancel
+
+
+def take_worker_stats(ctx, account_id):
+    """
+    What a --processes worker measured and learned since its previous report, sent to the parent
+    with the account's results: the account's scan time, rate limiters and region plan, and the
+    worker's API metrics, counters and unit times (these may include accounts still in progress).
+    """
+    stats = {
+        "seconds": ctx.account_seconds.pop(account_id, None),
+        "api_metrics": api_metrics().take_stats(),
+        "client_pool": take_client_pool_stats(),
+        "credentials": take_credential_stats(),
+        "rate_limits": take_rate_limit_stats(account_id),
+        "unit_costs": ctx.unit_costs.take_stats(),
+        "checkpoint": ctx.checkpoint.take_stats(),
+        "bucket_regions": take_bucket_region_stats(account_id),
+    }
+    if ctx.permissions:
+        stats["permissions"] = ctx.permissions.take_stats()
+    if ctx.result_cache:
+        stats["result_cache"] = ctx.result_cache.take_stats()
+    if ctx.region_planner:
+        stats["region_plan"] = ctx.region_planner.take_stats(account_id)
+    return stats
+
 
-    account_results = []
-    account_errors = set()
+def add_worker_stats(ctx, account_id, stats):
+    """Merges take_worker_stats() of a worker into the run's own statistics and caches."""
+    if stats["seconds"] is not None:
+        ctx.account_seconds[account_id] = stats["seconds"]
+    api_metrics().add_stats(stats["api_metrics"])
+    add_client_pool_stats(stats["client_pool"])
+    add_credential_stats(stats["credentials"])
+    add_rate_limit_stats(stats["rate_limits"])
+    ctx.unit_costs.add_stats(stats["unit_costs"])
+    ctx.checkpoint.add_stats(stats["checkpoint"])
+    add_bucket_region_stats(account_id, stats["bucket_regions"])
+    if ctx.permissions and "permissions" in stats:
+        ctx.permissions.add_stats(stats["permissions"])
+    if ctx.result_cache and "result_cache" in stats:
+        ctx.result_cache.add_stats(stats["result_cache"])
+    if ctx.region_planner and "region_plan" in stats:
+        ctx.region_planner.add_stats(account_id, stats["region_plan"])
 
+
+def completed_future(result):
+    f = Future()
+    f.set_result(result)
+    return f
+
+
+def run_unit(ctx, unit, func, *args, **kwargs):
+    """
+    Runs one (account_id, region, collector_name) work unit and checkpoints
+    its result as soon as it completes. Units whose permissions the account has
+    already denied return the denial without calling AWS.
+    """
+    denied = ctx.permissions.denied_action(unit[0], unit[2]) if ctx.permissions else None
+    if denied:
+        return skip_denied_unit(denied)
+    token = api_metrics().unit_started(unit)
+    start = time.perf_counter()
     try:
-        s3_data, s3_err = collect_s3_buckets(session, account_id)
-        if s3_data: account_results.extend(s3_data)
-        if s3_err:
-            if isinstance(s3_err, list):
-                account_errors.update(s3_err)
-            else:
-                account_errors.add(s3_err)
-    except Exception:
-        pass
+        data, error = func(*args, **kwargs)
+    finally:
+        api_metrics().unit_finished(token, unit)
+    if ctx.unit_costs:
+        ctx.unit_costs.record(*unit, time.perf_counter() - start)
+    if ctx.permissions:
+        ctx.permissions.record(unit[0], unit[2], unit[1], error)
+    if ctx.checkpoint:
+        ctx.checkpoint.put(*unit, data, error)
+    # A failed unit (denied, throttled, ...) is rescanned by the next run instead of being served for --max-age.
+    if ctx.result_cache and not error:
+        ctx.result_cache.put(*unit, data, error)
+    return data, error
+
+
+async def run_unit_async(ctx, unit, func, *args, **kwargs):
+    """Async counterpart of run_unit; the checkpoint writes run on the engine's I/O pool."""
+    denied = ctx.permissions.denied_action(unit[0], unit[2]) if ctx.permissions else None
+    if denied:
+        return skip_denied_unit(denied)
+    token = api_metrics().unit_started(unit)
+    start = time.perf_counter()
+    try:
+        data, error = await func(*args, **kwargs)
+    finally:
+        api_metrics().unit_finished(token, unit)
+    if ctx.unit_costs:
+        ctx.unit_costs.record(*unit, time.perf_counter() - start)
+    if ctx.permissions:
+        ctx.permissions.record(unit[0], unit[2], unit[1], error)
+    if ctx.checkpoint:
+        await ctx.scheduler.call(None, ctx.checkpoint.put, *unit, data, error)
+    if ctx.result_cache and not error:
+        await ctx.scheduler.call(None, ctx.result_cache.put, *unit, data, error)
+    return data, error
+
+
+def skip_denied_unit(denied):
+    """
+    The result a denied call would have produced. It is kept out of the checkpoint and the
+    result cache, and the unit's cost history is left as is: a later run calls AWS again.
+    """
+    return [], denied
+
+
+def preflight_regions(regions):
+    """
+    The regions pre-flight probes run in: enabled regions only, starting with the one region
+    discovery just reached, and as many as an account-wide denial needs.
+    """
+    known = [DISCOVERY_REGION] if DISCOVERY_REGION in regions else []
+    known += [r for r in regions if r != DISCOVERY_REGION]
+    return known[:MIN_DENIED_REGIONS]
+
+
+def preflight_permissions(ctx, session, account_id, regions, collectors):
+    """Probes the permissions of every collector in 'regions' in parallel and caches the denials."""
+    probes = [(region, c) for region in regions for c in collectors if c.probe]
+    futures = [ctx.scheduler.submit(account_id, c.probe, session, region) for region, c in probes]
+    for (region, collector), f in zip(probes, futures):
+        try:
+            error = f.result()
+        except Exception:
+            continue
+        ctx.permissions.record_probe(account_id, collector.name, region, error)
 
-    available_regions, region_error = list_regions(session)
-    if region_error:
-        log_warn(f"Region discovery failed. Falling back to default regional list.", account_id)
-        account_errors.add("ec2:DescribeRegions")
+
+def plan_regions(ctx, session, account_id):
+    """
+    Returns the regions to scan for an account and whether region discovery failed.
+    With a region planner, enabled regions come from its cache when fresh, regions without
+    recent history are probed and regions known to be empty are pruned.
+    """
+    regions_filter = ctx.regions_filter
+    planner = ctx.region_planner
+    available_regions = planner.cached_regions(account_id) if planner else None
+    region_error = None
+    if available_regions is None:
+        available_regions, region_error = list_regions(session)
+        if region_error:
+            log_warn(f"Region discovery failed. Falling back to default regional list.", account_id)
+        elif planner:
+            planner.store_regions(account_id, available_regions)
 
     if regions_filter:
         if region_error:
@@ -155,21 +350,256 @@ def scan_account(account_info, role_name, regions_filter, is_runner_node, progre
     else:
         target_regions = available_regions
 
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        futures = [executor.submit(scan_region_logic, session, r, account_id, role_name) for r in target_regions]
-        for f in as_completed(futures):
-            r_data, r_errors = f.result()
-            if r_data:
-                account_results.extend(r_data)
-            if r_errors:
-                account_errors.update(r_errors)
+    if not planner:
+        return target_regions, bool(region_error)
 
-    if account_errors:
-        formatted_errors = ", ".join(sorted(account_errors))
-        log_warn(f"Partial scan. Missing permissions: {formatted_errors}", account_id)
+    scan, probe, pruned = planner.classify(account_id, target_regions)
+    probes = [ctx.scheduler.submit(account_id, probe_region, session, region) for region in probe]
+    for region, f in zip(probe, probes):
+        if f.result():
+            scan.append(region)
+        else:
+            planner.record(account_id, region, 0)
+            pruned[region] = "probe found no EBS volumes or Lambda functions"
 
-    log_info(f"Scan complete. Found {len(account_results)} resources.", account_id)
-    return account_results, list(account_errors)
+    planner.record_decisions(account_id, scan, pruned)
+    if pruned:
+        log_info(f"Pruned {len(pruned)} empty regions: {', '.join(sorted(pruned))}", account_id)
+    return [r for r in target_regions if r not in pruned], bool(region_error)
+
+
+def stored_units(ctx, account_id, peek=False):
+    """
+    Looks up every unit of the account in the checkpoint and result cache. Returns
+    ({(region, collector_name): (results, error) or None}, the stored region plan or None).
+    With 'peek' nothing is counted as reused.
+    """
+    def stored(region, collector_name):
+        for store in (ctx.checkpoint, ctx.result_cache):
+            if not store:
+                continue
+            unit = store.peek(account_id, region, collector_name) if peek else \
+                store.get(account_id, region, collector_name)
+            if unit:
+                return unit
+        return None
+
+    units = {(GLOBAL_SCOPE, c.name): stored(GLOBAL_SCOPE, c.name) for c in registered_collectors(GLOBAL)}
+    plan = stored(GLOBAL_SCOPE, plan_regions.__name__)
+    if plan:
+        for region in plan[0]:
+            for collector in registered_collectors(REGIONAL):
+                units[(region, collector.name)] = stored(region, collector.name)
+    return units, plan
+
+
+def account_stored(ctx, account_id):
+    """True when every unit of the account is stored, so its scan needs no session."""
+    if not ctx.checkpoint and not ctx.result_cache:
+        return False
+    units, plan = stored_units(ctx, account_id, peek=True)
+    return bool(plan) and all(units.values())
+
+
+def scan_account(account_info, progress_prefix, ctx):
+    """
+    Scans a single account by submitting one unit per global collector and one unit per
+    (region, regional collector) to the shared scheduler, then waits for all of them.
+    Units already in the checkpoint store, or fresh enough in the result cache,
+    are reused instead of being rescanned. The rest are submitted longest first,
+    by their cost in previous runs.
+    Results are assembled in registry order (global collectors, then each region)
+    so the output matches a serial scan.
+    """
+    account_id = account_info["id"]
+    name = account_info["name"]
+    is_runner_node = (account_id == ctx.runner_id)
+    suffix = " [Runner Account]" if is_runner_node else ""
+    global_collectors = registered_collectors(GLOBAL)
+    regional_collectors = registered_collectors(REGIONAL)
+
+    log_info(f"{progress_prefix} Starting scan for: {name} ({account_id}){suffix}", account_id)
+
+    units_stored, plan_stored = stored_units(ctx, account_id)
+    fully_stored = plan_stored and all(units_stored.values())
+    if fully_stored:
+        session = None
+        log_info(f"All units restored from checkpoint or result cache; skipping AWS calls.", account_id)
+    elif is_runner_node:
+        session = ctx.runner_session or prepare_session(boto3.Session(), account_id)
+        if ctx.warm_sessions:
+            ctx.runner_session = session
+    else:
+        session, error_msg = get_assumed_session(account_id, ctx.role_name)
+        if not session:
+            log_warn(f"Skipping {name}: Role '{ctx.role_name}' cannot be assumed.", account_id)
+            return None, [f"AssumeRole Error: {error_msg}"]
+
+    # Rows are added unit by unit; with a spill directory they go straight to the account's file.
+    account_results = AccountRows(ctx.spill_dir, account_id) if ctx.spill_dir else []
+    unit_futures = {}
+    try:
+        account_errors = set()
+
+        if ctx.scheduler.is_async:
+            unit_runner, collector_runner = run_unit_async, execute_collector_async
+            engine_kwargs = {"engine": ctx.scheduler}
+            collector_impl = lambda collector: collector.async_func
+        else:
+            unit_runner, collector_runner = run_unit, execute_collector
+            engine_kwargs = {}
+            collector_impl = lambda collector: collector.func
+
+        def submit_units(units):
+            pending = [(region, c) for region, c in units if not units_stored.get((region, c.name))]
+            if ctx.unit_costs:
+                pending = ctx.unit_costs.longest_first(account_id, pending)
+            for region, collector in units:
+                unit_stored = units_stored.get((region, collector.name))
+                if unit_stored:
+                    unit_futures[(region, collector.name)] = completed_future(unit_stored)
+            for region, collector in pending:
+                region_kwargs = {} if collector.scope == GLOBAL else {"region": region}
+                future = ctx.scheduler.submit(
+                    account_id,
+                    unit_runner,
+                    ctx,
+                    (account_id, region, collector.name),
+                    collector_runner,
+                    account_id,
+                    collector_impl(collector),
+                    session=session,
+                    summary=ctx.summary,
+                    **region_kwargs,
+                    **collector.kwargs(ctx),
+                    **engine_kwargs
+                )
+                unit_futures[(region, collector.name)] = future
+
+        # Global units don't depend on region discovery, so they start first.
+        submit_units([(GLOBAL_SCOPE, c) for c in global_collectors])
+
+        if plan_stored:
+            target_regions, region_failed = plan_stored
+        else:
+            plan_unit = (account_id, GLOBAL_SCOPE, plan_regions.__name__)
+            target_regions, region_failed = run_unit(ctx, plan_unit, plan_regions, ctx, session, account_id)
+        if region_failed:
+            account_errors.add("ec2:DescribeRegions")
+
+        # With a region planner the busiest regions come first among units of equal cost.
+        submit_order = target_regions
+        if ctx.region_planner:
+            submit_order = ctx.region_planner.busiest_first(account_id, target_regions)
+        pending = [c for c in regional_collectors
+                   if any(not units_stored.get((region, c.name)) for region in submit_order)]
+        # Without region discovery the regions may not be enabled, and a refusal there says nothing.
+        if ctx.permissions and ctx.preflight and session is not None and not region_failed and pending:
+            preflight_permissions(ctx, session, account_id, preflight_regions(submit_order), pending)
+        submit_units([(region, c) for region in submit_order for c in regional_collectors])
+
+        def unit_result(region, collector):
+            """Adds a finished unit's rows to the account and returns their resource count."""
+            units_stored.pop((region, collector.name), None)
+            data, error = unit_futures.pop((region, collector.name)).result()
+            if isinstance(error, list):
+                account_errors.update(error)
+            elif error:
+                account_errors.add(error)
+            account_results.extend(data or [])
+            return count_resources(data or []), bool(error)
+
+        resources = 0
+        for collector in global_collectors:
+            try:
+                resources += unit_result(GLOBAL_SCOPE, collector)[0]
+            except Exception:
+                pass
+
+        for region in target_regions:
+            region_resources = 0
+            region_failed_units = False
+            for collector in regional_collectors:
+                count, failed = unit_result(region, collector)
+                region_resources += count
+                region_failed_units = region_failed_units or failed
+            resources += region_resources
+            # Regions with a failed unit are never remembered as empty.
+            if ctx.region_planner and region_failed_units:
+                ctx.region_planner.record_failed(account_id, region)
+            elif ctx.region_planner:
+                ctx.region_planner.record(account_id, region, region_resources)
+
+        if account_errors:
+            formatted_errors = ", ".join(sorted(account_errors))
+            log_warn(f"Partial scan. Missing permissions or failed calls: {formatted_errors}", account_id)
+
+        log_info(f"Scan complete. Found {resources} resources.", account_id)
+        return account_results, list(account_errors)
+    except BaseException:
+        if ctx.spill_dir:
+            account_results.discard()
+        raise
+    finally:
+        # Let in-flight units finish before their clients are evicted.
+        wait(list(unit_futures.values()))
+        if ctx.permissions:
+            ctx.permissions.forget(account_id)
+        if not ctx.warm_sessions:
+            if session is not None:
+                release_session(session)
+            if not is_runner_node:
+                release_role_session(account_id, ctx.role_name)
+
+
+def scan_account_safe(acc, progress, ctx):
+    """Wraps scan_account so that one failing account never aborts the others."""
+    print("")
+    start = time.monotonic()
+    try:
+        results, errors = scan_account(acc, progress, ctx)
+        return results, errors, None
+    except CancelledError:
+        # The run is stopping (interrupted, or out of --time-budget); its units were cancelled.
+        return None, None, "Scan stopped before completion"
+    except Exception as e:
+        error_msg = f"Unexpected failure: {str(e)}"
+        log_warn(f"Failed to scan {acc['name']}: {error_msg}", acc['id'])
+        return None, None, error_msg
+    finally:
+        ctx.account_seconds[acc['id']] = round(time.monotonic() - start, 3)
+
+
+def report_audit(audit_report, name_map, audit_filename="output/audit_report.txt"):
+    """Prints the per-account errors, or writes them to 'audit_filename' when 10 or more accounts are affected."""
+    if len(audit_report) > 0 and len(audit_report) < 10:
+        print("\n" + "=" * 60)
+        log_warn("Errors report", "SYSTEM")
+        print("=" * 60)
+        for acc_id, issues in audit_report.items():
+            unique_issues = sorted(list(set(issues)))
+            print(f"\nAccount ({acc_id}):")
+            for issue in unique_issues:
+                print(f"  - {issue}")
+        print("=" * 60 + "\n")
+    elif len(audit_report) >=10:
+        try:
+            with open(audit_filename, "w", encoding="utf-8") as f:
+                f.write("=" * 80 + "\n")
+                f.write(f"Errors Report: \n")
+                f.write("=" * 80 + "\n\n")
+
+                for acc_id, issues in audit_report.items():
+                    acc_name = name_map.get(acc_id, "Unknown Account")
+                    f.write(f"Account: {acc_name} ({acc_id})\n")
+                    for issue in sorted(list(set(issues))):
+                        f.write(f"  [X] {issue}\n")
+                    f.write("-" * 40 + "\n")
+
+            print("")
+            log_info(f"Detailed audit report saved to → {audit_filename}", "SYSTEM")
+        except Exception as e:
+            log_warn(f"Failed to write audit file: {str(e)}", "SYSTEM")
 
 
 def main():
@@ -185,17 +615,124 @@ Documentation & Updates:
                         help="IAM Role for member accounts.")
     parser.add_argument("--accounts", type=str, help="Comma-separated account IDs to scan.")
     parser.add_argument("--regions", type=str, help="Comma-separated regions to scan.")
+    parser.add_argument("--workers", type=int, default=32,
+                        help="Maximum number of (account, region, collector) units running at once.")
+    parser.add_argument("--account-workers", type=int, default=5,
+                        help="Maximum number of concurrent units per account.")
+    parser.add_argument("--parallel-accounts", type=int, default=10,
+                        help="Maximum number of accounts scanned at the same time.")
+    parser.add_argument("--engine", choices=["threads", "async"], default="threads",
+                        help="Collection engine: a thread per work unit, or asyncio coroutines on one event loop.")
+    parser.add_argument("--io-threads", type=int, default=32,
+                        help="Threads that run blocking AWS calls for the async engine.")
+    parser.add_argument("--processes", nargs="?", const=0, type=int, metavar="N",
+                        help="Scan accounts in N worker processes (default: one per CPU core), splitting "
+                             "--parallel-accounts, --workers and --io-threads between them.")
+    parser.add_argument("--s3-metrics", choices=["bulk", "per-bucket"], default="bulk",
+                        help="S3 CloudWatch query mode: 'bulk' SEARCH queries per region, or legacy 'per-bucket'.")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="Write output/output.jsonl (JSON Lines) instead of output/output.json.")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Write a compressed columnar output/output.scol instead of JSON and CSV.")
+    parser.add_argument("--unsorted-csv", action="store_true",
+                        help="Skip sorting output.csv (avoids the external merge step).")
+    parser.add_argument("--resume", action="store_true",
+                        help="Resume an interrupted scan, skipping units already saved in the checkpoint.")
+    parser.add_argument("--max-age", type=float, metavar="HOURS",
+                        help="Reuse cached (account, region, collector) results younger than HOURS "
+                             "and only rescan stale or missing ones.")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="Maximum number of units kept in the result cache (least recently used are evicted).")
+    parser.add_argument("--summary", nargs="?", const="region", choices=SUMMARY_LEVELS,
+                        help="Emit grouped counts and totals instead of one row per resource, "
+                             "per region (default), account or organization.")
+    parser.add_argument("--prune-regions", action="store_true",
+                        help="Cache region discovery, probe regions without history and skip regions "
+                             "that were empty in recent scans.")
+    parser.add_argument("--region-recheck-days", type=float, default=DEFAULT_RECHECK_DAYS,
+                        help="With --prune-regions, rescan empty regions after this many days.")
+    parser.add_argument("--tag-rules", type=str, metavar="FILE[,FILE]",
+                        help="JSON files with extra tag rules for excluding Kubernetes/ASG resources.")
+    parser.add_argument("--shard", type=str, metavar="i/N",
+                        help="Scan only shard i of N of the account list; combine shards with 'main.py merge'.")
+    parser.add_argument("--shard-costs", type=str, metavar="FILE",
+                        help="Balance --shard assignment on the account scan times in FILE (an account_costs.json "
+                             "from a previous run); every runner must pass the same file.")
+    parser.add_argument("--permission-check", choices=["fast-fail", "preflight", "off"], default="fast-fail",
+                        help="Skip a collector in an account's remaining regions once its API call is denied "
+                             "(fast-fail), also probe each collector's permissions up front (preflight), or "
+                             "call every region (off).")
+    parser.add_argument("--serve", nargs="?", const=8080, type=int, metavar="PORT",
+                        help="Keep running: rescan accounts on a rolling schedule and serve the latest inventory "
+                             "over a local HTTP/JSON API (default port 8080).")
+    parser.add_argument("--bind", type=str, default="127.0.0.1",
+                        help="Address the --serve API listens on.")
+    parser.add_argument("--refresh-minutes", type=float, default=60,
+                        help="With --serve, how often every account is rescanned.")
+    parser.add_argument("--sample", type=str, metavar="N|P%",
+                        help="Scan a stratified sample of N accounts (or P%% of them) and extrapolate the totals.")
+    parser.add_argument("--time-budget", type=float, metavar="MINUTES",
+                        help="Stop starting accounts once the budget is spent; totals are extrapolated from "
+                             "the accounts scanned (implies sampling).")
+    parser.add_argument("--trace", action="store_true",
+                        help="Also write a Chrome trace of work units and API calls to output/trace.json.")
+    parser.add_argument("--estimate", action="store_true",
+                        help="Estimate the monthly cost of the scanned resources (same as 'main.py estimate').")
+    parser.add_argument("--pricing", type=str, metavar="FILE[,FILE]",
+                        help="JSON pricing overrides for --estimate.")
     args = parser.parse_args()
+    try:
+        shard = parse_shard(args.shard) if args.shard else None
+    except ValueError as e:
+        parser.error(str(e))
+    if shard and args.columnar:
+        parser.error("--columnar can't be combined with --shard; pass it to 'merge' instead.")
+    if args.serve is not None and (shard or args.resume):
+        parser.error("--serve can't be combined with --shard or --resume.")
+    if args.serve is not None and args.refresh_minutes <= 0:
+        parser.error("--refresh-minutes must be positive.")
+    sampling = args.sample is not None or args.time_budget is not None
+    if sampling and (shard or args.resume or args.serve is not None):
+        parser.error("--sample and --time-budget can't be combined with --shard, --resume or --serve.")
+    if args.time_budget is not None and args.time_budget <= 0:
+        parser.error("--time-budget must be positive.")
+    if args.processes is not None and args.processes < 0:
+        parser.error("--processes must be positive.")
+    if args.processes is not None and args.serve is not None:
+        parser.error("--processes can't be combined with --serve.")
+    processes = (args.processes or os.cpu_count() or 1) if args.processes is not None else 0
+    if shard and args.estimate:
+        parser.error("--estimate can't be combined with --shard; run 'main.py estimate' after 'merge'.")
+    if args.shard_costs and not shard:
+        parser.error("--shard-costs requires --shard.")
+    shard_costs, costs_fingerprint = None, None
+    if args.shard_costs:
+        try:
+            shard_costs, costs_fingerprint = load_shard_costs(args.shard_costs)
+        except (OSError, ValueError, AttributeError) as e:
+            parser.error(f"Can't read --shard-costs {args.shard_costs}: {str(e)}")
+    pricing = load_pricing(args.pricing)
+
+    if args.tag_rules:
+        for path in [p.strip() for p in args.tag_rules.split(",") if p.strip()]:
+            load_tag_rules(path)
+            log_info(f"Loaded tag rules from {path}")
 
+    if args.trace:
+        api_metrics().enable_trace()
+    boto3.setup_default_session()
+    prepare_session(boto3.DEFAULT_SESSION, "SYSTEM")
     sts = boto3.client("sts")
     runner_id = sts.get_caller_identity()["Account"]
 
+    organization_scan = False
     if args.accounts:
         ids = [x.strip() for x in args.accounts.split(",") if x.strip()]
         scan_list = [{"id": aid, "name": f"Manual-{aid}"} for aid in ids]
         log_info(f"Execution Mode: Manual accounts scan ({len(scan_list)} accounts)")
     else:
         accounts = get_accounts()
+        organization_scan = bool(accounts)
         if accounts:
             log_info(f"Execution Mode: Cross-account scan ({len(accounts)} accounts)")
             scan_list = accounts
@@ -203,10 +740,44 @@ Documentation & Updates:
             log_info("Execution Mode: Local account scan (Organization discovery unavailable)")
             scan_list = [{"id": runner_id, "name": "Local-Account"}]
 
-    all_results = []
+    sampler = None
+    if sampling:
+        try:
+            size = parse_sample_size(args.sample, len(scan_list)) if args.sample else None
+        except ValueError as e:
+            parser.error(str(e))
+        sampler = StratifiedSampler(scan_list, size)
+        log_info(f"Sampling mode: up to {sampler.size} of {len(scan_list)} accounts in {len(sampler.strata)} strata"
+                 + (f", time budget {args.time_budget:g} minutes." if args.time_budget else "."))
+
+    output_dir = "output"
+    checkpoint_path = CHECKPOINT_PATH
+    if shard:
+        # Remember each account's position in the full list so 'merge' can restore the serial order.
+        account_index = {acc["id"]: index for index, acc in enumerate(scan_list)}
+        scan_list = select_shard(scan_list, shard[0], shard[1], costs=shard_costs)
+        output_dir = shard_dir(*shard)
+        checkpoint_path = os.path.join(os.path.dirname(CHECKPOINT_PATH), f"scan-shard-{shard[0]}-of-{shard[1]}.sqlite")
+        log_info(f"Shard {shard[0]}/{shard[1]}: {len(scan_list)} accounts. Partial results → {output_dir}")
+
+    # Shards always write JSON Lines so 'merge' can stream them back in account order.
+    json_lines = args.jsonl or bool(shard)
+
+    def make_writer():
+        if args.columnar:
+            return ColumnarWriter(output_dir=output_dir)
+        return StreamingWriter(
+            json_filename="output.jsonl" if json_lines else "output.json",
+            json_lines=json_lines,
+            sort_csv=not args.unsorted_csv,
+            output_dir=output_dir
+        )
+
+    writer = make_writer()
+    summary = ResourceSummary(args.summary) if args.summary else None
     audit_report = {}
 
-    total_accounts = len(scan_list)
+    total_accounts = sampler.size if sampler else len(scan_list)
     full_success_count = 0
     partial_count = 0
 
@@ -215,74 +786,610 @@ Documentation & Updates:
         clean_regions = ", ".join(regions_list)
         log_info(f"Target Regions: [{clean_regions}]")
 
-    for index, acc in enumerate(scan_list, start=1):
-        print("")
-        progress = f"[{index}/{total_accounts}]"
+    scan_signature = {
+        "role": args.role,
+        "regions": regions_list,
+        "summary": bool(args.summary),
+        "s3_metrics": args.s3_metrics,
+        "prune_regions": args.prune_regions
+    }
+    # Service mode always rescans, so it has no checkpoint to resume from.
+    checkpoint = None if args.serve is not None else CheckpointStore(signature=scan_signature, resume=args.resume,
+                                                                       path=checkpoint_path)
+    result_cache = None
+    if args.max_age is not None:
+        result_cache = ResultCache(signature=scan_signature, max_age=args.max_age * 3600,
+                                   max_entries=args.cache_size)
+        log_info(f"Result cache enabled: reusing units scanned in the last {args.max_age:g}h.")
+    if args.resume:
+        if checkpoint.signature_mismatch:
+            log_warn("Checkpoint was created with different scan options; starting a fresh scan.")
+        else:
+            log_info(f"Resuming scan: {checkpoint.completed_units()} completed units found in checkpoint.")
+
+    if args.engine == "async":
+        log_info(f"Async engine: up to {args.workers} units in flight on {args.io_threads} I/O threads.")
+    # Finished accounts wait for their predecessors in the output order as files here, not in memory.
+    spill_dir = make_spill_dir(output_dir) if args.serve is None else None
+    if processes:
+        per_process = math.ceil(args.parallel_accounts / processes)
+        log_info(f"Process mode: {processes} worker processes, each scanning up to {per_process} accounts "
+                 f"with up to {math.ceil(args.workers / processes)} units in flight.")
+        # Workers start before this process runs any thread of its own (forking a multi-threaded
+        # process can deadlock the child), and the accounts are all scanned there: no scheduler here.
+        account_pool = ProcessAccountPool(processes, per_process, start_scan_worker, {
+            "args": args, "runner_id": runner_id, "regions": regions_list, "processes": processes,
+            "signature": scan_signature, "checkpoint_path": checkpoint_path, "spill_dir": spill_dir})
+    ctx = make_scan_context(args, runner_id, regions_list, checkpoint, result_cache, scheduler=not processes,
+                            spill_dir=spill_dir)
+    if args.serve is not None:
+        run_service(ctx, scan_list, args, output_dir, make_writer, pricing, rediscover=organization_scan)
+        return
+    scheduler = ctx.scheduler
+    if not processes:
+        account_pool = ThreadPoolExecutor(max_workers=max(1, args.parallel_accounts), thread_name_prefix="account")
+    # Accounts are submitted through a bounded window, so finished accounts that wait
+    # for a slower predecessor can't accumulate without limit.
+    window = max(1, args.parallel_accounts, processes) * 2
+    # In sampling mode each account is chosen when it is submitted, from the results so far.
+    # Otherwise the slowest accounts of previous runs start first; the output still follows scan_list.
+    submit_order = None if sampler else longest_first(scan_list)
+    queued_accounts = sampler.accounts() if sampler else (scan_list[i] for i in submit_order)
+    # output position -> (account, future); a sampled account's position is its submission number.
+    in_flight = {}
+    submitted = 0
+    next_output = 0
+    deadline = time.monotonic() + args.time_budget * 60 if args.time_budget else None
+    budget_exhausted = False
 
-        try:
-            is_runner = (acc["id"] == runner_id)
-            results, errors = scan_account(acc, args.role, regions_list, is_runner, progress)
+    def budget_left():
+        """False once the remaining budget is shorter than a typical account scan."""
+        if deadline is None:
+            return True
+        remaining = deadline - time.monotonic()
+        seconds = sorted(ctx.account_seconds.values())
+        return remaining > (seconds[len(seconds) // 2] if seconds else 0)
+
+    # Roles are assumed ahead of the submission window, so an account's scan starts with its session ready.
+    # Accounts restored entirely from the checkpoint or result cache make no AWS calls and are left out.
+    def prefetch(accounts):
+        prefetch_role_sessions([acc["id"] for acc in accounts
+                                if acc["id"] != runner_id and not account_stored(ctx, acc["id"])], args.role)
+
+    def submit_next():
+        """Starts the next queued account; returns False when none is left or the budget is spent."""
+        nonlocal submitted
+        if not budget_left():
+            return False
+        acc = next(queued_accounts, None)
+        if acc is None:
+            return False
+        submitted += 1
+        progress = f"[{submitted}/{total_accounts}]"
+        position = submitted - 1 if sampler else submit_order[submitted - 1]
+        if processes:
+            # Worker processes assume their own roles.
+            in_flight[position] = (acc, account_pool.submit(acc, progress))
+            return True
+        if sampler is None:
+            prefetch([scan_list[i] for i in submit_order[submitted - 1 + window:submitted + window]])
+        in_flight[position] = (acc, account_pool.submit(scan_account_safe, acc, progress, ctx))
+        return True
+
+    # Worker processes keep their limiters to themselves until their accounts finish.
+    rate_reports = start_rate_limit_reports() if not processes else None
+    try:
+        if sampler is None and not processes:
+            prefetch([scan_list[i] for i in submit_order[:window]])
+        for _ in range(window):
+            submit_next()
+
+        # Walk the accounts in their original order so the output matches a serial run.
+        while True:
+            # Slower accounts start first, so the next account in output order may not have started yet.
+            while next_output not in in_flight and submit_next():
+                pass
+            if not in_flight:
+                break
+            # After the time budget only finished accounts are left, with gaps between their positions.
+            position = next_output if next_output in in_flight else min(in_flight)
+            acc, f = in_flight.pop(position)
+            next_output = position + 1
+            try:
+                results, errors, failure, *worker_stats = f.result(
+                    timeout=None if deadline is None else max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                # Out of time: accounts still being scanned are left out of the output and the sample,
+                # accounts that already finished behind the one waited on are kept.
+                budget_exhausted = True
+                in_flight[position] = (acc, f)
+                stopped = [key for key, (_, g) in in_flight.items() if not g.done()]
+                log_warn(f"Time budget spent; stopping {len(stopped)} account scans in progress.", "SYSTEM")
+                account_pool.shutdown(wait=False, cancel_futures=True)
+                if scheduler:
+                    scheduler.shutdown(wait=False, cancel_pending=True)
+                for key in stopped:
+                    sampler.stop(in_flight.pop(key)[0]['id'])
+                next_output = min(in_flight, default=0)
+                continue
+            except WorkerError as e:
+                # The account failed along with its worker process (e.g. killed when out of memory).
+                results, errors, failure, worker_stats = None, None, f"Worker process failure: {str(e)}", []
+                log_warn(f"Failed to scan {acc['name']}: {failure}", acc['id'])
+            if worker_stats:
+                add_worker_stats(ctx, acc['id'], worker_stats[0])
+            if sampler is not None:
+                sampler.record(acc['id'], None if failure else results)
+            if len(in_flight) < window:
+                submit_next()
+
+            if failure:
+                audit_report[acc['id']] = [failure]
+                partial_count += 1
+                continue
 
             if results is None:
                 audit_report[acc['id']] = errors
                 partial_count += 1
                 continue
 
-            all_results.extend(results)
+            if summary is not None:
+                summary.add_rows(results)
+            else:
+                writer.write(results)
+            results.discard()
 
             if errors:
                 audit_report[acc['id']] = errors
                 partial_count += 1
             else:
                 full_success_count += 1
+    except BaseException:
+        if rate_reports:
+            rate_reports.set()
+        account_pool.shutdown(wait=False, cancel_futures=True)
+        if scheduler:
+            scheduler.shutdown(wait=False, cancel_pending=True)
+        writer.abort()
+        shutil.rmtree(spill_dir, ignore_errors=True)
+        log_info(f"Progress saved to checkpoint ({checkpoint.completed_units()} units). "
+                 f"Re-run with --resume to continue.")
+        raise
 
-        except Exception as e:
-            error_msg = f"Unexpected failure: {str(e)}"
-            log_warn(f"Failed to scan {acc['name']}: {error_msg}", acc['id'])
-            audit_report[acc['id']] = [error_msg]
-            partial_count += 1
+    if rate_reports:
+        rate_reports.set()
+    account_pool.shutdown()
+    if scheduler:
+        scheduler.shutdown()
+    # Accounts stopped by the time budget may have left partial files.
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    if processes and account_pool.lost_workers:
+        log_warn(f"{account_pool.lost_workers} worker processes exited during the scan; "
+                 f"their accounts are listed in the errors report.", "SYSTEM")
+    if args.resume:
+        log_info(f"Reused {checkpoint.reused} units from checkpoint.")
 
-    if len(audit_report) > 0 and len(audit_report) < 10:
-        print("\n" + "=" * 60)
-        log_warn("Errors report", "SYSTEM")
-        print("=" * 60)
-        for acc_id, issues in audit_report.items():
-            unique_issues = sorted(list(set(issues)))
-            print(f"\nAccount ({acc_id}):")
-            for issue in unique_issues:
-                print(f"  - {issue}")
-        print("=" * 60 + "\n")
-    elif len(audit_report) >=10:
-        name_map = {acc['id']: acc['name'] for acc in scan_list}
-        audit_filename = "output/audit_report.txt"
+    report_audit(audit_report, {acc['id']: acc['name'] for acc in scan_list},
+                 os.path.join(output_dir, "audit_report.txt"))
+    if sampler is not None:
+        report_sample(sampler, output_dir, args.time_budget, budget_exhausted)
+
+    log_info(
+        f"Summary: {full_success_count} full scans, {partial_count} partial/failed scans out of {total_accounts} total.",
+        "SYSTEM")
 
+    pool = client_pool_stats()
+    log_info(
+        f"Client pool: {pool['hits']} reused, {pool['misses']} built ({pool['hit_rate']:.0%} hit rate), "
+        f"{pool['build_seconds']:.2f}s spent constructing clients.",
+        "SYSTEM")
+    creds = credential_stats()
+    log_info(
+        f"Credentials: {creds['assumed']} AssumeRole calls, {creds['prefetched']} sessions prefetched.",
+        "SYSTEM")
+    ctx.unit_costs.save()
+    save_bucket_regions()
+    if ctx.permissions and (ctx.permissions.denials or ctx.permissions.probes):
+        log_info(f"Permission checks: {ctx.permissions.denials} denied actions cached, "
+                 f"{ctx.permissions.skipped} units skipped, {ctx.permissions.probes} pre-flight probes.", "SYSTEM")
+    report_rate_limits()
+    report_api_metrics(output_dir, args.trace)
+    if ctx.region_planner is not None:
+        region_report = os.path.join(output_dir, "region_plan.csv")
+        log_info(f"Region planning: {ctx.region_planner.pruned_count()} empty regions pruned. "
+                 f"Per-account decisions saved to → {region_report}", "SYSTEM")
+        ctx.region_planner.save()
         try:
-            with open(audit_filename, "w", encoding="utf-8") as f:
-                f.write("=" * 80 + "\n")
-                f.write(f"Errors Report: \n")
-                f.write("=" * 80 + "\n\n")
+            os.makedirs(output_dir, exist_ok=True)
+            ctx.region_planner.write_report(region_report)
+        except OSError as e:
+            log_warn(f"Failed to write region plan report: {str(e)}", "SYSTEM")
+    if result_cache is not None:
+        cache_report = os.path.join(output_dir, "cache_report.csv")
+        log_info(
+            f"Result cache: {result_cache.hits} units reused, {result_cache.stale} stale units rescanned, "
+            f"oldest data is {result_cache.oldest_age() / 3600:.1f}h old. Unit ages saved to → {cache_report}",
+            "SYSTEM")
+        try:
+            result_cache.write_report(cache_report)
+        except OSError as e:
+            log_warn(f"Failed to write cache report: {str(e)}", "SYSTEM")
+        result_cache.close()
+    if summary is not None:
+        log_info(f"Summary mode: {count_resources(summary.rows())} resources in {len(summary)} groups.", "SYSTEM")
+        writer.write(summary.rows(rounded=True))
+    writer.close()
+    checkpoint.close(remove=True)
+    if args.estimate and writer.count:
+        report_cost_estimate(writer.path if args.columnar else os.path.join(output_dir, writer.json_filename),
+                             pricing, output_dir)
 
-                for acc_id, issues in audit_report.items():
-                    acc_name = name_map.get(acc_id, "Unknown Account")
-                    f.write(f"Account: {acc_name} ({acc_id})\n")
-                    for issue in sorted(list(set(issues))):
-                        f.write(f"  [X] {issue}\n")
-                    f.write("-" * 40 + "\n")
+    if shard:
+        os.makedirs(output_dir, exist_ok=True)
+        write_shard_meta(output_dir, {
+            "shard": list(shard),
+            "accounts": [dict(acc, index=account_index[acc["id"]]) for acc in scan_list],
+            "audit_report": audit_report,
+            "full_success": full_success_count,
+            "partial": partial_count,
+            "summary": args.summary,
+            "json_filename": writer.json_filename,
+            "results": writer.count,
+            "account_seconds": ctx.account_seconds,
+            # Runners only agree on the assignment when they balanced on the same costs file.
+            "costs_fingerprint": costs_fingerprint
+        })
+    else:
+        record_account_costs(ctx.account_seconds)
 
-            print("")
-            log_info(f"Detailed audit report saved to → {audit_filename}", "SYSTEM")
+
+def run_service(ctx, scan_list, args, output_dir, make_writer, pricing, rediscover=False):
+    """
+    --serve: rescans every account once per --refresh-minutes, spread over the interval, and
+    serves the latest results from memory. After every full refresh cycle the standard output
+    files and reports are rewritten, so consumers of the one-shot files keep working. With
+    'rediscover', the organization's accounts are listed again after every cycle.
+    """
+    names = {}
+    progress = {}
+
+    def set_accounts(accounts):
+        names.clear()
+        names.update((acc["id"], acc["name"]) for acc in accounts)
+        progress.clear()
+        progress.update((acc["id"], f"[{index}/{len(accounts)}]") for index, acc in enumerate(accounts, start=1))
+
+    def update_accounts():
+        accounts = get_accounts()
+        if not accounts:
+            log_warn("Account discovery failed; keeping the current account list.", "SYSTEM")
+            return
+        # The labels are only read when a scan starts, so new accounts get theirs before they are scheduled.
+        set_accounts(accounts)
+        added, removed = service.refresher.update_accounts(accounts)
+        if added or removed:
+            log_info(f"Organization changed: {len(added)} accounts added, {len(removed)} removed; "
+                     f"now serving {len(accounts)} accounts.", "SYSTEM")
+
+    set_accounts(scan_list)
+    service = None
+
+    def on_cycle():
+        snapshot = service.snapshot
+        statuses = snapshot.status()
+        try:
+            report_audit({s["account_id"]: s["errors"] for s in statuses if s["errors"]}, names,
+                         os.path.join(output_dir, "audit_report.txt"))
+            rows = snapshot.rows()
+            if args.summary:
+                summary = ResourceSummary(args.summary)
+                summary.add_rows(rows)
+                rows = summary.rows(rounded=True)
+            writer = make_writer()
+            writer.write(rows)
+            writer.close()
+            if args.estimate and writer.count:
+                report_cost_estimate(writer.path if args.columnar else os.path.join(output_dir, writer.json_filename),
+                                     pricing, output_dir)
+            ctx.unit_costs.save()
+            save_bucket_regions()
+            if ctx.region_planner is not None:
+                ctx.region_planner.save()
+            record_account_costs(ctx.account_seconds)
+            report_api_metrics(output_dir, args.trace)
+            api_metrics().reset()
         except Exception as e:
-            log_warn(f"Failed to write audit file: {str(e)}", "SYSTEM")
+            log_warn(f"Failed to write the refresh cycle reports: {str(e)}", "SYSTEM")
+        failed = sum(1 for s in statuses if s["state"] == "failed")
+        log_info(f"Refresh cycle {service.refresher.cycles} complete: {snapshot.summary()['resources']} resources, "
+                 f"{failed} failed accounts out of {len(statuses)}.", "SYSTEM")
+        if rediscover:
+            update_accounts()
+
+    service = InventoryService(
+        scan_list,
+        lambda acc: scan_account_safe(acc, progress.get(acc["id"], "[new]"), ctx),
+        interval=args.refresh_minutes * 60,
+        parallel=args.parallel_accounts,
+        host=args.bind,
+        port=args.serve,
+        on_cycle=on_cycle,
+        count_rows=count_resources
+    )
+    log_info(f"Serving the inventory of {len(scan_list)} accounts at {service.address} "
+             f"(every account rescanned every {args.refresh_minutes:g} minutes).", "SYSTEM")
+    try:
+        service.serve_forever()
+    finally:
+        ctx.scheduler.shutdown(wait=False, cancel_pending=True)
+
+
+def report_sample(sampler, output_dir, time_budget=None, budget_exhausted=False):
+    """Prints the extrapolated totals of a sampling run and writes them to output/sample_estimate.csv/.json."""
+    coverage = sampler.coverage()
+    stop = "time budget spent" if budget_exhausted else "sample complete"
+    log_info(f"Sample: {coverage['observed']} of {coverage['accounts']} accounts observed "
+             f"({coverage['observed_share']:.1%}), {coverage['failed']} could not be scanned; {stop}.", "SYSTEM")
+    if coverage["stopped"]:
+        # Slow accounts are the ones still running when the budget ends, and they tend to be the large ones.
+        log_warn(f"{coverage['stopped']} selected accounts were stopped by the time budget and are treated as "
+                 f"non-response; the totals may be underestimated.", "SYSTEM")
+    if coverage["unobserved_strata"]:
+        log_warn(f"No accounts observed in strata: {', '.join(coverage['unobserved_strata'])}; "
+                 f"their totals are extrapolated from the other strata.", "SYSTEM")
+    extra = {"time_budget_minutes": time_budget, "budget_exhausted": budget_exhausted}
+    csv_path = os.path.join(output_dir, "sample_estimate.csv")
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        estimate = sampler.write_reports(csv_path, os.path.join(output_dir, "sample_estimate.json"), extra)
+    except OSError as e:
+        log_warn(f"Failed to write sample estimate: {str(e)}", "SYSTEM")
+        estimate = sampler.estimate()
+    if not estimate:
+        return
+    print(f"\nEstimated organization totals (95% confidence), from {coverage['observed']} of "
+          f"{coverage['accounts']} accounts:")
+    print(f"{'resource':<22}{'metric':<20}{'observed':>18}{'estimate':>18}{'95% interval':>36}")
+    for row in estimate:
+        interval = f"{row['ci95_low']:,.0f} - {row['ci95_high']:,.0f}"
+        print(f"{str(row['resource']):<22}{row['metric']:<20}{row['observed']:>18,.0f}{row['estimate']:>18,.0f}"
+              f"{interval:>36}")
+    log_info(f"Sample estimate saved to → {csv_path}", "SYSTEM")
+
+
+def report_rate_limits(top=5):
+    """Logs the shared rate limiters: totals, then the most throttled (or busiest) ones."""
+    limiters = rate_limit_stats()
+    if not limiters:
+        return
+    throttles = sum(stats["throttles"] for *_, stats in limiters)
+    decreases = sum(stats["decreases"] for *_, stats in limiters)
+    waited = sum(stats["wait_seconds"] for *_, stats in limiters)
+    log_info(f"Rate limits: {len(limiters)} limiters, {throttles} throttled attempts, {decreases} limit decreases, "
+             f"{waited:.1f}s spent waiting for a slot.", "SYSTEM")
+    for account_id, service, region, stats in limiters[:top]:
+        log_info(f"  {service}/{region}: limit {stats['limit']:.1f} (peak {stats['peak_limit']:.1f}), "
+                 f"{stats['calls']} calls at {stats['calls_per_second']:.1f}/s, {stats['throttles']} throttled",
+                 account_id)
+
+
+def report_live_rate_limits(previous, seconds, top=5):
+    """
+    Logs the limiters that made calls in the last 'seconds': their current limit and call rate,
+    most throttled first. 'previous' maps each limiter to its (calls, throttles) at the last
+    report; returns the new map for the next one.
+    """
+    current = {}
+    active = []
+    for account_id, service, region, stats in live_rate_limit_stats():
+        key = (account_id, service, region)
+        current[key] = (stats["calls"], stats["throttles"])
+        calls, throttles = previous.get(key, (0, 0))
+        calls, throttles = stats["calls"] - calls, stats["throttles"] - throttles
+        if calls or throttles or stats["in_flight"]:
+            active.append((throttles, calls, key, stats))
+    if not active:
+        return current
+    active.sort(key=lambda item: (-item[0], -item[1]))
+    log_info(f"Rate limits now: {len(active)} active limiters, {sum(a[1] for a in active) / seconds:.1f} calls/s, "
+             f"{sum(a[0] for a in active)} throttled attempts in the last {seconds:.0f}s.", "SYSTEM")
+    for throttles, calls, (account_id, service, region), stats in active[:top]:
+        log_info(f"  {service}/{region}: limit {stats['limit']:.1f}, {stats['in_flight']} in flight, "
+                 f"{calls / seconds:.1f} calls/s, {throttles} throttled", account_id)
+    return current
+
+
+def start_rate_limit_reports(interval=REPORT_SECONDS):
+    """Calls report_live_rate_limits() every 'interval' seconds until the returned event is set."""
+    stop = threading.Event()
+
+    def run():
+        previous = {}
+        last = time.monotonic()
+        while not stop.wait(interval):
+            now = time.monotonic()
+            previous = report_live_rate_limits(previous, now - last)
+            last = now
+
+    threading.Thread(target=run, name="rate-limit-report", daemon=True).start()
+    return stop
 
+
+def report_api_metrics(output_dir, trace=False):
+    """Prints the per-operation API call table and exports the per-account metrics."""
+    metrics = api_metrics()
+    if not metrics.total_calls():
+        return
+    print("\nAWS API calls:")
+    for line in metrics.summary_lines():
+        print(line)
+    exports = [("api_metrics.json", metrics.write_json), ("api_metrics.prom", metrics.write_prometheus)]
+    if trace:
+        exports.append(("trace.json", metrics.write_trace))
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        for filename, write in exports:
+            write(os.path.join(output_dir, filename))
+    except OSError as e:
+        log_warn(f"Failed to write API metrics: {str(e)}", "SYSTEM")
+        return
+    log_info(f"API metrics saved to → {', '.join(os.path.join(output_dir, f) for f, _ in exports)}", "SYSTEM")
+
+
+def load_pricing(paths):
+    """The default PricingTable, extended with each comma-separated JSON file in 'paths'."""
+    pricing = PricingTable()
+    for path in [p.strip() for p in (paths or "").split(",") if p.strip()]:
+        pricing.load(path)
+        log_info(f"Loaded pricing from {path}")
+    return pricing
+
+
+def report_cost_estimate(path, pricing, output_dir="output", top=10):
+    """Estimates the monthly cost of an output file, prints the roll-ups and writes output/cost_estimate.csv."""
+    start = time.perf_counter()
+    estimate = estimate_file(path, pricing)
+    engine = "vectorized" if vectorized_available() else "pure Python (install numpy for the vectorized engine)"
+    log_info(f"Cost estimate of {path}: {estimate.resources:.0f} resources priced in "
+             f"{time.perf_counter() - start:.2f}s ({engine}).", "SYSTEM")
+    print(f"\nEstimated monthly cost: ${estimate.total:,.2f}")
+    for level, column in (("account", "account_id"), ("region", "region"), ("resource", "resource")):
+        rows = estimate.by(level)
+        print(f"\nBy {level}:")
+        for row in rows[:top]:
+            print(f"  {str(row[column]):<24}{row['resources']:>10}  ${row['monthly_cost']:>14,.2f}")
+        if len(rows) > top:
+            print(f"  ... {len(rows) - top} more")
+    if estimate.unpriced:
+        log_warn(f"No pricing for resource types: {', '.join(map(str, estimate.unpriced))}", "SYSTEM")
+    report = os.path.join(output_dir, "cost_estimate.csv")
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        estimate.write_csv(report)
+    except OSError as e:
+        log_warn(f"Failed to write cost estimate: {str(e)}", "SYSTEM")
+        return
+    log_info(f"Cost estimate per account, region and resource saved to → {report}", "SYSTEM")
+
+
+def estimate_main(argv):
+    """Prices a finished scan output (output.scol, output.jsonl or output.json) with the local pricing table."""
+    parser = argparse.ArgumentParser(prog="main.py estimate",
+                                     description="Estimate the monthly cost of a scan output.")
+    parser.add_argument("path", nargs="?",
+                        help="Output file to price (default: output/output.scol, .jsonl or .json, first found).")
+    parser.add_argument("--pricing", type=str, metavar="FILE[,FILE]",
+                        help="JSON pricing overrides, merged over the built-in us-east-1 list prices.")
+    args = parser.parse_args(argv)
+
+    path = args.path
+    if path is None:
+        candidates = [os.path.join("output", name) for name in ("output.scol", "output.jsonl", "output.json")]
+        path = next((c for c in candidates if os.path.exists(c)), None)
+        if path is None:
+            log_warn("No scan output found; run a scan first or pass the output file.")
+            return
+    report_cost_estimate(path, load_pricing(args.pricing), os.path.dirname(path) or ".")
+
+
+def _shard_rows(path):
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def merge_main(argv):
+    """
+    Combines the partial outputs of '--shard i/N' runs into the standard
+    output.json/output.csv and audit report, in the same account order as an unsharded run.
+    """
+    parser = argparse.ArgumentParser(prog="main.py merge",
+                                     description="Merge the outputs of --shard runs into the standard reports.")
+    parser.add_argument("shard_dirs", nargs="*",
+                        help="Shard output directories (default: output/shard-*-of-*).")
+    parser.add_argument("--jsonl", action="store_true",
+                        help="Write output/output.jsonl (JSON Lines) instead of output/output.json.")
+    parser.add_argument("--columnar", action="store_true",
+                        help="Write a compressed columnar output/output.scol instead of JSON and CSV.")
+    parser.add_argument("--unsorted-csv", action="store_true",
+                        help="Skip sorting output.csv (avoids the external merge step).")
+    args = parser.parse_args(argv)
+
+    shard_dirs = args.shard_dirs or sorted(glob.glob(os.path.join("output", "shard-*-of-*")))
+    metas = []
+    for directory in shard_dirs:
+        try:
+            metas.append((directory, read_shard_meta(directory)))
+        except (OSError, ValueError) as e:
+            log_warn(f"Skipping {directory}: no readable shard metadata ({str(e)}).")
+    if not metas:
+        log_warn("No shard outputs found; nothing to merge.")
+        return
+
+    counts = {meta["shard"][1] for _, meta in metas}
+    found = {meta["shard"][0] for _, meta in metas}
+    if len(counts) > 1:
+        raise ValueError(f"Shards come from different --shard totals: {sorted(counts)}")
+    missing = sorted(set(range(1, counts.pop() + 1)) - found)
+    if missing:
+        log_warn(f"Merging without shards: {', '.join(map(str, missing))}. Their accounts are missing from the output.")
+    fingerprints = {meta.get("costs_fingerprint") for _, meta in metas}
+    if len(fingerprints) > 1:
+        raise ValueError("Shards were assigned with different --shard-costs files (or some without one); "
+                         "accounts may be missing or scanned twice. Rerun every shard with the same file.")
+    levels = {meta["summary"] for _, meta in metas}
+    if len(levels) > 1:
+        raise ValueError("Shards were scanned with different --summary settings.")
+    summary_level = levels.pop()
+
+    accounts = sorted((acc for _, meta in metas for acc in meta["accounts"]), key=lambda acc: acc["index"])
+    account_index = {acc["id"]: acc["index"] for acc in accounts}
+    audit_report = {}
+    for _, meta in metas:
+        audit_report.update(meta["audit_report"])
+    audit_report = dict(sorted(audit_report.items(), key=lambda item: account_index.get(item[0], 0)))
+
+    if args.columnar:
+        writer = ColumnarWriter()
+    else:
+        writer = StreamingWriter(
+            json_filename="output.jsonl" if args.jsonl else "output.json",
+            json_lines=args.jsonl,
+            sort_csv=not args.unsorted_csv
+        )
+    streams = [_shard_rows(os.path.join(directory, meta["json_filename"])) for directory, meta in metas]
+    if summary_level:
+        summary = ResourceSummary(summary_level)
+        for stream in streams:
+            summary.add_rows(stream)
+        writer.write(summary.rows(rounded=True))
+    else:
+        # Every shard file is already in account order, so a k-way merge restores the serial order.
+        writer.write(heapq.merge(*streams, key=lambda row: account_index.get(row.get("account_id"), 0)))
+
+    report_audit(audit_report, {acc["id"]: acc["name"] for acc in accounts})
     log_info(
-        f"Summary: {full_success_count} full scans, {partial_count} partial/failed scans out of {total_accounts} total.",
+        f"Merged {len(metas)} shards: {sum(meta['full_success'] for _, meta in metas)} full scans, "
+        f"{sum(meta['partial'] for _, meta in metas)} partial/failed scans out of {len(accounts)} total.",
         "SYSTEM")
-    write_output(all_results)
+    writer.close()
+
+    seconds = {}
+    for _, meta in metas:
+        seconds.update(meta.get("account_seconds", {}))
+    record_account_costs(seconds)
 
 
 def run():
     try:
-        main()
+        if sys.argv[1:2] == ["merge"]:
+            merge_main(sys.argv[2:])
+        elif sys.argv[1:2] == ["estimate"]:
+            estimate_main(sys.argv[2:])
+        else:
+            main()
     except botocore.exceptions.NoCredentialsError:
         print(f"\n[!] Error: AWS credentials not found.")
         print(f"Please run: 'aws sso login' or 'aws configure'")
@@ -0,0 +1,329 @@
+"""
+Columnar output: a compact, array-backed alternative to output.json/output.csv for very
+large inventories. Only the standard library is needed to write and read it.
+
+Layout of a .scol file:
+
+    MAGIC
+    row group 0: one zlib-compressed chunk per column
+    row group 1: ...
+    footer (zlib-compressed JSON: schema, dictionaries, row group and chunk offsets)
+    footer length (8 bytes, little-endian) + MAGIC
+
+Column chunks are encoded by the values they hold:
+    'dict'   strings/booleans/nulls: indexes (uint16/uint32) into the column's dictionary,
+             which is shared by all row groups and stored once in the footer
+    'int64'  integers, plus a null bitmap when some rows have no value
+    'double' floats, plus a null bitmap
+    'json'   anything else (nested objects, mixed types): a JSON array
+Rows that lack a column read back without that key, so read rows match the written ones.
+"""
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+
+MAGIC = b"SCOL1\n"
+ROW_GROUP_SIZE = 65536
+COMPRESSION_LEVEL = 6
+_LITTLE_ENDIAN = sys.byteorder == "little"
+# Placeholder for "no value in this row"; never written to the file.
+_MISSING = object()
+
+
+def _to_le_bytes(values):
+    if not _LITTLE_ENDIAN:
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_le_bytes(typecode, data):
+    values = array(typecode)
+    values.frombytes(data)
+    if not _LITTLE_ENDIAN:
+        values.byteswap()
+    return values
+
+
+def _null_bitmap(values):
+    bitmap = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is _MISSING:
+            bitmap[i >> 3] |= 1 << (i & 7)
+    return bytes(bitmap)
+
+
+# Bit positions (0-7) that are set / clear in each byte value, for decoding null bitmaps.
+_SET_BITS = [tuple(k for k in range(8) if byte >> k & 1) for byte in range(256)]
+_CLEAR_BITS = [tuple(k for k in range(8) if not byte >> k & 1) for byte in range(256)]
+
+
+def _bit_positions(bitmap, table, rows):
+    positions = [j * 8 + k for j, byte in enumerate(bitmap) for k in table[byte]]
+    while positions and positions[-1] >= rows:
+        positions.pop()
+    return positions
+
+
+def _kind(values):
+    kinds = {type(v) for v in values if v is not _MISSING}
+    if kinds <= {str, bool, type(None)}:
+        return "dict"
+    if kinds == {int} and all(-2 ** 63 <= v < 2 ** 63 for v in values if v is not _MISSING):
+        return "int64"
+    if kinds == {float}:
+        return "double"
+    return "json"
+
+
+class ColumnarWriter:
+    """
+    Streams records into a .scol file, one row group every 'row_group_size' rows.
+    Has the same write()/close()/count interface as StreamingWriter, so memory stays
+    bounded by a single row group however large the inventory is.
+    """
+
+    def __init__(self, filename="output.scol", output_dir="output", row_group_size=ROW_GROUP_SIZE):
+        self.output_dir = output_dir
+        self.filename = filename
+        self.json_filename = None
+        self.row_group_size = row_group_size
+        self.count = 0
+
+        self._file = None
+        self._columns = {}
+        self._dictionaries = {}
+        self._dictionary_index = {}
+        self._row_groups = []
+        self._buffer = []
+
+    @property
+    def path(self):
+        return os.path.join(self.output_dir, self.filename)
+
+    @property
+    def _temporary_path(self):
+        return f"{self.path}.{os.getpid()}.tmp"
+
+    def write(self, records):
+        for row in records:
+            if self._file is None:
+                os.makedirs(self.output_dir, exist_ok=True)
+                # Renamed into place by close(), so a crash never leaves a truncated file behind.
+                self._file = open(self._temporary_path, "wb")
+                self._file.write(MAGIC)
+            for name in row:
+                if name not in self._columns:
+                    self._columns[name] = len(self._columns)
+            self._buffer.append(row)
+            self.count += 1
+            if len(self._buffer) >= self.row_group_size:
+                self._flush()
+
+    def _encode(self, name, values):
+        kind = _kind(values)
+        chunk = {"encoding": kind}
+        if kind == "dict":
+            dictionary = self._dictionaries.setdefault(name, [])
+            index = self._dictionary_index.setdefault(name, {})
+            codes = []
+            for value in values:
+                # Missing keys share the code of an explicit null; the presence bitmap tells them apart.
+                key = (type(value), value) if value is not _MISSING else (type(None), None)
+                code = index.get(key)
+                if code is None:
+                    code = index[key] = len(dictionary)
+                    dictionary.append(None if value is _MISSING else value)
+                codes.append(code)
+            typecode = "H" if len(dictionary) <= 0xFFFF else "I"
+            chunk["width"] = typecode
+            data = _to_le_bytes(array(typecode, codes))
+        elif kind in ("int64", "double"):
+            typecode, default = ("q", 0) if kind == "int64" else ("d", 0.0)
+            data = _to_le_bytes(array(typecode, [default if v is _MISSING else v for v in values]))
+        else:
+            data = json.dumps([None if v is _MISSING else v for v in values], default=str).encode("utf-8")
+
+        if any(v is _MISSING for v in values):
+            missing = _null_bitmap(values)
+            chunk["missing"] = len(missing)
+            data = missing + data
+        return chunk, zlib.compress(data, COMPRESSION_LEVEL)
+
+    def _flush(self):
+        rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+        group = {"rows": len(rows), "columns": {}}
+        for name in self._columns:
+            values = [row.get(name, _MISSING) for row in rows]
+            if all(v is _MISSING for v in values):
+                continue
+            chunk, data = self._encode(name, values)
+            chunk["offset"] = self._file.tell()
+            chunk["length"] = len(data)
+            self._file.write(data)
+            group["columns"][name] = chunk
+        self._row_groups.append(group)
+
+    def close(self):
+        if self._file is None:
+            print("No data collected; skipping report generation.")
+            return
+        self._flush()
+        footer = zlib.compress(json.dumps({
+            "version": 1,
+            "rows": self.count,
+            "columns": list(self._columns),
+            "dictionaries": self._dictionaries,
+            "row_groups": self._row_groups,
+        }, default=str).encode("utf-8"), COMPRESSION_LEVEL)
+        self._file.write(footer)
+        self._file.write(struct.pack("<Q", len(footer)) + MAGIC)
+        self._file.close()
+        os.replace(self._temporary_path, self.path)
+        print(f"\n Columnar output saved → {self.path}")
+
+    def abort(self):
+        """Removes the unfinished file."""
+        if self._file is None:
+            return
+        self._file.close()
+        try:
+            os.remove(self._temporary_path)
+        except OSError:
+            pass
+
+
+class ColumnarReader:
+    """
+    Reads a .scol file written by ColumnarWriter.
+    read() returns whole columns as lists, rows() yields the original records, and
+    read_encoded() gives a dictionary column as (dictionary, codes) for fast group-bys.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            trailer = len(MAGIC) + 8
+            f.seek(max(size - trailer, 0))
+            tail = f.read(trailer)
+            if size < len(MAGIC) + trailer or tail[8:] != MAGIC:
+                raise ValueError(f"{path} is not a complete columnar output file")
+            footer_length = struct.unpack("<Q", tail[:8])[0]
+            f.seek(size - trailer - footer_length)
+            meta = json.loads(zlib.decompress(f.read(footer_length)).decode("utf-8"))
+        self.num_rows = meta["rows"]
+        self.columns = meta["columns"]
+        self.row_groups = meta["row_groups"]
+        self._dictionaries = meta["dictionaries"]
+
+    def _chunk(self, f, chunk):
+        f.seek(chunk["offset"])
+        data = zlib.decompress(f.read(chunk["length"]))
+        if "missing" in chunk:
+            return data[chunk["missing"]:], data[:chunk["missing"]]
+        return data, None
+
+    def dictionary(self, name):
+        return list(self._dictionaries.get(name, []))
+
+    def raw_chunks(self, name):
+        """
+        Yields (rows, encoding, width, data, missing) per row group, with 'data' holding the
+        decompressed values as stored (little-endian arrays for 'dict', 'int64' and 'double').
+        Meant for array libraries that decode a whole chunk at once; 'encoding' is None
+        when the row group has no such column.
+        """
+        with open(self.path, "rb") as f:
+            for group in self.row_groups:
+                chunk = group["columns"].get(name)
+                if chunk is None:
+                    yield group["rows"], None, None, b"", None
+                    continue
+                data, missing = self._chunk(f, chunk)
+                yield group["rows"], chunk["encoding"], chunk.get("width"), data, missing
+
+    def read_encoded(self, name):
+        """Returns (dictionary, codes) for a dictionary-encoded column; missing rows decode to None."""
+        dictionary = list(self._dictionaries.get(name, []))
+        codes = array("I")
+        with open(self.path, "rb") as f:
+            for group in self.row_groups:
+                chunk = group["columns"].get(name)
+                if chunk is None:
+                    if None not in dictionary:
+                        dictionary.append(None)
+                    codes.extend(array("I", [dictionary.index(None)]) * group["rows"])
+                    continue
+                if chunk["encoding"] != "dict":
+                    raise ValueError(f"Column '{name}' is not dictionary-encoded in every row group")
+                data, _ = self._chunk(f, chunk)
+                chunk_codes = _from_le_bytes(chunk["width"], data)
+                codes.extend(chunk_codes if chunk["width"] == "I" else array("I", chunk_codes))
+        return dictionary, codes
+
+    def _column(self, f, name, group):
+        """Returns (values for every row, bitmap of rows without a value or None), or None if the column is absent."""
+        chunk = group["columns"].get(name)
+        if chunk is None:
+            return None
+        data, missing = self._chunk(f, chunk)
+        encoding = chunk["encoding"]
+        if encoding == "dict":
+            dictionary = self._dictionaries[name]
+            values = [dictionary[code] for code in _from_le_bytes(chunk["width"], data)]
+        elif encoding == "int64":
+            values = _from_le_bytes("q", data).tolist()
+        elif encoding == "double":
+            values = _from_le_bytes("d", data).tolist()
+        else:
+            values = json.loads(data.decode("utf-8"))
+        return values, missing
+
+    def read(self, columns=None):
+        """Returns {column: list of values}, with None where a row has no value."""
+        names = list(columns or self.columns)
+        result = {name: [] for name in names}
+        with open(self.path, "rb") as f:
+            for group in self.row_groups:
+                for name in names:
+                    column = self._column(f, name, group)
+                    if column is None:
+                        result[name].extend([None] * group["rows"])
+                        continue
+                    values, missing = column
+                    if missing is not None:
+                        for i in _bit_positions(missing, _SET_BITS, group["rows"]):
+                            values[i] = None
+                    result[name].extend(values)
+        return result
+
+    def rows(self, columns=None):
+        """Yields the records one row group at a time, in the order they were written."""
+        names = list(columns or self.columns)
+        with open(self.path, "rb") as f:
+            for group in self.row_groups:
+                rows = [{} for _ in range(group["rows"])]
+                # Filled column by column, touching only the cells that hold a value.
+                for name in names:
+                    column = self._column(f, name, group)
+                    if column is None:
+                        continue
+                    values, missing = column
+                    if missing is None:
+                        for row, value in zip(rows, values):
+                            row[name] = value
+                    else:
+                        for i in _bit_positions(missing, _CLEAR_BITS, group["rows"]):
+                            rows[i][name] = values[i]
+                yield from rows
+
+
+def read_columnar(path, columns=None):
+    """Loads a columnar output file as {column: list of values}."""
+    return ColumnarReader(path).read(columns)
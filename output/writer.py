@@ -1,44 +1,260 @@
 import json
 import csv
+import heapq
 import os
+import re
+import shutil
+import tempfile
 
+RUN_SIZE = 50000
+MAX_MERGE_FANIN = 64
+PRIORITIZED_COLUMNS = ["account_id", "resource", "region"]
+SPILL_PREFIX = ".spill"
+# Spill directories and unfinished output files carry the id of the process writing them.
+_TEMPORARY_NAME = re.compile(r"^(?:\.spill-(\d+)-.*|.*\.(\d+)\.tmp)$")
 
-def write_output(data, json_filename="output.json", csv_filename="output.csv"):
-    os.makedirs("output", exist_ok=True)
 
-    if not data:
-        print("No data collected; skipping report generation.")
+def _pid_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remove_stale_files(output_dir):
+    """Removes the spill directories and unfinished output files of runs that crashed in 'output_dir'."""
+    try:
+        names = os.listdir(output_dir)
+    except OSError:
         return
+    for name in names:
+        match = _TEMPORARY_NAME.match(name)
+        if not match or _pid_running(int(match.group(1) or match.group(2))):
+            continue
+        path = os.path.join(output_dir, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def make_spill_dir(output_dir):
+    """A new spill directory in 'output_dir', after removing the ones crashed runs left behind."""
+    os.makedirs(output_dir, exist_ok=True)
+    remove_stale_files(output_dir)
+    return tempfile.mkdtemp(prefix=f"{SPILL_PREFIX}-{os.getpid()}-", dir=output_dir)
+
+
+def temporary_path(path):
+    """Where 'path' is written until it is complete and renamed into place."""
+    return f"{path}.{os.getpid()}.tmp"
+
+
+class AccountRows:
+    """
+    The rows of one account, appended unit by unit to a JSON Lines file in a spill directory
+    instead of a list, so a finished account waiting for its predecessors in the output order
+    costs disk space, not memory. Iterating reads the rows back in the order they were added.
+    Pickles as its path, so a --processes worker hands the parent the file instead of the rows.
+    """
+
+    def __init__(self, spill_dir, account_id):
+        fd, self.path = tempfile.mkstemp(prefix=f"{account_id}-", suffix=".jsonl", dir=spill_dir)
+        self._file = os.fdopen(fd, "w", encoding="utf-8")
+        self.count = 0
 
+    def extend(self, rows):
+        for row in rows:
+            self._file.write(json.dumps(row, default=str) + "\n")
+            self.count += 1
 
-    with open(f"output/{json_filename}", "w") as f:
-        json.dump(data, f, indent=2, default=str)
-    print(f"\n JSON saved → output/{json_filename}")
+    def __len__(self):
+        return self.count
 
+    def __iter__(self):
+        self._close()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                yield json.loads(line)
 
-    keys = set()
-    for row in data:
-        keys.update(row.keys())
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
 
-    fieldnames = sorted(list(keys))
-    prioritized = ["account_id", "resource", "region"]
-    for col in reversed(prioritized):
-        if col in fieldnames:
-            fieldnames.insert(0, fieldnames.pop(fieldnames.index(col)))
+    def discard(self):
+        self._close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
 
-    sorted_data = sorted(
-        data,
-        key=lambda r: (
-            str(r.get("resource", "")),
-            str(r.get("account_id", "")),
-            str(r.get("region", "")),
-            json.dumps(r, sort_keys=True, default=str),
-        ),
+    def __getstate__(self):
+        self._close()
+        return {"path": self.path, "count": self.count, "_file": None}
+
+
+def _csv_sort_key(line):
+    # Same ordering as before: resource, account, region, then the full canonical row.
+    row = json.loads(line)
+    return (
+        str(row.get("resource", "")),
+        str(row.get("account_id", "")),
+        str(row.get("region", "")),
+        line,
     )
 
-    with open(f"output/{csv_filename}", "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        writer.writeheader()
-        writer.writerows(sorted_data)
 
-    print(f"\n CSV saved  → output/{csv_filename}")
\ No newline at end of file
+def _csv_row(row):
+    # Nested values (per-class sizes, tag lists) go to the CSV as JSON instead of a Python repr.
+    return {k: json.dumps(v, sort_keys=True) if isinstance(v, (dict, list)) else v for k, v in row.items()}
+
+
+def _merge_runs(paths, out_path):
+    files = [open(p, "r", encoding="utf-8") for p in paths]
+    try:
+        with open(out_path, "w", encoding="utf-8") as out:
+            for line in heapq.merge(*(_strip_lines(f) for f in files), key=_csv_sort_key):
+                out.write(line + "\n")
+    finally:
+        for f in files:
+            f.close()
+    for p in paths:
+        os.remove(p)
+
+
+def _strip_lines(f):
+    for line in f:
+        yield line.rstrip("\n")
+
+
+class StreamingWriter:
+    """
+    Writes records to disk as they arrive instead of holding the full result set.
+    JSON (a streamed array, one record per line) or JSON Lines is written immediately.
+    CSV rows are spilled to sorted runs of 'run_size' rows and merged on close()
+    (external merge sort), so peak memory is bounded by the run size.
+    """
+
+    def __init__(self, json_filename="output.json", csv_filename="output.csv", json_lines=False,
+                 sort_csv=True, run_size=RUN_SIZE, output_dir="output"):
+        self.output_dir = output_dir
+        self.json_filename = json_filename
+        self.csv_filename = csv_filename
+        self.json_lines = json_lines
+        self.sort_csv = sort_csv
+        self.run_size = run_size
+        self.count = 0
+
+        self._json_file = None
+        self._spill_dir = None
+        self._runs = []
+        self._buffer = []
+        self._fieldnames = set()
+
+    def _open(self):
+        self._spill_dir = make_spill_dir(self.output_dir)
+        self._json_file = open(temporary_path(os.path.join(self.output_dir, self.json_filename)), "w")
+        if not self.json_lines:
+            self._json_file.write("[")
+
+    def write(self, records):
+        for row in records:
+            if self._json_file is None:
+                self._open()
+
+            if self.json_lines:
+                self._json_file.write(json.dumps(row, default=str) + "\n")
+            else:
+                self._json_file.write(("\n" if self.count == 0 else ",\n") + json.dumps(row, default=str))
+
+            self._fieldnames.update(row.keys())
+            self._buffer.append(json.dumps(row, sort_keys=True, default=str))
+            self.count += 1
+            if len(self._buffer) >= self.run_size:
+                self._spill()
+
+    def _spill(self):
+        if self.sort_csv:
+            self._buffer.sort(key=_csv_sort_key)
+        path = os.path.join(self._spill_dir, f"run-{len(self._runs):06d}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for line in self._buffer:
+                f.write(line + "\n")
+        self._runs.append(path)
+        self._buffer = []
+
+    def _csv_row_files(self):
+        if not self.sort_csv:
+            return self._runs
+
+        # Merge in passes so the number of open files stays bounded.
+        runs = self._runs
+        generation = 0
+        while len(runs) > 1:
+            merged = []
+            for i in range(0, len(runs), MAX_MERGE_FANIN):
+                out_path = os.path.join(self._spill_dir, f"merge-{generation}-{i:06d}.jsonl")
+                _merge_runs(runs[i:i + MAX_MERGE_FANIN], out_path)
+                merged.append(out_path)
+            runs = merged
+            generation += 1
+        return runs
+
+    def _fieldnames_ordered(self):
+        fieldnames = sorted(list(self._fieldnames))
+        for col in reversed(PRIORITIZED_COLUMNS):
+            if col in fieldnames:
+                fieldnames.insert(0, fieldnames.pop(fieldnames.index(col)))
+        return fieldnames
+
+    def close(self):
+        if self._json_file is None:
+            print("No data collected; skipping report generation.")
+            return
+
+        # Both files are written under temporary names and renamed once complete, so a crash
+        # never leaves a truncated output behind.
+        json_path = os.path.join(self.output_dir, self.json_filename)
+        csv_path = os.path.join(self.output_dir, self.csv_filename)
+        if not self.json_lines:
+            self._json_file.write("\n]\n")
+        self._json_file.close()
+        os.replace(temporary_path(json_path), json_path)
+        print(f"\n JSON saved → {self.output_dir}/{self.json_filename}")
+
+        if self._buffer:
+            self._spill()
+
+        try:
+            with open(temporary_path(csv_path), "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=self._fieldnames_ordered())
+                writer.writeheader()
+                for path in self._csv_row_files():
+                    with open(path, "r", encoding="utf-8") as run:
+                        for line in run:
+                            writer.writerow(_csv_row(json.loads(line)))
+            os.replace(temporary_path(csv_path), csv_path)
+        finally:
+            self.abort()
+
+        print(f"\n CSV saved  → {self.output_dir}/{self.csv_filename}")
+
+    def abort(self):
+        """Removes the spill directory and any output not renamed into place yet."""
+        if self._json_file is None:
+            return
+        self._json_file.close()
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+        for filename in (self.json_filename, self.csv_filename):
+            try:
+                os.remove(temporary_path(os.path.join(self.output_dir, filename)))
+            except OSError:
+                pass
+
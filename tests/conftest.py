@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scanner runs from the repository root (utils/, collectors/ and output/ are top-level packages).
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,51 @@
+import json
+import os
+import random
+
+from utils.api_metrics import HISTOGRAM_GROWTH, ApiMetrics, _OperationStats
+
+
+def test_latency_percentiles_are_close_and_memory_is_bounded():
+    rng = random.Random(1)
+    stats = _OperationStats()
+    latencies = [rng.lognormvariate(-3, 1) for _ in range(100000)]
+    for seconds in latencies:
+        stats.add_latency(seconds)
+    latency = stats.as_dict()["latency_seconds"]
+    assert len(stats.histogram) < 200
+    assert latency["max"] == round(max(latencies), 6)
+    assert abs(latency["sum"] - sum(latencies)) < 1e-3
+    for q in (0.5, 0.9, 0.99):
+        exact = sorted(latencies)[int(q * len(latencies)) - 1]
+        assert exact <= latency[f"p{int(q * 100)}"] <= exact * HISTOGRAM_GROWTH + 1e-6
+
+
+def test_merged_histograms_match_a_single_one():
+    together, first, second = _OperationStats(), _OperationStats(), _OperationStats()
+    for i in range(1, 2001):
+        together.add_latency(i / 1000)
+        (first if i % 2 else second).add_latency(i / 1000)
+    first.merge(second)
+    assert first.as_dict()["latency_seconds"] == together.as_dict()["latency_seconds"]
+
+
+def test_trace_events_carry_the_process_id(tmp_path):
+    metrics = ApiMetrics()
+    metrics.enable_trace()
+    metrics.unit_finished(metrics.unit_started(("1", "eu-west-1", "collect_ec2_instances")),
+                          ("1", "eu-west-1", "collect_ec2_instances"))
+    worker = ApiMetrics()
+    worker.enable_trace()
+    worker.unit_finished(worker.unit_started(("2", "eu-west-1", "collect_ec2_instances")),
+                         ("2", "eu-west-1", "collect_ec2_instances"))
+    taken = worker.take_stats()
+    for event in taken["trace"]:
+        event["pid"] = 424242
+    metrics.add_stats(taken)
+    path = tmp_path / "trace.json"
+    metrics.write_trace(str(path))
+    events = json.loads(path.read_text())["traceEvents"]
+    processes = {e["pid"]: e["args"]["name"] for e in events if e["name"] == "process_name"}
+    assert processes == {os.getpid(): f"Scanner pid {os.getpid()}", 424242: "Scanner pid 424242"}
+    units = [e for e in events if e.get("cat") == "unit"]
+    assert {(e["pid"], e["id2"]["local"]) for e in units} == {(os.getpid(), 1), (424242, 1)}
@@ -0,0 +1,66 @@
+import main
+from collectors.registry import GLOBAL, REGIONAL, registered_collectors
+from utils.checkpoint import GLOBAL_SCOPE, CheckpointStore
+from utils.scheduler import ScanScheduler
+
+SIGNATURE = {"role": "Scanner", "regions": None}
+ACCOUNT = {"id": "111111111111", "name": "one"}
+REGIONS = ["eu-west-1", "us-east-1"]
+
+
+def rows(region, collector):
+    return [{"account_id": ACCOUNT["id"], "resource": collector, "region": region}]
+
+
+def store_scan(path, skip=None):
+    """Stores the units a scan of ACCOUNT completes, except 'skip'."""
+    store = CheckpointStore(SIGNATURE, path=path)
+    store.put(ACCOUNT["id"], GLOBAL_SCOPE, main.plan_regions.__name__, REGIONS, False)
+    units = [(GLOBAL_SCOPE, c.name) for c in registered_collectors(GLOBAL)]
+    units += [(region, c.name) for region in REGIONS for c in registered_collectors(REGIONAL)]
+    for region, collector in units:
+        if (region, collector) != skip:
+            store.put(ACCOUNT["id"], region, collector, rows(region, collector), None)
+    store.close()
+    return units
+
+
+def test_units_survive_only_a_resume_with_the_same_options(tmp_path):
+    path = str(tmp_path / "scan.sqlite")
+    store_scan(path)
+    resumed = CheckpointStore(SIGNATURE, resume=True, path=path)
+    collector = "collect_ec2_instances"
+    assert resumed.get(ACCOUNT["id"], "eu-west-1", collector) == (rows("eu-west-1", collector), None)
+    assert resumed.reused == 1 and not resumed.signature_mismatch
+    resumed.close()
+
+    changed = CheckpointStore(dict(SIGNATURE, regions=["eu-west-1"]), resume=True, path=path)
+    assert changed.signature_mismatch and changed.completed_units() == 0
+    changed.close()
+    store_scan(path)
+    fresh = CheckpointStore(SIGNATURE, path=path)
+    assert fresh.completed_units() == 0
+    fresh.close(remove=True)
+
+
+def test_a_fully_stored_account_is_rebuilt_without_aws_calls(tmp_path):
+    path = str(tmp_path / "scan.sqlite")
+    units = store_scan(path)
+    store = CheckpointStore(SIGNATURE, resume=True, path=path)
+    with ScanScheduler(max_workers=2, per_account=2) as scheduler:
+        ctx = main.ScanContext("Scanner", None, "runner", scheduler, checkpoint=store)
+        assert main.account_stored(ctx, ACCOUNT["id"])
+        results, errors = main.scan_account(ACCOUNT, "[1/1]", ctx)
+    assert list(results) == [row for region, collector in units for row in rows(region, collector)]
+    assert errors == []
+    assert store.reused == len(units) + 1
+    store.close()
+
+
+def test_an_account_with_a_missing_unit_is_scanned_again(tmp_path):
+    path = str(tmp_path / "scan.sqlite")
+    store_scan(path, skip=("us-east-1", "collect_lambda_functions"))
+    store = CheckpointStore(SIGNATURE, resume=True, path=path)
+    ctx = main.ScanContext("Scanner", None, "runner", None, checkpoint=store)
+    assert not main.account_stored(ctx, ACCOUNT["id"])
+    store.close()
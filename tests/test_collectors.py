@@ -0,0 +1,59 @@
+import botocore.exceptions
+import pytest
+
+from collectors.asgConverter import collect_asg_as_ec2_equivalent
+from collectors.ebs import collect_ebs_volumes
+from collectors.ec2 import collect_ec2_instances
+from collectors.lambda_functions import collect_lambda_functions
+from utils.config_helper import release_session
+
+
+class FailingPaginator:
+    def __init__(self, error):
+        self.error = error
+
+    def paginate(self, **kwargs):
+        raise self.error
+
+
+class FakeSession:
+    """A session whose clients fail every paginated call with 'error'."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def client(self, service, region_name=None, config=None):
+        return self
+
+    def get_paginator(self, operation):
+        return FailingPaginator(self.error)
+
+
+def client_error(code):
+    return botocore.exceptions.ClientError({"Error": {"Code": code, "Message": code}}, "Operation")
+
+
+COLLECTORS = [
+    (collect_ec2_instances, "ec2:DescribeInstances"),
+    (collect_ebs_volumes, "ec2:DescribeVolumes"),
+    (collect_lambda_functions, "lambda:ListFunctions"),
+    (collect_asg_as_ec2_equivalent, "autoscaling:DescribeAutoScalingGroups"),
+]
+
+
+@pytest.mark.parametrize("collect, action", COLLECTORS)
+def test_denied_call_returns_the_action(collect, action):
+    session = FakeSession(client_error("AccessDenied"))
+    try:
+        assert collect(session, "eu-west-1", "111111111111") == ([], action)
+    finally:
+        release_session(session)
+
+
+@pytest.mark.parametrize("collect, action", COLLECTORS)
+def test_throttled_call_is_an_error_not_an_empty_result(collect, action):
+    session = FakeSession(client_error("Throttling"))
+    try:
+        assert collect(session, "eu-west-1", "111111111111") == ([], f"{action} failed (Throttling)")
+    finally:
+        release_session(session)
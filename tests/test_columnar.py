@@ -0,0 +1,49 @@
+import os
+
+import pytest
+
+from output.columnar import ColumnarReader, ColumnarWriter, read_columnar
+
+ROWS = [
+    {"account_id": "000000000001", "resource": "ec2", "vcpu": 2, "memory_gb": 0.5, "tags": {"a": "b"}},
+    {"account_id": "000000000001", "resource": "ebs", "size_gb": 2 ** 40, "encrypted": True, "memory_gb": None},
+    {"account_id": "000000000002", "resource": "ec2", "vcpu": 4, "memory_gb": 16.0, "tags": ["x", 1]},
+    {"account_id": "000000000002", "resource": "lambda", "vcpu": None},
+    {"resource": "s3", "size_gb": -1},
+]
+
+
+def write(tmp_path, rows, row_group_size=2):
+    writer = ColumnarWriter(output_dir=str(tmp_path), row_group_size=row_group_size)
+    writer.write(rows)
+    writer.close()
+    return writer.path
+
+
+def test_rows_round_trip_across_row_groups(tmp_path):
+    reader = ColumnarReader(write(tmp_path, ROWS))
+    assert reader.num_rows == len(ROWS)
+    assert len(reader.row_groups) == 3
+    assert list(reader.rows()) == ROWS
+    assert os.listdir(tmp_path) == ["output.scol"]
+
+
+def test_columns_read_with_none_for_missing_values(tmp_path):
+    columns = read_columnar(write(tmp_path, ROWS), ["resource", "vcpu", "size_gb"])
+    assert columns == {"resource": ["ec2", "ebs", "ec2", "lambda", "s3"],
+                       "vcpu": [2, None, 4, None, None],
+                       "size_gb": [None, 2 ** 40, None, None, -1]}
+
+
+def test_dictionary_column_is_read_encoded(tmp_path):
+    dictionary, codes = ColumnarReader(write(tmp_path, ROWS)).read_encoded("account_id")
+    assert [dictionary[code] for code in codes] == [row.get("account_id") for row in ROWS]
+
+
+def test_an_unfinished_file_is_rejected(tmp_path):
+    writer = ColumnarWriter(output_dir=str(tmp_path), row_group_size=2)
+    writer.write(ROWS)
+    with pytest.raises(ValueError):
+        ColumnarReader(writer._temporary_path)
+    writer.abort()
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,100 @@
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import pytest
+
+from utils.inventory_service import InventoryService, InventorySnapshot
+
+ACCOUNTS = [{"id": "111111111111", "name": "one"}, {"id": "222222222222", "name": "two"}]
+
+
+def account_rows(account_id, scans):
+    return [{"account_id": account_id, "region": region, "resource": "ec2", "scan": scans}
+            for region in ("eu-west-1", "us-east-1")]
+
+
+class FakeScans:
+    """scan() for the refresher: rows tagged with the account's scan count; 'fail' accounts raise."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.scans = {}
+        self.fail = set()
+
+    def __call__(self, acc):
+        with self.lock:
+            self.scans[acc["id"]] = self.scans.get(acc["id"], 0) + 1
+            scans = self.scans[acc["id"]]
+        if acc["id"] in self.fail:
+            raise RuntimeError("AssumeRole denied")
+        return account_rows(acc["id"], scans), [], None
+
+
+def wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def service():
+    scans = FakeScans()
+    cycles = []
+    service = InventoryService(ACCOUNTS, scans, interval=3600, parallel=2, port=0,
+                               on_cycle=lambda: cycles.append(time.time()))
+    thread = threading.Thread(target=service.serve_forever, daemon=True)
+    thread.start()
+    service.scans, service.cycles = scans, cycles
+    yield service
+    service.shutdown()
+    thread.join(10)
+
+
+def get(service, path, method="GET"):
+    request = urllib.request.Request(service.address + path, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_inventory_is_served_and_filtered(service):
+    wait_for(lambda: len(service.cycles) == 1)
+    status, body = get(service, "/status")
+    assert (status, body["accounts"], body["resources"], body["states"]) == (200, 2, 4, {"ok": 2})
+    assert get(service, "/inventory")[1] == account_rows("111111111111", 1) + account_rows("222222222222", 1)
+    assert get(service, "/inventory?account_id=222222222222&region=us-east-1")[1] == \
+        account_rows("222222222222", 1)[1:]
+    status, body = get(service, "/accounts/111111111111")
+    assert (status, body["state"], body["rows"]) == (200, "ok", account_rows("111111111111", 1))
+    assert get(service, "/accounts/333333333333")[0] == 404
+    assert get(service, "/nothing")[0] == 404
+
+
+def test_a_failed_rescan_keeps_the_previous_rows(service):
+    wait_for(lambda: len(service.cycles) == 1)
+    service.scans.fail.add("111111111111")
+    assert get(service, "/accounts/111111111111/refresh", method="POST")[0] == 202
+    wait_for(lambda: service.snapshot.status("111111111111")["state"] == "failed")
+    body = get(service, "/accounts/111111111111")[1]
+    assert body["errors"] == ["Unexpected failure: AssumeRole denied"]
+    assert body["rows"] == account_rows("111111111111", 1)
+    assert get(service, "/accounts/333333333333/refresh", method="POST")[0] == 404
+
+
+def test_snapshot_follows_the_account_list():
+    snapshot = InventorySnapshot(ACCOUNTS)
+    snapshot.update("111111111111", account_rows("111111111111", 1), ["ec2:DescribeVolumes"], None, 1.0)
+    snapshot.set_accounts(ACCOUNTS[1:] + [{"id": "333333333333", "name": "three"}])
+    assert [s["account_id"] for s in snapshot.status()] == ["222222222222", "333333333333"]
+    assert snapshot.rows() == [] and json.loads(snapshot.inventory_json()) == []
+    snapshot.update("111111111111", account_rows("111111111111", 2), [], None, 1.0)
+    assert snapshot.status("111111111111") is None
+    snapshot.update("333333333333", account_rows("333333333333", 1), ["ec2:DescribeVolumes"], None, 1.0)
+    assert snapshot.status("333333333333")["state"] == "partial"
+    assert snapshot.summary()["resources"] == 2
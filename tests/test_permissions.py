@@ -0,0 +1,88 @@
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from utils.permissions import MIN_DENIED_REGIONS, PermissionCache
+
+ACTION = "lambda:ListFunctions"
+COLLECTORS = [
+    SimpleNamespace(name="lambda", permissions=(ACTION,)),
+    SimpleNamespace(name="ec2", permissions=("ec2:DescribeInstances", "ec2:DescribeVolumes")),
+    SimpleNamespace(name="custom", permissions=()),
+]
+REGIONS = ["us-east-1", "eu-west-1", "ap-southeast-2"]
+
+
+def deny(cache, regions, account_id="1"):
+    for region in regions:
+        cache.record(account_id, "lambda", region, ACTION)
+
+
+def test_denial_in_one_region_is_not_cached():
+    cache = PermissionCache(COLLECTORS)
+    deny(cache, REGIONS[:1])
+    # Refusals repeated in the same region don't add up either.
+    deny(cache, REGIONS[:1])
+    assert cache.denied_action("1", "lambda") is None
+    assert cache.denials == 0
+
+
+def test_denial_in_several_regions_is_cached_for_the_account():
+    cache = PermissionCache(COLLECTORS)
+    deny(cache, REGIONS[:MIN_DENIED_REGIONS])
+    assert cache.denials == 1
+    assert cache.denied_action("1", "lambda") == ACTION
+    assert cache.denied_action("1", "ec2") is None
+    assert cache.denied_action("2", "lambda") is None
+    assert cache.skipped == 1
+
+
+def test_action_allowed_anywhere_is_never_cached():
+    cache = PermissionCache(COLLECTORS)
+    cache.record("1", "lambda", REGIONS[0], None)
+    deny(cache, REGIONS)
+    assert cache.denied_action("1", "lambda") is None
+    assert cache.denials == 0
+
+
+def test_unrelated_errors_and_collectors_without_permissions_are_ignored():
+    cache = PermissionCache(COLLECTORS)
+    for region in REGIONS:
+        cache.record("1", "lambda", region, "lambda:GetFunction")
+        cache.record("1", "custom", region, "custom:Anything")
+    assert cache.denied_action("1", "lambda") is None
+    assert cache.denied_action("1", "custom") is None
+    assert cache.denials == 0
+
+
+def test_forget_clears_the_account():
+    cache = PermissionCache(COLLECTORS)
+    deny(cache, REGIONS[:1])
+    cache.forget("1")
+    deny(cache, REGIONS[1:2])
+    assert cache.denied_action("1", "lambda") is None
+    deny(cache, REGIONS[2:])
+    assert cache.denied_action("1", "lambda") == ACTION
+
+
+def test_stats_move_between_caches():
+    worker = PermissionCache(COLLECTORS)
+    deny(worker, REGIONS)
+    worker.denied_action("1", "lambda")
+    worker.probes += 2
+    parent = PermissionCache(COLLECTORS)
+    parent.add_stats(worker.take_stats())
+    assert (parent.denials, parent.skipped, parent.probes) == (1, 1, 2)
+    assert (worker.denials, worker.skipped, worker.probes) == (0, 0, 0)
+
+
+def test_probes_from_many_threads_are_all_counted():
+    cache = PermissionCache(COLLECTORS)
+
+    def probe(account_id):
+        for region in REGIONS:
+            cache.record_probe(account_id, "lambda", region, ACTION)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(probe, [str(i) for i in range(200)]))
+    assert cache.take_stats() == {"denials": 200, "skipped": 0, "probes": 200 * len(REGIONS)}
+    assert cache.denied_action("199", "lambda") == ACTION
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import time
+
+import boto3
+from botocore.awsrequest import AWSResponse
+from botocore.config import Config
+
+from utils.rate_limit import DECREASE_FACTOR, AimdLimiter, RateController
+
+
+def test_slow_start_then_additive_increase():
+    limiter = AimdLimiter(initial=4)
+    for _ in range(3):
+        limiter.acquire()
+        limiter.release(success=True)
+    assert limiter.limit == 7
+    limiter.throttled(limiter.acquire())
+    limiter.release(success=False)
+    assert limiter.limit == 7 * DECREASE_FACTOR
+    limiter.acquire()
+    limiter.release(success=True)
+    assert limiter.limit == 7 * DECREASE_FACTOR + 1 / (7 * DECREASE_FACTOR)
+
+
+def test_a_burst_of_throttles_lowers_the_limit_once():
+    limiter = AimdLimiter(initial=10, minimum=2)
+    burst = [limiter.acquire() for _ in range(5)]
+    for sent_at in burst:
+        limiter.throttled(sent_at)
+        limiter.release(success=False)
+    assert (limiter.limit, limiter.throttles, limiter.decreases) == (7, 5, 1)
+    for _ in range(10):
+        limiter.throttled(limiter.acquire())
+        limiter.release(success=False)
+    assert limiter.limit == 2
+
+
+def test_acquire_waits_for_a_free_slot():
+    limiter = AimdLimiter(initial=1)
+    limiter.acquire()
+    acquired = threading.Event()
+    waiter = threading.Thread(target=lambda: (limiter.acquire(), acquired.set()))
+    waiter.start()
+    assert not acquired.wait(0.05)
+    limiter.release(success=False)
+    assert acquired.wait(5)
+    waiter.join()
+
+
+def test_acquire_async_waits_on_the_event_loop():
+    limiter = AimdLimiter(initial=1)
+    limiter.acquire()
+
+    async def main():
+        waiter = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.02)
+        assert not waiter.done()
+        threading.Timer(0.02, limiter.release, kwargs={"success": False}).start()
+        await asyncio.wait_for(waiter, 5)
+        cancelled = asyncio.ensure_future(limiter.acquire_async())
+        await asyncio.sleep(0.02)
+        cancelled.cancel()
+
+    asyncio.run(main())
+    assert limiter.in_flight == 1 and limiter._async_waiters == []
+
+
+class RawBody:
+    def __init__(self, body):
+        self.body = body
+
+    def stream(self, **kwargs):
+        yield self.body
+
+
+def reply_with(client, responses):
+    """Answers the client's requests with (status, body) pairs instead of sending them."""
+    responses = iter(responses)
+
+    def before_send(request, **kwargs):
+        status, body = next(responses)
+        return AWSResponse(request.url, status, {}, RawBody(body))
+
+    client.meta.events.register("before-send", before_send)
+
+
+THROTTLED = b"<Response><Errors><Error><Code>Throttling</Code><Message>slow down</Message></Error></Errors></Response>"
+
+
+def test_clients_of_an_account_share_one_limiter_per_service_and_region():
+    controller = RateController()
+    session = boto3.Session(aws_access_key_id="x", aws_secret_access_key="y", region_name="eu-west-1")
+    controller.register(session, "111111111111")
+    config = Config(retries={"mode": "standard", "total_max_attempts": 2})
+    for client in (session.client("ec2", config=config), session.client("ec2", config=config)):
+        # A throttled first attempt, retried successfully.
+        reply_with(client, [(503, THROTTLED), (200, b"<DescribeVolumesResponse/>")])
+        client.describe_volumes()
+    (account_id, service, region, stats), = controller.stats()
+    assert (account_id, service, region) == ("111111111111", "ec2", "eu-west-1")
+    assert (stats["calls"], stats["throttles"], stats["decreases"], stats["in_flight"]) == (2, 2, 2, 0)
+    assert controller.take_stats("111111111111")[0][3]["calls"] == 2
+    assert controller.live_stats() == []
@@ -0,0 +1,33 @@
+import pytest
+
+from utils import json_cache
+from utils.region_plan import RegionPlanner
+
+
+@pytest.fixture
+def planner(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_cache, "CACHE_DIR", str(tmp_path))
+    return RegionPlanner(recheck_days=7)
+
+
+def test_empty_regions_are_pruned_and_unknown_ones_probed(planner):
+    planner.record("1", "eu-west-1", 0)
+    planner.record("1", "us-east-1", 12)
+    scan, probe, pruned = planner.classify("1", ["us-east-1", "eu-west-1", "ap-south-1"])
+    assert (scan, probe, list(pruned)) == (["us-east-1"], ["ap-south-1"], ["eu-west-1"])
+
+
+def test_a_region_whose_last_scan_failed_is_never_pruned(planner):
+    planner.record("1", "eu-west-1", 0)
+    planner.record_failed("1", "eu-west-1")
+    assert planner.classify("1", ["eu-west-1"]) == (["eu-west-1"], [], {})
+    planner.record("1", "eu-west-1", 0)
+    assert list(planner.classify("1", ["eu-west-1"])[2]) == ["eu-west-1"]
+
+
+def test_a_failed_region_keeps_its_last_resource_count(planner):
+    planner.record("1", "eu-west-1", 3)
+    planner.record_failed("1", "eu-west-1")
+    planner.record_failed("1", "us-east-1")
+    order = planner.busiest_first("1", ["us-east-1", "eu-west-1", "ap-south-1"])
+    assert order == ["eu-west-1", "us-east-1", "ap-south-1"]
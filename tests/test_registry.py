@@ -0,0 +1,42 @@
+import threading
+
+import pytest
+
+import main
+from collectors import registry
+from collectors.registry import REGIONAL, register_collector, registered_collectors
+from utils.async_engine import AsyncEngine
+
+
+@pytest.fixture
+def collectors(monkeypatch):
+    """Registers test collectors on a copy of the registry."""
+    monkeypatch.setattr(registry, "_COLLECTORS", list(registry._COLLECTORS))
+
+
+def collect_sync_only(session, region, account_id, summary=False):
+    return [{"account_id": account_id, "resource": "test", "region": region,
+             "thread": threading.current_thread().name}], None
+
+
+def test_collectors_register_in_order_once(collectors):
+    collector = register_collector(collect_sync_only, scope=REGIONAL, service="ec2")
+    assert registered_collectors(REGIONAL)[-1] is collector
+    with pytest.raises(ValueError):
+        register_collector(collect_sync_only)
+
+
+def test_sync_only_collector_runs_through_the_async_engine(collectors):
+    collector = register_collector(collect_sync_only, scope=REGIONAL, service="ec2")
+    ctx = main.ScanContext("role", None, "runner", scheduler=None)
+    with AsyncEngine(max_workers=2, per_account=2, io_threads=2) as engine:
+        ctx.scheduler = engine
+        unit = ("111111111111", "eu-west-1", collector.name)
+        future = engine.submit(unit[0], main.run_unit_async, ctx, unit, main.execute_collector_async,
+                               unit[0], collector.async_func, session=None, summary=False,
+                               region=unit[1], engine=engine)
+        rows, error = future.result(timeout=10)
+    assert error is None
+    assert [(r["account_id"], r["region"]) for r in rows] == [("111111111111", "eu-west-1")]
+    # The blocking collector ran on the engine's I/O pool, not on its event loop.
+    assert rows[0]["thread"].startswith("async-io")
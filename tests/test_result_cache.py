@@ -0,0 +1,56 @@
+import main
+from utils.result_cache import ResultCache
+
+SIGNATURE = {"role": "Scanner", "regions": None}
+ROWS = [{"account_id": "1", "resource": "ec2", "region": "eu-west-1"}]
+
+
+def make_cache(tmp_path, **kwargs):
+    return ResultCache(SIGNATURE, path=str(tmp_path / "results.sqlite"), **kwargs)
+
+
+def test_fresh_units_are_served_and_stale_ones_are_not(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, max_age=3600)
+    cache.put("1", "eu-west-1", "ec2", ROWS, None)
+    assert cache.get("1", "eu-west-1", "ec2") == (ROWS, None)
+    assert cache.get("1", "us-east-1", "ec2") is None
+    now = main.time.time()
+    monkeypatch.setattr("utils.result_cache.time.time", lambda: now + 3601)
+    assert cache.peek("1", "eu-west-1", "ec2") is None
+    assert cache.get("1", "eu-west-1", "ec2") is None
+    assert (cache.hits, cache.stale) == (1, 1)
+    cache.close()
+
+
+def test_results_of_other_scan_options_are_not_served(tmp_path):
+    cache = make_cache(tmp_path, max_age=3600)
+    cache.put("1", "eu-west-1", "ec2", ROWS, None)
+    cache.close()
+    other = ResultCache(dict(SIGNATURE, regions=["eu-west-1"]), max_age=3600, path=str(tmp_path / "results.sqlite"))
+    assert other.get("1", "eu-west-1", "ec2") is None
+    other.close()
+
+
+def test_least_recently_used_units_are_evicted(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path, max_age=3600, max_entries=2)
+    clock = iter(range(1000, 2000))
+    monkeypatch.setattr("utils.result_cache.time.time", lambda: next(clock))
+    for region in ("a", "b", "c"):
+        cache.put("1", region, "ec2", ROWS, None)
+    cache.get("1", "a", "ec2")
+    assert cache.evict() == 1
+    assert cache.peek("1", "b", "ec2") is None
+    assert cache.peek("1", "a", "ec2") and cache.peek("1", "c", "ec2")
+    cache.close()
+
+
+def test_units_with_errors_are_not_cached(tmp_path):
+    cache = make_cache(tmp_path, max_age=3600)
+    ctx = main.ScanContext("role", None, "runner", scheduler=None, result_cache=cache)
+    for collector, result in (("ok", (ROWS, None)), ("throttled", ([], "ec2:DescribeVolumes failed (Throttling)")),
+                              ("denied", ([], "lambda:ListFunctions"))):
+        assert main.run_unit(ctx, ("1", "eu-west-1", collector), lambda: result) == result
+    assert cache.get("1", "eu-west-1", "ok") == (ROWS, None)
+    assert cache.get("1", "eu-west-1", "throttled") is None
+    assert cache.get("1", "eu-west-1", "denied") is None
+    cache.close()
@@ -0,0 +1,32 @@
+import pytest
+
+from collectors import s3
+from utils import json_cache
+from utils.json_cache import JsonCache
+
+
+@pytest.fixture
+def region_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(json_cache, "CACHE_DIR", str(tmp_path))
+    cache = JsonCache("s3_bucket_regions.json")
+    monkeypatch.setattr(s3, "_region_cache", cache)
+    return cache
+
+
+def test_cached_regions_follow_the_listed_buckets(region_cache):
+    region_cache.set("1", {"old": "us-east-1", "kept": "eu-west-1"})
+    pages = [{"Buckets": [{"Name": "kept"}, {"Name": "new", "BucketRegion": "EU"}, {"Name": "lost"}]}]
+    bucket_regions = s3._bucket_regions(pages, "1")
+    assert bucket_regions == {"kept": "eu-west-1", "new": "EU", "lost": None}
+
+    buckets_by_region, skipped = s3._group_by_region("1", bucket_regions)
+    assert buckets_by_region == {"eu-west-1": ["kept", "new"]} and skipped == ["lost"]
+    assert region_cache.get("1") == {"kept": "eu-west-1", "new": "eu-west-1"}
+
+
+def test_an_unchanged_account_is_not_rewritten(region_cache):
+    region_cache.set("1", {"kept": "eu-west-1"})
+    region_cache.save()
+    region_cache._updated.clear()
+    s3._group_by_region("1", s3._bucket_regions([{"Buckets": [{"Name": "kept"}]}], "1"))
+    assert not region_cache._updated
@@ -0,0 +1,96 @@
+import pytest
+
+from utils.sampling import PILOT_SIZE, StratifiedSampler, account_stratum, parse_sample_size
+
+
+def accounts(prefix, count):
+    return [{"id": f"{prefix}-{i}", "name": f"{prefix}-{i}"} for i in range(count)]
+
+
+def rows(count, resource="ec2"):
+    return [{"resource": resource} for _ in range(count)]
+
+
+def counts(estimate, resource="ec2"):
+    return next(row for row in estimate if row["resource"] == resource and row["metric"] == "count")
+
+
+def test_parse_sample_size():
+    assert parse_sample_size("5", 100) == 5
+    assert parse_sample_size("5%", 30) == 2
+    assert parse_sample_size("500", 100) == 100
+    with pytest.raises(ValueError):
+        parse_sample_size("0", 100)
+
+
+def test_strata_follow_account_names():
+    assert account_stratum({"name": "payments-prod"}) == "production"
+    assert account_stratum({"name": "payments-preprod"}) == "staging"
+    assert account_stratum({"name": "team-sandbox"}) == "development"
+    assert account_stratum({"name": "log-archive"}) == "shared"
+    assert account_stratum({"name": "acme"}) == "other"
+
+
+def test_strata_match_whole_name_tokens_only():
+    assert account_stratum({"name": "Payments Prod"}) == "production"
+    assert account_stratum({"name": "acme_dev02"}) == "development"
+    assert account_stratum({"name": "data.qa"}) == "staging"
+    for name in ("delivery", "product-catalog", "aqua", "devops-tools", "latest"):
+        assert account_stratum({"name": name}) == "other"
+
+
+def test_every_stratum_gets_its_pilot_accounts_first():
+    sampler = StratifiedSampler(accounts("prod", 10) + accounts("dev", 6) + accounts("acme", 3), size=8)
+    picked = [account_stratum(acc) for acc in sampler.accounts()]
+    assert len(picked) == 8
+    assert sorted(picked[:3 * PILOT_SIZE]) == sorted(["production", "development", "other"] * PILOT_SIZE)
+
+
+def test_census_estimate_is_exact():
+    population = accounts("prod", 4) + accounts("dev", 3)
+    sampler = StratifiedSampler(population)
+    for i, acc in enumerate(sampler.accounts()):
+        sampler.record(acc["id"], rows(i + 1))
+    row = counts(sampler.estimate())
+    assert row["observed"] == row["estimate"] == row["ci95_low"] == row["ci95_high"] == sum(range(1, 8))
+
+
+def test_estimate_extrapolates_each_stratum_from_its_mean():
+    # Every account of a stratum has the same count, so each stratum's mean is exact.
+    per_account = {"production": 10, "development": 2}
+    sampler = StratifiedSampler(accounts("prod", 20) + accounts("dev", 10), size=8)
+    for acc in sampler.accounts():
+        sampler.record(acc["id"], rows(per_account[account_stratum(acc)]))
+    row = counts(sampler.estimate())
+    assert row["estimate"] == 20 * 10 + 10 * 2
+    assert row["ci95_low"] == row["ci95_high"] == row["estimate"]
+
+
+def test_unobserved_stratum_is_extrapolated_with_a_wider_interval():
+    sampler = StratifiedSampler(accounts("prod", 10) + accounts("dev", 10), size=4)
+    for acc in sampler.accounts():
+        if account_stratum(acc) == "production":
+            sampler.record(acc["id"], rows(int(acc["id"].split("-")[1]) + 1))
+        else:
+            sampler.record(acc["id"], None)
+    assert sampler.coverage()["unobserved_strata"] == ["development"]
+    assert sampler.failed == 2
+    row = counts(sampler.estimate())
+    mean = row["observed"] / 2
+    assert row["estimate"] == pytest.approx(20 * mean)
+    assert row["ci95_low"] < row["estimate"] < row["ci95_high"]
+
+
+def test_stopped_accounts_are_reported_as_non_response():
+    sampler = StratifiedSampler(accounts("prod", 5), size=3)
+    picked = list(sampler.accounts())
+    sampler.record(picked[0]["id"], rows(3))
+    sampler.stop(picked[1]["id"])
+    coverage = sampler.coverage()
+    assert (coverage["selected"], coverage["observed"], coverage["stopped"]) == (3, 1, 1)
+    assert sampler.strata_report()[0]["stopped"] == 1
+
+
+def test_no_estimate_without_observations():
+    sampler = StratifiedSampler(accounts("prod", 5), size=2)
+    assert sampler.estimate() == []
@@ -0,0 +1,151 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.async_engine import AsyncEngine
+from utils.scheduler import ScanScheduler
+
+
+class Concurrency:
+    """Counts the units running at once, overall and per account."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.running = {}
+        self.peak = {}
+        self.total = 0
+        self.peak_total = 0
+
+    def unit(self, account_id, value, seconds=0.02):
+        with self._lock:
+            self.running[account_id] = self.running.get(account_id, 0) + 1
+            self.total += 1
+            self.peak[account_id] = max(self.peak.get(account_id, 0), self.running[account_id])
+            self.peak_total = max(self.peak_total, self.total)
+        time.sleep(seconds)
+        with self._lock:
+            self.running[account_id] -= 1
+            self.total -= 1
+        return value
+
+
+def submit_all(engine, seen, accounts=("a", "b", "c"), units=6):
+    return {(account_id, i): engine.submit(account_id, seen.unit, account_id, i)
+            for account_id in accounts for i in range(units)}
+
+
+def test_scheduler_respects_global_and_per_account_limits():
+    seen = Concurrency()
+    with ScanScheduler(max_workers=4, per_account=2) as scheduler:
+        futures = submit_all(scheduler, seen)
+        results = {key: f.result(timeout=10) for key, f in futures.items()}
+    assert results == {key: key[1] for key in futures}
+    assert max(seen.peak.values()) == 2
+    assert seen.peak_total <= 4
+
+
+def test_scheduler_per_account_never_exceeds_max_workers():
+    scheduler = ScanScheduler(max_workers=2, per_account=5)
+    assert scheduler.per_account == 2
+    scheduler.shutdown()
+
+
+def test_scheduler_cancelling_shutdown_cancels_queued_units():
+    release = threading.Event()
+    scheduler = ScanScheduler(max_workers=1, per_account=1)
+    running = scheduler.submit("a", release.wait, 10)
+    queued = [scheduler.submit("a", lambda: "never") for _ in range(3)]
+    scheduler.shutdown(wait=False, cancel_pending=True)
+    release.set()
+    assert running.result(timeout=10) is True
+    assert all(f.cancelled() for f in queued)
+    assert scheduler.submit("a", lambda: "late").cancelled()
+
+
+def test_scheduler_unit_exception_is_returned_and_frees_its_slot():
+    def fail():
+        raise ValueError("boom")
+
+    with ScanScheduler(max_workers=1, per_account=1) as scheduler:
+        failed = scheduler.submit("a", fail)
+        after = scheduler.submit("a", lambda: "ok")
+        with pytest.raises(ValueError):
+            failed.result(timeout=10)
+        assert after.result(timeout=10) == "ok"
+
+
+def test_async_engine_respects_global_and_per_account_limits():
+    seen = Concurrency()
+    # More I/O threads than slots, so only the engine's limits hold units back.
+    with AsyncEngine(max_workers=3, per_account=2, io_threads=8) as engine:
+        futures = submit_all(engine, seen)
+        results = {key: f.result(timeout=10) for key, f in futures.items()}
+    assert results == {key: key[1] for key in futures}
+    assert max(seen.peak.values()) <= 2
+    assert seen.peak_total <= 3
+
+
+def test_async_engine_runs_coroutine_units_on_its_loop():
+    async def unit(value):
+        await asyncio.sleep(0.01)
+        return value * 2
+
+    with AsyncEngine(max_workers=2, per_account=1) as engine:
+        futures = [engine.submit("a", unit, i) for i in range(4)]
+        assert [f.result(timeout=10) for f in futures] == [0, 2, 4, 6]
+
+
+def test_async_engine_cancelling_shutdown_resolves_every_future():
+    release = threading.Event()
+    engine = AsyncEngine(max_workers=1, per_account=1, io_threads=2)
+    running = engine.submit("a", release.wait, 10)
+    queued = [engine.submit("a", lambda: "never") for _ in range(3)]
+    time.sleep(0.05)
+    engine.shutdown(wait=False, cancel_pending=True)
+    release.set()
+    for future in [running] + queued:
+        assert future.done() or future.cancelled()
+    assert all(f.cancelled() for f in queued)
+    assert engine.submit("a", lambda: "late").cancelled()
+
+
+def test_map_from_a_unit_stays_within_the_account_limit():
+    seen = Concurrency()
+    with ScanScheduler(max_workers=8, per_account=3) as scheduler:
+        unit = scheduler.submit("a", lambda: scheduler.map("a", lambda i: seen.unit("a", i * 2), range(12)))
+        assert unit.result(timeout=10) == [i * 2 for i in range(12)]
+    # The calling unit works through the items itself, as one of the account's three slots.
+    assert seen.peak["a"] == 3
+
+
+def test_map_never_waits_for_its_own_account():
+    with ScanScheduler(max_workers=1, per_account=1) as scheduler:
+        unit = scheduler.submit("a", lambda: scheduler.map("a", lambda i: i + 1, range(5)))
+        assert unit.result(timeout=10) == [1, 2, 3, 4, 5]
+
+
+def test_map_raises_the_first_failed_item():
+    def item(i):
+        if i % 2:
+            raise ValueError(i)
+        return i
+
+    with ScanScheduler(max_workers=4, per_account=4) as scheduler:
+        with pytest.raises(ValueError, match="1"):
+            scheduler.submit("a", lambda: scheduler.map("a", item, range(6))).result(timeout=10)
+
+
+def test_async_engine_map_stays_within_the_account_limit():
+    seen = Concurrency()
+
+    async def unit(engine):
+        return await engine.map("a", "s3", lambda i: seen.unit("a", i * 2), range(12))
+
+    with AsyncEngine(max_workers=8, per_account=3, io_threads=8) as engine:
+        assert engine.submit("a", unit, engine).result(timeout=10) == [i * 2 for i in range(12)]
+    assert seen.peak["a"] == 3
+
+    with AsyncEngine(max_workers=1, per_account=1, io_threads=2) as engine:
+        assert engine.submit("a", unit, engine).result(timeout=10) == [i * 2 for i in range(12)]
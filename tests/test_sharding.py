@@ -0,0 +1,63 @@
+import random
+
+import pytest
+
+from utils.sharding import assign_shards, parse_shard, select_shard
+
+ACCOUNTS = [{"id": f"{100000000000 + i}", "name": f"account-{i}"} for i in range(40)]
+
+
+def shuffled(accounts, seed):
+    accounts = list(accounts)
+    random.Random(seed).shuffle(accounts)
+    return accounts
+
+
+def test_parse_shard():
+    assert parse_shard("2/4") == (2, 4)
+    for spec in ("0/4", "5/4", "1/0", "a/b", "1"):
+        with pytest.raises(ValueError):
+            parse_shard(spec)
+
+
+def test_assignment_is_deterministic_and_independent_of_list_order():
+    expected = assign_shards(ACCOUNTS, 4)
+    assert set(expected.values()) <= {1, 2, 3, 4}
+    for seed in range(3):
+        assert assign_shards(shuffled(ACCOUNTS, seed), 4) == expected
+
+
+def test_cost_assignment_is_deterministic_and_independent_of_list_order():
+    costs = {acc["id"]: float(i % 7 + 1) for i, acc in enumerate(ACCOUNTS) if i % 5}
+    expected = assign_shards(ACCOUNTS, 3, costs)
+    for seed in range(3):
+        assert assign_shards(shuffled(ACCOUNTS, seed), 3, dict(reversed(list(costs.items())))) == expected
+
+
+def test_shards_partition_the_accounts_in_their_original_order():
+    for costs in (None, {acc["id"]: float(i) for i, acc in enumerate(ACCOUNTS)}):
+        shards = [select_shard(ACCOUNTS, index, 4, costs) for index in range(1, 5)]
+        ids = [acc["id"] for shard in shards for acc in shard]
+        assert sorted(ids) == sorted(acc["id"] for acc in ACCOUNTS)
+        for shard in shards:
+            assert shard == [acc for acc in ACCOUNTS if acc in shard]
+
+
+def test_costs_balance_the_shards():
+    costs = {acc["id"]: 100.0 if i < 2 else 1.0 for i, acc in enumerate(ACCOUNTS)}
+    assignment = assign_shards(ACCOUNTS, 2, costs)
+    loads = {1: 0.0, 2: 0.0}
+    for account_id, shard in assignment.items():
+        loads[shard] += costs[account_id]
+    # The two expensive accounts go to different shards.
+    assert assignment[ACCOUNTS[0]["id"]] != assignment[ACCOUNTS[1]["id"]]
+    assert abs(loads[1] - loads[2]) <= 1.0
+
+
+def test_accounts_without_history_count_as_average():
+    costs = {ACCOUNTS[0]["id"]: 10.0, ACCOUNTS[1]["id"]: 30.0}
+    assignment = assign_shards(ACCOUNTS[:6], 2, costs)
+    loads = {1: 0.0, 2: 0.0}
+    for acc in ACCOUNTS[:6]:
+        loads[assignment[acc["id"]]] += costs.get(acc["id"], 20.0)
+    assert loads[1] == loads[2] == 60.0
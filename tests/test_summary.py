@@ -0,0 +1,27 @@
+from utils.summary import ResourceSummary, count_resources
+
+
+def bucket(account_id, region, size_gb, by_class):
+    return {"account_id": account_id, "resource": "s3_bucket", "region": region, "bucket_size_gb": size_gb,
+            "bucket_doc_num": 1, "bucket_size_gb_by_class": by_class}
+
+
+def test_unit_summaries_merge_without_rounding_errors():
+    # 300 buckets of 0.004 GB: rounding each unit's total first would report 0.
+    account = ResourceSummary("account")
+    for region in range(300):
+        unit = ResourceSummary()
+        unit.add_resource(bucket("1", f"region-{region}", 0.004, {"StandardStorage": 0.004}))
+        account.add_rows(unit.rows())
+    row, = account.rows(rounded=True)
+    assert row["bucket_size_gb_total"] == 1.2
+    assert row["bucket_size_gb_by_class_total"] == {"StandardStorage": 1.2}
+    assert row["count"] == 300 and count_resources(account.rows()) == 300
+
+
+def test_levels_drop_location_columns():
+    organization = ResourceSummary("organization")
+    for account_id in ("1", "2"):
+        organization.add_resource(bucket(account_id, "eu-west-1", 1.5, {}))
+    assert organization.rows() == [{"resource": "s3_bucket", "count": 2, "bucket_size_gb_total": 3.0,
+                                    "bucket_doc_num_total": 2, "bucket_size_gb_by_class_total": {}}]
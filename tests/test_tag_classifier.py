@@ -0,0 +1,43 @@
+import json
+
+from utils.tag_classifier import AUTOSCALING, KUBERNETES, TagClassifier
+
+K8S = (KUBERNETES,)
+BOTH = (AUTOSCALING, KUBERNETES)
+
+
+def tags(**pairs):
+    return [{"Key": key, "Value": value} for key, value in pairs.items()]
+
+
+def test_keys_and_prefixes_match_case_insensitively():
+    classifier = TagClassifier()
+    assert classifier.is_excluded([{"Key": "kubernetescluster", "Value": "x"}], K8S)
+    assert classifier.is_excluded([{"Key": "Karpenter.sh/NodePool", "Value": "default"}], K8S)
+    assert classifier.is_excluded([{"Key": "aws:autoscaling:groupName", "Value": "web"}], BOTH)
+    assert not classifier.is_excluded([{"Key": "aws:autoscaling:groupName", "Value": "web"}], K8S)
+    assert not classifier.is_excluded([], BOTH)
+    assert not classifier.is_excluded(None, BOTH)
+
+
+def test_tokens_match_whole_words_in_keys_and_values():
+    classifier = TagClassifier()
+    assert classifier.is_excluded(tags(Name="prod-EKS-node"), K8S)
+    assert classifier.is_excluded(tags(Role="cluster-autoscaler"), K8S)
+    assert not classifier.is_excluded(tags(Name="backups-4-weeks"), K8S)
+    assert not classifier.is_excluded(tags(Name="weeks", Owner="k8sops"), K8S)
+    # A token that only appears inside a word must not hide a whole-word match later on.
+    assert classifier.is_excluded(tags(Name="weeks", Cluster="eks"), K8S)
+
+
+def test_rule_files_extend_the_builtin_rules(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({KUBERNETES: {"keys": ["OpenShiftCluster"], "tokens": ["openshift"]},
+                                "batch": {"key_prefixes": ["aws:batch:"]}}))
+    classifier = TagClassifier()
+    assert not classifier.is_excluded(tags(Platform="openshift"), K8S)
+    classifier.load(str(path))
+    assert classifier.is_excluded(tags(Platform="OpenShift"), K8S)
+    assert classifier.is_excluded(tags(OpenShiftCluster="c1"), K8S)
+    assert classifier.is_excluded(tags(Name="eks"), K8S)
+    assert classifier.is_excluded([{"Key": "aws:batch:compute-environment", "Value": "ce"}], ("batch",))
@@ -0,0 +1,93 @@
+import os
+import threading
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+from utils.worker_pool import ProcessAccountPool, WorkerError, decode_batch, encode_batch
+
+
+def setup_worker(config):
+    """Worker setup: scan(name) returns a row, raises for "fail", exits the process for "die"."""
+    cancelled = threading.Event()
+
+    def scan(name, seconds=0.0):
+        if name == "fail":
+            raise ValueError("scan failed")
+        if name == "die":
+            os._exit(3)
+        if cancelled.wait(seconds):
+            return None
+        return {"account": name, "pid": os.getpid(), "tag": config["tag"]}
+
+    return scan, cancelled.set
+
+
+def make_pool(processes=2, accounts_per_process=1):
+    return ProcessAccountPool(processes, accounts_per_process, setup_worker, {"tag": "t"})
+
+
+def test_batches_round_trip():
+    value = ([{"id": 1, "tags": {"a": "b"}}], None)
+    assert decode_batch(encode_batch(value)) == value
+
+
+def test_results_arrive_from_every_worker():
+    pool = make_pool(processes=2, accounts_per_process=2)
+    futures = [pool.submit(f"acc-{i}", 0.05) for i in range(6)]
+    results = [f.result(timeout=30) for f in futures]
+    pool.shutdown()
+    assert [r["account"] for r in results] == [f"acc-{i}" for i in range(6)]
+    assert all(r["tag"] == "t" for r in results)
+    assert len({r["pid"] for r in results}) == 2
+    assert pool.batches == 6 and pool.lost_workers == 0
+
+
+def test_scan_exception_fails_only_that_account():
+    pool = make_pool()
+    failed = pool.submit("fail")
+    ok = pool.submit("ok")
+    with pytest.raises(WorkerError, match="ValueError: scan failed"):
+        failed.result(timeout=30)
+    assert ok.result(timeout=30)["account"] == "ok"
+    pool.shutdown()
+    assert pool.lost_workers == 0
+
+
+def test_dead_worker_fails_its_account_and_the_others_take_over():
+    pool = make_pool(processes=2, accounts_per_process=1)
+    dead = pool.submit("die")
+    others = [pool.submit(f"acc-{i}", 0.05) for i in range(4)]
+    with pytest.raises(WorkerError, match="exited with code 3"):
+        dead.result(timeout=30)
+    assert [f.result(timeout=30)["account"] for f in others] == [f"acc-{i}" for i in range(4)]
+    pool.shutdown()
+    assert pool.lost_workers == 1
+
+
+def test_accounts_fail_once_every_worker_is_gone():
+    pool = make_pool(processes=1, accounts_per_process=1)
+    dead = pool.submit("die")
+    queued = pool.submit("acc")
+    with pytest.raises(WorkerError, match="exited"):
+        dead.result(timeout=30)
+    with pytest.raises(WorkerError, match="No worker processes left"):
+        queued.result(timeout=30)
+    pool.shutdown()
+
+
+def test_cancelling_shutdown_stops_running_and_queued_accounts():
+    pool = make_pool(processes=1, accounts_per_process=1)
+    running = pool.submit("slow", 30)
+    queued = [pool.submit(f"acc-{i}") for i in range(3)]
+    time.sleep(0.2)
+    start = time.monotonic()
+    pool.shutdown(cancel_futures=True)
+    assert time.monotonic() - start < 10
+    assert running.result(timeout=1) is None
+    for future in queued:
+        with pytest.raises(CancelledError):
+            future.result(timeout=1)
+    with pytest.raises(RuntimeError):
+        pool.submit("late")
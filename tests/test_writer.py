@@ -0,0 +1,79 @@
+import csv
+import json
+import os
+import random
+
+from output.writer import AccountRows, StreamingWriter, make_spill_dir, temporary_path
+
+
+def rows(count, seed=0):
+    rng = random.Random(seed)
+    return [{"account_id": f"{rng.randrange(5):012d}", "resource": rng.choice(["ec2", "ebs", "lambda"]),
+             "region": rng.choice(["eu-west-1", "us-east-1"]), "id": i, **({"size_gb": i} if i % 3 else {})}
+            for i in range(count)]
+
+
+def test_csv_is_sorted_across_spilled_runs(tmp_path, monkeypatch):
+    monkeypatch.setattr("output.writer.MAX_MERGE_FANIN", 3)
+    data = rows(250)
+    writer = StreamingWriter(run_size=10, output_dir=str(tmp_path))
+    writer.write(data)
+    writer.close()
+
+    with open(tmp_path / "output.csv", newline="") as f:
+        reader = csv.DictReader(f)
+        assert reader.fieldnames == ["account_id", "resource", "region", "id", "size_gb"]
+        written = list(reader)
+    keys = [(r["resource"], r["account_id"], r["region"]) for r in written]
+    assert keys == sorted(keys)
+    assert sorted(int(r["id"]) for r in written) == list(range(250))
+    with open(tmp_path / "output.json") as f:
+        assert json.load(f) == data
+    assert sorted(os.listdir(tmp_path)) == ["output.csv", "output.json"]
+
+
+def test_outputs_appear_only_when_closed(tmp_path):
+    writer = StreamingWriter(output_dir=str(tmp_path), json_lines=True)
+    writer.write(rows(5))
+    assert not (tmp_path / "output.json").exists()
+    assert os.path.exists(temporary_path(str(tmp_path / "output.json")))
+    writer.close()
+    with open(tmp_path / "output.json") as f:
+        assert [json.loads(line) for line in f] == rows(5)
+
+
+def test_abort_leaves_nothing_behind(tmp_path):
+    writer = StreamingWriter(run_size=2, output_dir=str(tmp_path))
+    writer.write(rows(7))
+    writer.abort()
+    assert os.listdir(tmp_path) == []
+
+
+def test_spill_dirs_of_dead_processes_are_removed(tmp_path):
+    stale = tmp_path / ".spill-999999999-x"
+    stale.mkdir()
+    (tmp_path / "output.csv.999999999.tmp").write_text("partial")
+    spill_dir = make_spill_dir(str(tmp_path))
+    assert os.listdir(tmp_path) == [os.path.basename(spill_dir)]
+
+
+def test_account_rows_read_back_in_order(tmp_path):
+    account = AccountRows(str(tmp_path), "000000000001")
+    account.extend(rows(3))
+    account.extend(rows(2, seed=1))
+    assert len(account) == 5
+    assert list(account) == rows(3) + rows(2, seed=1)
+    account.discard()
+    assert os.listdir(tmp_path) == []
+
+
+def test_nested_values_are_written_to_the_csv_as_json(tmp_path):
+    row = {"account_id": "1", "resource": "s3_bucket", "region": "eu-west-1",
+           "bucket_size_gb_by_class": {"StandardStorage": 1.5, "GlacierStorage": 0.25}, "tags": ["a", "b"]}
+    writer = StreamingWriter(output_dir=str(tmp_path))
+    writer.write([row])
+    writer.close()
+    with open(tmp_path / "output.csv", newline="") as f:
+        written, = csv.DictReader(f)
+    assert json.loads(written["bucket_size_gb_by_class"]) == row["bucket_size_gb_by_class"]
+    assert json.loads(written["tags"]) == ["a", "b"]
@@ -0,0 +1,356 @@
+import json
+import math
+import os
+import threading
+import time
+from functools import partial
+
+THROTTLING_CODES = frozenset([
+    "Throttling", "ThrottlingException", "ThrottledException", "RequestThrottledException",
+    "TooManyRequestsException", "ProvisionedThroughputExceededException", "RequestLimitExceeded",
+    "BandwidthLimitExceeded", "LimitExceededException", "RequestThrottled", "SlowDown",
+    "EC2ThrottledException", "PriorRequestNotComplete"
+])
+QUANTILES = (0.5, 0.9, 0.99)
+CONTEXT_KEY = "scanner_api_metrics"
+# Latencies are counted in log-spaced buckets, each HISTOGRAM_GROWTH times wider than the one before
+# (0.1 ms, 0.109 ms, ...), so an operation's histogram stays small however many calls it has,
+# merges exactly across --processes workers, and its percentiles are within 9% of the exact value.
+HISTOGRAM_BASE = 1e-4
+HISTOGRAM_GROWTH = 2 ** 0.125
+
+
+def _bucket(seconds):
+    if seconds <= HISTOGRAM_BASE:
+        return 0
+    return math.ceil(math.log(seconds / HISTOGRAM_BASE, HISTOGRAM_GROWTH))
+
+
+def _percentile(histogram, count, maximum, q):
+    """Upper bound of the bucket holding the nearest-rank q-quantile, capped at the largest latency."""
+    if not count:
+        return 0.0
+    rank = max(1, math.ceil(q * count))
+    seen = 0
+    for bucket in sorted(histogram):
+        seen += histogram[bucket]
+        if seen >= rank:
+            return min(HISTOGRAM_BASE * HISTOGRAM_GROWTH ** bucket, maximum)
+    return maximum
+
+
+def _error_code(parsed):
+    if isinstance(parsed, dict):
+        return parsed.get("Error", {}).get("Code")
+    return None
+
+
+class _CallState:
+    """Per-call bookkeeping, kept in botocore's request context between events."""
+    __slots__ = ("account_id", "model", "start", "attempts", "throttles")
+
+    def __init__(self, account_id, model, start):
+        self.account_id = account_id
+        self.model = model
+        self.start = start
+        self.attempts = 0
+        self.throttles = 0
+
+
+class _OperationStats:
+    __slots__ = ("calls", "errors", "retries", "throttles", "bytes", "latency_sum", "latency_max", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.bytes = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        # latency bucket -> calls
+        self.histogram = {}
+
+    def add_latency(self, seconds):
+        self.latency_sum += seconds
+        self.latency_max = max(self.latency_max, seconds)
+        bucket = _bucket(seconds)
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def merge(self, other):
+        self.calls += other.calls
+        self.errors += other.errors
+        self.retries += other.retries
+        self.throttles += other.throttles
+        self.bytes += other.bytes
+        self.latency_sum += other.latency_sum
+        self.latency_max = max(self.latency_max, other.latency_max)
+        for bucket, count in other.histogram.items():
+            self.histogram[bucket] = self.histogram.get(bucket, 0) + count
+
+    def as_dict(self):
+        count = sum(self.histogram.values())
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "retries": self.retries,
+            "throttles": self.throttles,
+            "bytes_received": self.bytes,
+            "latency_seconds": {
+                "sum": round(self.latency_sum, 6),
+                "max": round(self.latency_max, 6),
+                **{f"p{int(q * 100)}": round(_percentile(self.histogram, count, self.latency_max, q), 6)
+                   for q in QUANTILES}
+            }
+        }
+
+
+class ApiMetrics:
+    """
+    Per-call instrumentation of every AWS API call made through an instrumented session.
+    Handlers on botocore's events time each operation call (retries included), read the
+    retry count and response size, and count throttled attempts, keyed by
+    (account_id, region, service, operation). With tracing enabled, API calls and
+    work units are also kept as Chrome trace events (chrome://tracing, Perfetto).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._origin = time.perf_counter()
+        self._trace = None
+        self._unit_ids = 0
+
+    def enable_trace(self):
+        with self._lock:
+            if self._trace is None:
+                self._trace = []
+
+    def instrument(self, session, account_id):
+        """Registers the handlers on a boto3 session; clients created from it afterwards inherit them."""
+        events = session.events
+        events.register("before-parameter-build", partial(self._on_start, account_id),
+                        unique_id=f"{CONTEXT_KEY}-start")
+        events.register("needs-retry", self._on_attempt, unique_id=f"{CONTEXT_KEY}-attempt")
+        events.register("after-call", self._on_response, unique_id=f"{CONTEXT_KEY}-response")
+        events.register("after-call-error", self._on_exception, unique_id=f"{CONTEXT_KEY}-exception")
+
+    # botocore event handlers
+
+    def _on_start(self, account_id, model, context, **kwargs):
+        context[CONTEXT_KEY] = _CallState(account_id, model, time.perf_counter())
+
+    def _on_attempt(self, request_dict, attempts, response=None, **kwargs):
+        state = request_dict.get("context", {}).get(CONTEXT_KEY)
+        if state is None:
+            return None
+        state.attempts = attempts
+        if response is not None and _error_code(response[1]) in THROTTLING_CODES:
+            state.throttles += 1
+        return None
+
+    def _on_response(self, http_response, parsed, model, context, **kwargs):
+        state = context.get(CONTEXT_KEY)
+        if state is None:
+            return
+        retries = max(state.attempts - 1, parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0))
+        throttles = state.throttles
+        if not throttles and _error_code(parsed) in THROTTLING_CODES:
+            throttles = 1
+        size = http_response.headers.get("content-length")
+        if size is None and not model.has_streaming_output:
+            size = len(http_response.content or b"")
+        self._record(state, context, error=http_response.status_code >= 300,
+                     retries=retries, throttles=throttles, size=int(size or 0))
+
+    def _on_exception(self, exception, context, **kwargs):
+        state = context.get(CONTEXT_KEY)
+        if state is None:
+            return
+        self._record(state, context, error=True, retries=max(state.attempts - 1, 0),
+                     throttles=state.throttles, size=0)
+
+    def _record(self, state, context, error, retries, throttles, size):
+        end = time.perf_counter()
+        context.pop(CONTEXT_KEY, None)
+        service = state.model.service_model.service_name
+        operation = state.model.name
+        region = context.get("client_region") or "global"
+        key = (state.account_id, region, service, operation)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _OperationStats()
+            stats.calls += 1
+            stats.errors += error
+            stats.retries += retries
+            stats.throttles += throttles
+            stats.bytes += size
+            stats.add_latency(end - state.start)
+            if self._trace is not None:
+                # The real process id keeps the events of --processes workers apart in the merged trace.
+                self._trace.append({
+                    "name": f"{service}.{operation}", "cat": "api", "ph": "X",
+                    "ts": self._micros(state.start), "dur": round((end - state.start) * 1e6, 1),
+                    "pid": os.getpid(), "tid": threading.get_ident(),
+                    "args": {"account_id": state.account_id, "region": region, "retries": retries,
+                             "throttles": throttles, "error": bool(error)}
+                })
+
+    # Work units (trace only)
+
+    def _micros(self, t):
+        return round((t - self._origin) * 1e6, 1)
+
+    def unit_started(self, unit):
+        """Returns a token for unit_finished(), or None when tracing is off."""
+        if self._trace is None:
+            return None
+        with self._lock:
+            self._unit_ids += 1
+            return self._unit_ids, time.perf_counter()
+
+    def unit_finished(self, token, unit, error=None):
+        if token is None:
+            return
+        unit_id, start = token
+        account_id, region, collector = unit
+        args = {"account_id": account_id, "region": region, "error": error}
+        pid = os.getpid()
+        # Unit ids are counted per process, so they are scoped to it.
+        with self._lock:
+            self._trace.append({"name": collector, "cat": "unit", "ph": "b", "id2": {"local": unit_id},
+                                "ts": self._micros(start), "pid": pid, "tid": 0, "args": args})
+            self._trace.append({"name": collector, "cat": "unit", "ph": "e", "id2": {"local": unit_id},
+                                "ts": self._micros(time.perf_counter()), "pid": pid, "tid": 0})
+
+    # Reports
+
+    def reset(self):
+        """Starts a new measurement period (used by --serve after each refresh cycle)."""
+        with self._lock:
+            self._stats = {}
+            if self._trace is not None:
+                self._trace = []
+
+    def take_stats(self):
+        """Returns and clears the measurements so far; a --processes worker sends them to the parent."""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            trace = self._trace
+            if trace is not None:
+                self._trace = []
+        return {"stats": stats, "trace": trace or []}
+
+    def add_stats(self, taken):
+        """Merges measurements from take_stats() of another process."""
+        with self._lock:
+            for key, other in taken["stats"].items():
+                stats = self._stats.get(key)
+                if stats is None:
+                    stats = self._stats[key] = _OperationStats()
+                stats.merge(other)
+            if self._trace is not None:
+                self._trace.extend(taken["trace"])
+
+    def total_calls(self):
+        with self._lock:
+            return sum(stats.calls for stats in self._stats.values())
+
+    def _grouped(self, key_func):
+        groups = {}
+        with self._lock:
+            for key, stats in self._stats.items():
+                group = groups.setdefault(key_func(key), _OperationStats())
+                group.merge(stats)
+        return groups
+
+    def summary_lines(self, top=5):
+        """The end-of-run table: one row per (service, operation), slowest total time first."""
+        by_operation = self._grouped(lambda key: (key[2], key[3]))
+        rows = sorted(((key, stats.as_dict()) for key, stats in by_operation.items()),
+                      key=lambda item: -item[1]["latency_seconds"]["sum"])
+        lines = [f"{'service.operation':<42}{'calls':>8}{'errors':>8}{'retries':>8}{'throttled':>10}"
+                 f"{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'total s':>10}{'KiB':>10}"]
+        for (service, operation), stats in rows:
+            latency = stats["latency_seconds"]
+            lines.append(
+                f"{service + '.' + operation:<42}{stats['calls']:>8}{stats['errors']:>8}{stats['retries']:>8}"
+                f"{stats['throttles']:>10}{latency['p50'] * 1000:>9.1f}{latency['p90'] * 1000:>9.1f}"
+                f"{latency['p99'] * 1000:>9.1f}{latency['max'] * 1000:>9.1f}{latency['sum']:>10.2f}"
+                f"{stats['bytes_received'] / 1024:>10.1f}")
+
+        hotspots = sorted(((key, stats.throttles) for key, stats in
+                           self._grouped(lambda key: (key[0], key[1], key[2])).items() if stats.throttles),
+                          key=lambda item: -item[1])[:top]
+        if hotspots:
+            lines.append("Most throttled (account, region, service): " +
+                         ", ".join(f"{a}/{r}/{s} x{n}" for (a, r, s), n in hotspots))
+        return lines
+
+    def write_json(self, path):
+        with self._lock:
+            items = sorted(self._stats.items())
+        data = [dict(zip(("account_id", "region", "service", "operation"), key), **stats.as_dict())
+                for key, stats in items]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"calls": data}, f, indent=2)
+
+    def write_prometheus(self, path):
+        """Writes a node_exporter textfile; the file is replaced atomically."""
+        with self._lock:
+            items = sorted((key, stats.as_dict()) for key, stats in self._stats.items())
+        counters = [
+            ("scanner_api_calls_total", "AWS API operation calls.", "calls"),
+            ("scanner_api_errors_total", "AWS API operation calls that failed.", "errors"),
+            ("scanner_api_retries_total", "Retried attempts of AWS API calls.", "retries"),
+            ("scanner_api_throttles_total", "Throttled attempts of AWS API calls.", "throttles"),
+            ("scanner_api_received_bytes_total", "Response bytes received from AWS APIs.", "bytes_received"),
+        ]
+        lines = []
+        for name, help_text, field in counters:
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+            lines += [f"{name}{{{_labels(key)}}} {stats[field]}" for key, stats in items]
+        name = "scanner_api_latency_seconds"
+        lines += [f"# HELP {name} Latency of AWS API operation calls, retries included.", f"# TYPE {name} summary"]
+        for key, stats in items:
+            latency = stats["latency_seconds"]
+            for q in QUANTILES:
+                lines.append(f"{name}{{{_labels(key)},quantile=\"{q}\"}} {latency[f'p{int(q * 100)}']}")
+            lines.append(f"{name}_sum{{{_labels(key)}}} {latency['sum']}")
+            lines.append(f"{name}_count{{{_labels(key)}}} {stats['calls']}")
+
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
+
+    def write_trace(self, path):
+        with self._lock:
+            events = list(self._trace or [])
+        metadata = []
+        for pid in sorted({e["pid"] for e in events}):
+            metadata.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"Scanner pid {pid}"}})
+            metadata.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": 0, "args": {"name": "Work units"}})
+            thread_ids = sorted({e["tid"] for e in events if e["pid"] == pid and e["cat"] == "api"})
+            metadata += [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                          "args": {"name": f"AWS API calls {i}"}} for i, tid in enumerate(thread_ids)]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+
+
+def _labels(key):
+    names = ("account", "region", "service", "operation")
+    return ",".join(f'{name}="{value}"' for name, value in zip(names, key))
+
+
+_API_METRICS = ApiMetrics()
+
+
+def instrument_session(session, account_id):
+    _API_METRICS.instrument(session, account_id)
+    return session
+
+
+def api_metrics():
+    return _API_METRICS
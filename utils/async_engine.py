@@ -0,0 +1,182 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+from functools import partial
+from utils.rate_limit import reserve, run_reserved
+
+# Upper bound on in-flight API calls per service across the whole run.
+SERVICE_CONCURRENCY = {
+    "ec2": 64,
+    "autoscaling": 32,
+    "lambda": 32,
+    "s3": 64,
+    "cloudwatch": 32,
+}
+DEFAULT_SERVICE_CONCURRENCY = 32
+_DONE = object()
+
+
+class AsyncEngine:
+    """
+    Runs (account, region, collector) work units as coroutines on a single event loop.
+    Drop-in replacement for ScanScheduler: submit() returns a concurrent Future, and
+    'max_workers' / 'per_account' cap the units in flight globally and per account.
+    Blocking botocore calls (one page at a time) run on a small pool of 'io_threads',
+    bounded per service, so thousands of pending units cost coroutines instead of threads.
+    """
+
+    is_async = True
+
+    def __init__(self, max_workers=256, per_account=16, io_threads=32):
+        self.max_workers = max(1, max_workers)
+        self.per_account = max(1, min(per_account, self.max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=max(1, io_threads), thread_name_prefix="async-io")
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="async-engine", daemon=True)
+        self._thread.start()
+        self._lock = threading.Lock()
+        self._futures = set()
+        self._cancelled = False
+        # Semaphores must be created on the loop's own thread.
+        asyncio.run_coroutine_threadsafe(self._setup(), self._loop).result()
+
+    async def _setup(self):
+        self._global = asyncio.Semaphore(self.max_workers)
+        self._accounts = {}
+        self._services = {}
+
+    def _service_semaphore(self, service):
+        semaphore = self._services.get(service)
+        if semaphore is None:
+            limit = SERVICE_CONCURRENCY.get(service, DEFAULT_SERVICE_CONCURRENCY)
+            semaphore = self._services[service] = asyncio.Semaphore(limit)
+        return semaphore
+
+    def submit(self, account_id, func, *args, **kwargs):
+        """Queues a unit for 'account_id' and returns a concurrent Future for its result."""
+        with self._lock:
+            if self._cancelled:
+                # The loop is stopping, so a coroutine scheduled now would never resolve.
+                future = Future()
+                future.cancel()
+                future.set_running_or_notify_cancel()
+                return future
+            future = asyncio.run_coroutine_threadsafe(self._run(account_id, func, args, kwargs), self._loop)
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    async def _run(self, account_id, func, args, kwargs):
+        semaphore = self._accounts.get(account_id)
+        if semaphore is None:
+            semaphore = self._accounts[account_id] = [asyncio.Semaphore(self.per_account), 0]
+        semaphore[1] += 1
+        try:
+            # The account's own slot comes first: units queued behind their account's limit
+            # must not hold global slots that other accounts could use.
+            async with semaphore[0], self._global:
+                if self._cancelled:
+                    raise asyncio.CancelledError()
+                if asyncio.iscoroutinefunction(func):
+                    return await func(*args, **kwargs)
+                return await self.call(None, func, *args, **kwargs)
+        finally:
+            semaphore[1] -= 1
+            if not semaphore[1]:
+                del self._accounts[account_id]
+
+    async def call(self, service, func, *args, **kwargs):
+        """Runs a blocking call on the I/O pool, within the concurrency limit of 'service'."""
+        loop = asyncio.get_running_loop()
+        if service is None:
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+        async with self._service_semaphore(service):
+            return await loop.run_in_executor(self._executor, partial(func, *args, **kwargs))
+
+    async def map(self, account_id, service, func, items):
+        """
+        Runs the blocking func(item) for every item from inside a running unit of 'account_id' and
+        returns the results in order. Like ScanScheduler.map(), the calling coroutine works through
+        the items together with up to per_account - 1 helper units of the account, so the calls stay
+        within the run's, the account's and the service's limits without waiting on its own account.
+        """
+        items = list(items)
+        results = [None] * len(items)
+        done = [asyncio.Event() for _ in items]
+        next_item = [0]
+
+        async def work():
+            while True:
+                i = next_item[0]
+                next_item[0] += 1
+                if i >= len(items):
+                    return
+                try:
+                    results[i] = (True, await self.call(service, func, items[i]))
+                except BaseException as e:
+                    results[i] = (False, e)
+                finally:
+                    done[i].set()
+
+        # Helpers that get their slot after the items ran out return at once.
+        for _ in range(min(self.per_account, len(items)) - 1):
+            asyncio.ensure_future(self._run(account_id, work, (), {}))
+        await work()
+        for event in done:
+            await event.wait()
+        for ok, value in results:
+            if not ok:
+                raise value
+        return [value for _, value in results]
+
+    async def paginate(self, service, paginator, limiter=None, **kwargs):
+        """
+        Async iterator over the pages of a boto3 paginator; each page is fetched on the I/O pool.
+        With the rate 'limiter' of the paginator's (account, service, region), each page waits for
+        its slot on the loop, so throttled accounts don't hold I/O threads while they wait.
+        """
+        pages = iter(paginator.paginate(**kwargs))
+        while True:
+            if limiter is None:
+                page = await self.call(service, next, pages, _DONE)
+            else:
+                reservation = await reserve(limiter)
+                try:
+                    page = await self.call(service, run_reserved, reservation, next, pages, _DONE)
+                finally:
+                    reservation.cancel()
+            if page is _DONE:
+                return
+            yield page
+
+    async def _cancel_tasks(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        with self._lock:
+            futures = list(self._futures)
+            if cancel_pending:
+                self._cancelled = True
+        if cancel_pending:
+            # Cancelled on the loop itself, so every unit's Future is resolved before the loop stops.
+            asyncio.run_coroutine_threadsafe(self._cancel_tasks(), self._loop).result()
+        elif wait:
+            wait_futures(futures)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        if wait:
+            self._thread.join()
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=exc_type is None, cancel_pending=exc_type is not None)
+        return False
@@ -0,0 +1,93 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CHECKPOINT_PATH = os.path.join("output", ".checkpoint", "scan.sqlite")
+
+# Pseudo-region used for account-wide units (S3, region discovery).
+GLOBAL_SCOPE = "global"
+
+
+class CheckpointStore:
+    """
+    Persists every completed (account, region, collector) unit as soon as it finishes,
+    so an interrupted scan can be resumed with --resume.
+    'signature' describes the scan options; stored units are only reused when it matches.
+    """
+
+    def __init__(self, signature, resume=False, path=CHECKPOINT_PATH):
+        self.path = path
+        self.reused = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            "account_id TEXT, region TEXT, collector TEXT, results TEXT, error TEXT, completed_at REAL, "
+            "PRIMARY KEY (account_id, region, collector))"
+        )
+
+        signature = json.dumps(signature, sort_keys=True)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'signature'").fetchone()
+        self.signature_mismatch = resume and row is not None and row[0] != signature
+        if not resume or self.signature_mismatch:
+            self._conn.execute("DELETE FROM units")
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('signature', ?)", (signature,))
+        self._conn.commit()
+
+    def get(self, account_id, region, collector):
+        """Returns the stored (results, error) of a completed unit, or None."""
+        unit = self.peek(account_id, region, collector)
+        if unit is not None:
+            with self._lock:
+                self.reused += 1
+        return unit
+
+    def peek(self, account_id, region, collector):
+        """Like get(), without counting the unit as reused."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, error FROM units WHERE account_id = ? AND region = ? AND collector = ?",
+                (account_id, region, collector)
+            ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, account_id, region, collector, results, error):
+        payload = (json.dumps(results, default=str), json.dumps(error, default=str))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?, ?, ?)",
+                (account_id, region, collector, payload[0], payload[1], time.time())
+            )
+            self._conn.commit()
+
+    def take_stats(self):
+        with self._lock:
+            reused, self.reused = self.reused, 0
+        return {"reused": reused}
+
+    def add_stats(self, stats):
+        with self._lock:
+            self.reused += stats["reused"]
+
+    def completed_units(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM units").fetchone()[0]
+
+    def close(self, remove=False):
+        with self._lock:
+            self._conn.close()
+        if remove:
+            for suffix in ("", "-wal", "-shm"):
+                try:
+                    os.remove(self.path + suffix)
+                except OSError:
+                    pass
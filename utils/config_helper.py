@@ -1,18 +1,160 @@
+import threading
+import time
 import boto3
 from botocore.config import Config
+from utils.api_metrics import instrument_session
+from utils.rate_limit import rate_limit_session
+
+# Built once and shared by every client; clients are reused across worker threads,
+# so the connection pool is sized above the per-account worker limit.
+# Client-side rate limiting is done by utils.rate_limit, shared across clients,
+# so botocore only retries with backoff ('standard') instead of keeping its own
+# per-client token bucket ('adaptive').
+_AWS_CONFIG = Config(
+    retries={
+        'max_attempts': 10,
+        'mode': 'standard'
+    },
+    max_pool_connections=50
+)
+
 
 def get_aws_config():
-    """Returns a boto3 config with adaptive retries to handle throttling."""
-    return Config(
-        retries={
-            'max_attempts': 10,
-            'mode': 'adaptive'
-        }
-    )
+    """Returns a boto3 config with retries to handle throttling."""
+    return _AWS_CONFIG
+
+
+_loader_lock = threading.Lock()
+_shared_loader = None
+
+
+def _share_data_loader(session):
+    """
+    Makes the session load service models through the loader shared by every prepared session.
+    A botocore Loader caches the models it has parsed, so with one loader per account session
+    every account would parse the same JSON models again before building its first clients.
+    """
+    global _shared_loader
+    botocore_session = session._session
+    with _loader_lock:
+        if _shared_loader is None:
+            _shared_loader = botocore_session.get_component("data_loader")
+        else:
+            botocore_session.register_component("data_loader", _shared_loader)
+
+
+def prepare_session(session, account_id):
+    """
+    Instruments a boto3 session, routes its calls through the shared rate limiters and
+    shares one model loader between sessions. Must run before any client is created from the session.
+    """
+    _share_data_loader(session)
+    rate_limit_session(session, account_id)
+    return instrument_session(session, account_id)
+
+
+class ClientPool:
+    """
+    Thread-safe cache of boto3 clients keyed by (session, service, region).
+    Clients are thread-safe once built, so one client (and its connection pool)
+    is shared by every collector working on the same account/region.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._clients = {}
+        # Strong references keep id(session) unique until the session is released.
+        self._sessions = {}
+        self._build_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.build_seconds = 0.0
+
+    def get(self, session, service, region_name=None):
+        session_key = id(session)
+        key = (session_key, service, region_name)
+
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self.hits += 1
+                return client
+            self._sessions.setdefault(session_key, session)
+            build_lock = self._build_locks.setdefault(session_key, threading.Lock())
+
+        # boto3 sessions are not thread-safe, so clients of one session are built one at a time.
+        with build_lock:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is not None:
+                    self.hits += 1
+                    return client
+
+            start = time.perf_counter()
+            client = session.client(service, region_name=region_name, config=_AWS_CONFIG)
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                self._clients[key] = client
+                self.misses += 1
+                self.build_seconds += elapsed
+        return client
+
+    def release_session(self, session):
+        """Evicts every client built from 'session' once its account is finished."""
+        session_key = id(session)
+        with self._lock:
+            for key in [k for k in self._clients if k[0] == session_key]:
+                del self._clients[key]
+            self._sessions.pop(session_key, None)
+            self._build_locks.pop(session_key, None)
+
+    def take_stats(self):
+        with self._lock:
+            stats = {"hits": self.hits, "misses": self.misses, "build_seconds": self.build_seconds}
+            self.hits, self.misses, self.build_seconds = 0, 0, 0.0
+        return stats
+
+    def add_stats(self, stats):
+        with self._lock:
+            self.hits += stats["hits"]
+            self.misses += stats["misses"]
+            self.build_seconds += stats["build_seconds"]
+
+    def stats(self):
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / requests) if requests else 0.0,
+                "build_seconds": self.build_seconds,
+                "cached_clients": len(self._clients),
+            }
+
+
+_CLIENT_POOL = ClientPool()
+
 
 def get_client(session, service, region_name=None):
     """
-    Helper to create a client with the standard config.
+    Helper to get a pooled client with the standard config.
     Renamed 'region' to 'region_name' to match boto3 standards.
     """
-    return session.client(service, region_name=region_name, config=get_aws_config())
\ No newline at end of file
+    return _CLIENT_POOL.get(session, service, region_name=region_name)
+
+
+def release_session(session):
+    _CLIENT_POOL.release_session(session)
+
+
+def client_pool_stats():
+    return _CLIENT_POOL.stats()
+
+
+def take_client_pool_stats():
+    return _CLIENT_POOL.take_stats()
+
+
+def add_client_pool_stats(stats):
+    _CLIENT_POOL.add_stats(stats)
@@ -0,0 +1,306 @@
+"""
+Cost estimation over collected inventory.
+
+Rows are priced with a PricingTable and rolled up per (account_id, region, resource).
+With NumPy installed, the inventory is loaded as array-backed columns (straight from the
+columnar file's chunks when one is available), unit prices are looked up once per distinct
+key value and broadcast with fancy indexing, and group-bys are a single bincount.
+Without NumPy the same estimate is computed by a plain Python loop over the rows.
+"""
+import csv
+import json
+from output.columnar import ColumnarReader
+from utils.pricing import PricingTable
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+GROUP_COLUMNS = ("account_id", "region", "resource")
+LEVELS = {
+    "account": ("account_id",),
+    "region": ("region",),
+    "resource": ("resource",),
+    "detail": GROUP_COLUMNS,
+}
+# Above this many (account, region, resource) combinations, group-bys use np.unique instead of bincount.
+MAX_BINCOUNT_SIZE = 1 << 24
+
+
+class CostEstimate:
+    """Monthly cost and resource count per (account_id, region, resource), with roll-ups."""
+
+    def __init__(self, groups, unpriced=()):
+        # (account_id, region, resource) -> [resources, monthly cost]
+        self.groups = groups
+        self.unpriced = sorted(unpriced)
+
+    @property
+    def total(self):
+        return sum(cost for _, cost in self.groups.values())
+
+    @property
+    def resources(self):
+        return sum(count for count, _ in self.groups.values())
+
+    def by(self, level="detail"):
+        """Rows of the roll-up at 'level' (account, region, resource or detail), most expensive first."""
+        columns = LEVELS[level]
+        positions = [GROUP_COLUMNS.index(column) for column in columns]
+        rolled = {}
+        for key, (count, cost) in self.groups.items():
+            entry = rolled.setdefault(tuple(key[p] for p in positions), [0, 0.0])
+            entry[0] += count
+            entry[1] += cost
+        rows = [dict(zip(columns, key), resources=int(round(count)), monthly_cost=round(cost, 2))
+                for key, (count, cost) in rolled.items()]
+        return sorted(rows, key=lambda row: (-row["monthly_cost"], [str(row[c]) for c in columns]))
+
+    def write_csv(self, path, level="detail"):
+        with open(path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(LEVELS[level]) + ["resources", "monthly_cost"])
+            writer.writeheader()
+            writer.writerows(self.by(level))
+
+
+# Inputs
+
+def _rows_from_file(path):
+    if path.endswith(".scol"):
+        yield from ColumnarReader(path).rows()
+    elif path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from json.load(f)
+
+
+def _needed_columns(pricing):
+    keys, quantities = set(GROUP_COLUMNS), {"count"}
+    for resource in pricing.resources():
+        for component in pricing.components(resource):
+            if "key" in component:
+                keys.add(component["key"])
+            if "quantity" in component:
+                quantities.update((component["quantity"], component["quantity"] + "_total"))
+    return keys, quantities
+
+
+# Pure Python
+
+def estimate_rows_python(rows, pricing=None):
+    """Prices each row in a Python loop; the reference implementation and the fallback without NumPy."""
+    pricing = pricing or PricingTable()
+    groups = {}
+    unpriced = set()
+    prices = {}
+    for row in rows:
+        resource = row.get("resource")
+        components = pricing.components(resource)
+        if not components:
+            unpriced.add(resource)
+        count = row.get("count", 1)
+        cost = 0.0
+        for i, component in enumerate(components):
+            key_value = row.get(component["key"]) if "key" in component else None
+            price = prices.get((resource, i, key_value))
+            if price is None:
+                price = prices[(resource, i, key_value)] = pricing.unit_price(component, key_value)
+            if "quantity" in component:
+                quantity = _number(row.get(component["quantity"]))
+                if quantity is None:
+                    quantity = _number(row.get(component["quantity"] + "_total"))
+                quantity = quantity or 0
+            else:
+                quantity = count
+            cost += price * quantity * component.get("multiplier", 1)
+        key = (row.get("account_id"), row.get("region"), resource)
+        entry = groups.get(key)
+        if entry is None:
+            entry = groups[key] = [0, 0.0]
+        entry[0] += count
+        entry[1] += cost
+    return CostEstimate(groups, unpriced)
+
+
+# NumPy
+
+def _python_value(value):
+    if isinstance(value, float):
+        if value != value:
+            return None
+        if value.is_integer():
+            return int(value)
+    return value
+
+
+def _encode_numbers(values):
+    """Dictionary-encodes a float array; NaN (no value) becomes None."""
+    dictionary, codes = np.unique(values, return_inverse=True)
+    return [_python_value(float(v)) for v in dictionary], codes.astype(np.uint32)
+
+
+def _number(value, missing=None):
+    """'value' if it is a number (not a boolean), else 'missing'."""
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else missing
+
+
+def _columnar_column(reader, name, encoded):
+    """Reads one column of a .scol file as (dictionary, codes) if 'encoded', else as a float array (NaN = no value)."""
+    parts, dictionary = [], reader.dictionary(name)
+    absent_code = None
+    for rows, encoding, width, data, missing in reader.raw_chunks(name):
+        if encoding is None:
+            if encoded:
+                if absent_code is None:
+                    absent_code = dictionary.index(None) if None in dictionary else len(dictionary)
+                    if absent_code == len(dictionary):
+                        dictionary.append(None)
+                parts.append(np.full(rows, absent_code, dtype=np.uint32))
+            else:
+                parts.append(np.full(rows, np.nan))
+            continue
+        if encoding == "dict" and encoded:
+            parts.append(np.frombuffer(data, dtype="<u2" if width == "H" else "<u4").astype(np.uint32))
+            continue
+        if encoding in ("int64", "double"):
+            values = np.frombuffer(data, dtype="<i8" if encoding == "int64" else "<f8").astype(np.float64)
+        elif encoding == "dict":
+            lookup = np.array([_number(v, np.nan) for v in dictionary] or [np.nan], dtype=np.float64)
+            values = lookup[np.frombuffer(data, dtype="<u2" if width == "H" else "<u4")]
+        else:
+            # Mixed or nested values: decode through Python.
+            values = np.array([_number(v, np.nan) for v in json.loads(data.decode("utf-8"))], dtype=np.float64)
+        if missing is not None:
+            values[np.unpackbits(np.frombuffer(missing, dtype=np.uint8), bitorder="little")[:rows].astype(bool)] = np.nan
+        parts.append(values)
+
+    if not encoded:
+        return np.concatenate(parts) if parts else np.zeros(0)
+    # Mixed chunks: numbers are dictionary-encoded and merged with the stored dictionary.
+    if all(part.dtype == np.uint32 for part in parts):
+        return dictionary, (np.concatenate(parts) if parts else np.zeros(0, dtype=np.uint32))
+    merged, codes = list(dictionary), []
+    index = {(type(value), value): code for code, value in enumerate(merged)}
+    for part in parts:
+        if part.dtype != np.uint32:
+            part_dictionary, part_codes = _encode_numbers(part)
+            remap = []
+            for value in part_dictionary:
+                key = (type(value), value)
+                if key not in index:
+                    index[key] = len(merged)
+                    merged.append(value)
+                remap.append(index[key])
+            part = np.array(remap, dtype=np.uint32)[part_codes] if remap else part_codes
+        codes.append(part)
+    return merged, np.concatenate(codes)
+
+
+def _load_columnar(path, pricing):
+    reader = ColumnarReader(path)
+    keys, quantities = _needed_columns(pricing)
+    encoded = {name: _columnar_column(reader, name, True) for name in keys}
+    numbers = {name: _columnar_column(reader, name, False) for name in quantities}
+    return reader.num_rows, encoded, numbers
+
+
+def _load_rows(rows, pricing):
+    keys, quantities = _needed_columns(pricing)
+    dictionaries = {name: {} for name in keys}
+    codes = {name: [] for name in keys}
+    numbers = {name: [] for name in quantities}
+    count = 0
+    for row in rows:
+        count += 1
+        for name in keys:
+            index = dictionaries[name]
+            value = row.get(name)
+            code = index.get(value)
+            if code is None:
+                code = index[value] = len(index)
+            codes[name].append(code)
+        for name in quantities:
+            numbers[name].append(_number(row.get(name), np.nan))
+    encoded = {name: (list(dictionaries[name]), np.array(codes[name], dtype=np.uint32)) for name in keys}
+    return count, encoded, {name: np.array(values, dtype=np.float64) for name, values in numbers.items()}
+
+
+def _group_sums(codes, sizes, weights):
+    """Sums each weight array per distinct combination of 'codes'; returns (code tuples, sums)."""
+    size = 1
+    for s in sizes:
+        size *= max(s, 1)
+    flat = np.ravel_multi_index(codes, [max(s, 1) for s in sizes]) if codes[0].size else np.zeros(0, dtype=np.int64)
+    if size <= MAX_BINCOUNT_SIZE:
+        present = np.bincount(flat, minlength=size) > 0
+        keys = np.flatnonzero(present)
+        sums = [np.bincount(flat, weights=w, minlength=size)[keys] for w in weights]
+    else:
+        keys, inverse = np.unique(flat, return_inverse=True)
+        sums = [np.bincount(inverse, weights=w, minlength=keys.size) for w in weights]
+    return np.unravel_index(keys, [max(s, 1) for s in sizes]), sums
+
+
+def estimate_columns(num_rows, encoded, numbers, pricing=None):
+    """Vectorized estimate over loaded columns (see _load_columnar / _load_rows)."""
+    pricing = pricing or PricingTable()
+    resources, resource_codes = encoded["resource"]
+    count = numbers.get("count", np.full(num_rows, np.nan))
+    count = np.where(np.isnan(count), 1.0, count)
+    cost = np.zeros(num_rows)
+    unpriced = []
+
+    for code, resource in enumerate(resources):
+        components = pricing.components(resource)
+        if not components:
+            unpriced.append(resource)
+            continue
+        rows = np.flatnonzero(resource_codes == code)
+        if not rows.size:
+            continue
+        for component in components:
+            if "key" in component:
+                dictionary, key_codes = encoded[component["key"]]
+                lookup = np.array([pricing.unit_price(component, value) for value in dictionary] or [0.0])
+                price = lookup[key_codes[rows]]
+            else:
+                price = pricing.unit_price(component)
+            if "quantity" in component:
+                quantity = numbers[component["quantity"]][rows]
+                totals = numbers[component["quantity"] + "_total"][rows]
+                quantity = np.where(np.isnan(quantity), totals, quantity)
+                quantity = np.nan_to_num(quantity, nan=0.0)
+            else:
+                quantity = count[rows]
+            cost[rows] += price * quantity * component.get("multiplier", 1)
+
+    codes = [encoded[column][1] for column in GROUP_COLUMNS]
+    sizes = [len(encoded[column][0]) for column in GROUP_COLUMNS]
+    key_codes, (counts, costs) = _group_sums(codes, sizes, [count, cost])
+    dictionaries = [encoded[column][0] for column in GROUP_COLUMNS]
+    groups = {}
+    for i, (account, region, resource) in enumerate(zip(*key_codes)):
+        key = (dictionaries[0][account], dictionaries[1][region], dictionaries[2][resource])
+        entry = groups.setdefault(key, [0.0, 0.0])
+        entry[0] += float(counts[i])
+        entry[1] += float(costs[i])
+    return CostEstimate(groups, unpriced)
+
+
+def estimate_file(path, pricing=None, vectorized=True):
+    """Estimates the cost of an output file (.scol, .json or .jsonl)."""
+    pricing = pricing or PricingTable()
+    if np is None or not vectorized:
+        return estimate_rows_python(_rows_from_file(path), pricing)
+    if path.endswith(".scol"):
+        return estimate_columns(*_load_columnar(path, pricing), pricing)
+    return estimate_columns(*_load_rows(_rows_from_file(path), pricing), pricing)
+
+
+def vectorized_available():
+    return np is not None
@@ -0,0 +1,147 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+import boto3
+from botocore.credentials import RefreshableCredentials
+from botocore.session import get_session
+from utils.config_helper import get_aws_config, prepare_session
+
+PREFETCH_WORKERS = 8
+SESSION_NAME = "Scanner"
+
+
+class CredentialBroker:
+    """
+    Hands out one assumed-role session per (account, role), shared by every unit of that account.
+    Sessions use refreshable credentials that botocore renews before they expire, all
+    AssumeRole calls go through one shared STS client, and prefetch() assumes roles for
+    upcoming accounts in parallel so their scans don't start with a blocking STS call.
+    """
+
+    def __init__(self, prefetch_workers=PREFETCH_WORKERS):
+        self._lock = threading.Lock()
+        self._sts = None
+        self._sessions = {}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, prefetch_workers), thread_name_prefix="sts")
+        self.assumed = 0
+        self.prefetched = 0
+
+    def _sts_client(self):
+        with self._lock:
+            if self._sts is None:
+                self._sts = boto3.client("sts", config=get_aws_config())
+            return self._sts
+
+    def _assume(self, account_id, role_name):
+        sts = self._sts_client()
+        role_arn = f"arn:aws:iam::{account_id}:role/{role_name}"
+
+        def fetch():
+            creds = sts.assume_role(RoleArn=role_arn, RoleSessionName=SESSION_NAME)["Credentials"]
+            with self._lock:
+                self.assumed += 1
+            return {
+                "access_key": creds["AccessKeyId"],
+                "secret_key": creds["SecretAccessKey"],
+                "token": creds["SessionToken"],
+                "expiry_time": creds["Expiration"].isoformat()
+            }
+
+        try:
+            credentials = RefreshableCredentials.create_from_metadata(
+                metadata=fetch(),
+                refresh_using=fetch,
+                method="sts-assume-role"
+            )
+        except Exception as e:
+            return None, str(e)
+
+        botocore_session = get_session()
+        botocore_session._credentials = credentials
+        return prepare_session(boto3.Session(botocore_session=botocore_session), account_id), None
+
+    def _future(self, account_id, role_name, prefetch):
+        key = (account_id, role_name)
+        with self._lock:
+            future = self._sessions.get(key)
+            if future is not None:
+                return future, False
+            future = self._sessions[key] = Future()
+            if prefetch:
+                self.prefetched += 1
+        return future, True
+
+    def _resolve(self, future, account_id, role_name):
+        try:
+            result = self._assume(account_id, role_name)
+        except BaseException as e:
+            result = (None, str(e))
+        if result[0] is None:
+            # A failed AssumeRole isn't kept: callers waiting now get the error, later ones try again.
+            with self._lock:
+                if self._sessions.get((account_id, role_name)) is future:
+                    del self._sessions[(account_id, role_name)]
+        future.set_result(result)
+
+    def prefetch(self, account_ids, role_name):
+        """Starts assuming roles for 'account_ids' in the background."""
+        for account_id in account_ids:
+            future, created = self._future(account_id, role_name, prefetch=True)
+            if created:
+                self._executor.submit(self._resolve, future, account_id, role_name)
+
+    def get(self, account_id, role_name):
+        """Returns (session, error) for the account, waiting for a prefetch in progress if there is one."""
+        future, created = self._future(account_id, role_name, prefetch=False)
+        if created:
+            self._resolve(future, account_id, role_name)
+        return future.result()
+
+    def release(self, account_id, role_name):
+        with self._lock:
+            self._sessions.pop((account_id, role_name), None)
+
+    def take_stats(self):
+        with self._lock:
+            stats = {"assumed": self.assumed, "prefetched": self.prefetched}
+            self.assumed, self.prefetched = 0, 0
+        return stats
+
+    def add_stats(self, stats):
+        with self._lock:
+            self.assumed += stats["assumed"]
+            self.prefetched += stats["prefetched"]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "assumed": self.assumed,
+                "prefetched": self.prefetched,
+                "cached_sessions": len(self._sessions)
+            }
+
+
+_BROKER = CredentialBroker()
+
+
+def get_role_session(account_id, role_name):
+    return _BROKER.get(account_id, role_name)
+
+
+def prefetch_role_sessions(account_ids, role_name):
+    _BROKER.prefetch(account_ids, role_name)
+
+
+def release_role_session(account_id, role_name):
+    _BROKER.release(account_id, role_name)
+
+
+def credential_stats():
+    return _BROKER.stats()
+
+
+def take_credential_stats():
+    return _BROKER.take_stats()
+
+
+def add_credential_stats(stats):
+    _BROKER.add_stats(stats)
@@ -0,0 +1,399 @@
+"""
+Service mode (--serve): the scanner stays up, rescans every account on a rolling schedule
+and answers queries about the latest inventory from memory over a small HTTP/JSON API.
+
+    GET  /status                       totals, refresh schedule and scan progress
+    GET  /accounts                     scan status of every account
+    GET  /accounts/<id>                one account's status and resources
+    GET  /inventory[?account_id=&region=&resource=]
+                                       resources of every account (optionally filtered)
+    POST /accounts/<id>/refresh        rescan an account now
+"""
+import heapq
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+FILTER_FIELDS = ("account_id", "region", "resource")
+
+
+def _encode(value):
+    return json.dumps(value, default=str).encode("utf-8")
+
+
+class InventorySnapshot:
+    """
+    Latest scan result of every account. Each account's rows are JSON-encoded once when
+    its scan completes, so serving them is a join of pre-encoded bytes. An account whose
+    rescan fails keeps serving its previous rows, marked with the failure.
+    """
+
+    def __init__(self, accounts, count_rows=len):
+        self._lock = threading.Lock()
+        self._count_rows = count_rows
+        self._order = [acc["id"] for acc in accounts]
+        self._status = {acc["id"]: self._new_status(acc) for acc in accounts}
+        self._rows = {}
+        self._encoded = {}
+        self._inventory = None
+        self.updated_at = None
+
+    @staticmethod
+    def _new_status(acc):
+        return {
+            "account_id": acc["id"],
+            "name": acc["name"],
+            "state": "pending",
+            "resources": 0,
+            "errors": [],
+            "scanned_at": None,
+            "last_success_at": None,
+            "scan_seconds": None,
+            "next_refresh_at": None,
+            "scans": 0,
+        }
+
+    def mark_scanning(self, account_id):
+        with self._lock:
+            if account_id in self._status:
+                self._status[account_id]["state"] = "scanning"
+
+    def set_next_refresh(self, account_id, at):
+        with self._lock:
+            if account_id in self._status:
+                self._status[account_id]["next_refresh_at"] = at
+
+    def set_accounts(self, accounts):
+        """Follows a new account list: new accounts start as pending, removed ones are dropped."""
+        with self._lock:
+            self._order = [acc["id"] for acc in accounts]
+            for acc in accounts:
+                status = self._status.get(acc["id"])
+                if status is None:
+                    self._status[acc["id"]] = self._new_status(acc)
+                else:
+                    status["name"] = acc["name"]
+            for account_id in set(self._status) - set(self._order):
+                del self._status[account_id]
+                self._rows.pop(account_id, None)
+                self._encoded.pop(account_id, None)
+            self._inventory = None
+
+    def update(self, account_id, results, errors, failure, seconds):
+        """Stores a finished scan (the (results, errors, failure) of scan_account_safe)."""
+        now = time.time()
+        encoded = b",".join(_encode(row) for row in results) if results is not None else None
+        with self._lock:
+            status = self._status.get(account_id)
+            if status is None:
+                # Removed from the organization while it was being scanned.
+                return
+            status.update(scanned_at=now, scan_seconds=round(seconds, 3), scans=status["scans"] + 1)
+            if failure or results is None:
+                status.update(state="failed", errors=[failure] if failure else list(errors or []))
+                return
+            status.update(state="partial" if errors else "ok", errors=sorted(errors or []),
+                          resources=self._count_rows(results), last_success_at=now)
+            self._rows[account_id] = results
+            self._encoded[account_id] = encoded
+            self._inventory = None
+            self.updated_at = now
+
+    def status(self, account_id=None):
+        with self._lock:
+            if account_id is not None:
+                status = self._status.get(account_id)
+                return dict(status) if status else None
+            return [dict(self._status[a]) for a in self._order]
+
+    def rows(self, account_id=None):
+        """Rows of one account, or of every account in scan order."""
+        with self._lock:
+            if account_id is not None:
+                return list(self._rows.get(account_id, []))
+            return [row for a in self._order for row in self._rows.get(a, [])]
+
+    def inventory_json(self, filters=None):
+        """JSON array of the rows matching 'filters' ({field: set of values}); unfiltered output is cached."""
+        if filters:
+            account_ids = filters.get("account_id", ())
+            rows = self.rows(next(iter(account_ids)) if len(account_ids) == 1 else None)
+            return _encode([row for row in rows
+                            if all(str(row.get(field)) in values for field, values in filters.items())])
+        with self._lock:
+            if self._inventory is None:
+                self._inventory = b"[" + b",".join(
+                    self._encoded[a] for a in self._order if self._encoded.get(a)) + b"]"
+            return self._inventory
+
+    def account_json(self, account_id):
+        with self._lock:
+            status = self._status.get(account_id)
+            if status is None:
+                return None
+            return (_encode(status)[:-1] + b', "rows": [' + self._encoded.get(account_id, b"") + b"]}")
+
+    def summary(self):
+        with self._lock:
+            states = {}
+            for status in self._status.values():
+                states[status["state"]] = states.get(status["state"], 0) + 1
+            return {
+                "accounts": len(self._order),
+                "states": states,
+                "resources": sum(s["resources"] for s in self._status.values()),
+                "updated_at": self.updated_at,
+            }
+
+
+class RollingRefresher:
+    """
+    Rescans every account once per 'interval' seconds. The first pass starts all accounts
+    at once (bounded by 'parallel'); after it, account i of N is due at offset i/N of each
+    interval, so AWS calls are spread evenly instead of arriving in one burst per cycle.
+    'on_cycle()' runs on its own thread each time every account has been rescanned since the
+    previous call, so slow reports never hold a scan slot. update_accounts() follows changes
+    to the account list between cycles.
+    """
+
+    def __init__(self, accounts, scan, snapshot, interval, parallel, on_cycle=None):
+        self.accounts = {acc["id"]: acc for acc in accounts}
+        self.scan = scan
+        self.snapshot = snapshot
+        self.interval = interval
+        self.on_cycle = on_cycle
+        self.cycles = 0
+        self.started_at = None
+        self._set_positions()
+
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=max(1, parallel), thread_name_prefix="refresh")
+        self._slots = threading.Semaphore(max(1, parallel))
+        self._heap = []
+        self._due = {}
+        self._running = set()
+        self._cycle_pending = set(self.accounts)
+        self._stopped = False
+        self._thread = None
+        self._cycle_done = threading.Event()
+        self._cycle_thread = None
+
+    def _set_positions(self):
+        # Each account's position in the scan order and slot within the interval.
+        self._index = {account_id: i for i, account_id in enumerate(self.accounts)}
+        self._offsets = {account_id: i * self.interval / len(self.accounts) for account_id, i in self._index.items()}
+
+    def _schedule(self, account_id, due):
+        # Called with the lock held; older heap entries of the account become stale.
+        self._due[account_id] = due
+        heapq.heappush(self._heap, (due, self._index[account_id], account_id))
+        self.snapshot.set_next_refresh(account_id, due)
+        self._cond.notify()
+
+    def start(self):
+        self.started_at = time.time()
+        with self._cond:
+            for account_id in self.accounts:
+                self._schedule(account_id, self.started_at)
+        self._thread = threading.Thread(target=self._loop, name="refresher", daemon=True)
+        self._thread.start()
+        self._cycle_thread = threading.Thread(target=self._cycles, name="refresh-cycle", daemon=True)
+        self._cycle_thread.start()
+
+    def update_accounts(self, accounts):
+        """
+        Replaces the account list: new accounts are scanned right away and join the current
+        cycle, removed ones are unscheduled (a scan in progress finishes and is dropped).
+        Returns the ids of the added and removed accounts.
+        """
+        current = {acc["id"]: acc for acc in accounts}
+        if not current:
+            return [], []
+        with self._cond:
+            added = [account_id for account_id in current if account_id not in self.accounts]
+            removed = [account_id for account_id in self.accounts if account_id not in current]
+            self.accounts = current
+            self._set_positions()
+            self.snapshot.set_accounts(accounts)
+            for account_id in removed:
+                self._due.pop(account_id, None)
+                self._cycle_pending.discard(account_id)
+            now = time.time()
+            for account_id in added:
+                self._cycle_pending.add(account_id)
+                if account_id not in self._running:
+                    self._schedule(account_id, now)
+        return added, removed
+
+    def request_refresh(self, account_id):
+        """Moves an account's next scan to now; False if the account is unknown."""
+        if account_id not in self.accounts:
+            return False
+        with self._cond:
+            if account_id not in self._running:
+                self._schedule(account_id, time.time())
+        return True
+
+    def in_progress(self):
+        with self._cond:
+            return len(self._running)
+
+    def _next(self):
+        with self._cond:
+            while not self._stopped:
+                while self._heap and self._due.get(self._heap[0][2]) != self._heap[0][0]:
+                    heapq.heappop(self._heap)
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                due, _, account_id = self._heap[0]
+                wait = due - time.time()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+                heapq.heappop(self._heap)
+                del self._due[account_id]
+                self._running.add(account_id)
+                return account_id
+        return None
+
+    def _loop(self):
+        while True:
+            self._slots.acquire()
+            account_id = self._next()
+            if account_id is None:
+                return
+            self.snapshot.mark_scanning(account_id)
+            self._pool.submit(self._run, account_id)
+
+    def _next_slot(self, account_id, now):
+        """The account's first slot after 'now'; manual refreshes don't move it."""
+        slot = self.started_at + self._offsets[account_id]
+        if now < slot:
+            return slot
+        return slot + self.interval * (int((now - slot) // self.interval) + 1)
+
+    def _run(self, account_id):
+        with self._cond:
+            acc = self.accounts.get(account_id)
+        start = time.monotonic()
+        try:
+            if acc is None:
+                results, errors, failure = None, None, "Account removed"
+            else:
+                results, errors, failure = self.scan(acc)
+        except Exception as e:
+            results, errors, failure = None, None, f"Unexpected failure: {str(e)}"
+        self.snapshot.update(account_id, results, errors, failure, time.monotonic() - start)
+        with self._cond:
+            self._running.discard(account_id)
+            if account_id in self.accounts and account_id not in self._due:
+                self._schedule(account_id, self._next_slot(account_id, time.time()))
+            self._cycle_pending.discard(account_id)
+            cycle_done = not self._cycle_pending
+            if cycle_done:
+                self._cycle_pending = set(self.accounts)
+                self.cycles += 1
+        self._slots.release()
+        if cycle_done:
+            self._cycle_done.set()
+
+    def _cycles(self):
+        # Cycles that complete while on_cycle() is still running are reported once, by the next call.
+        while True:
+            self._cycle_done.wait()
+            if self._stopped:
+                return
+            self._cycle_done.clear()
+            if self.on_cycle:
+                self.on_cycle()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        self._cycle_done.set()
+        self._slots.release()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, code, body):
+        if not isinstance(body, bytes):
+            body = _encode(body)
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        parts = [p for p in url.path.split("/") if p]
+        snapshot = self.service.snapshot
+        if parts == ["status"]:
+            self._send(200, self.service.status())
+        elif parts == ["accounts"]:
+            self._send(200, snapshot.status())
+        elif len(parts) == 2 and parts[0] == "accounts":
+            body = snapshot.account_json(parts[1])
+            self._send(200, body) if body is not None else self._send(404, {"error": "unknown account"})
+        elif parts == ["inventory"]:
+            query = parse_qs(url.query)
+            filters = {field: set(query[field]) for field in FILTER_FIELDS if field in query}
+            self._send(200, snapshot.inventory_json(filters))
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        if len(parts) == 3 and parts[0] == "accounts" and parts[2] == "refresh":
+            if self.service.refresher.request_refresh(parts[1]):
+                self._send(202, {"account_id": parts[1], "refresh": "queued"})
+            else:
+                self._send(404, {"error": "unknown account"})
+        else:
+            self._send(404, {"error": "not found"})
+
+
+class InventoryService:
+    """Ties the snapshot, the rolling refresher and the HTTP API together."""
+
+    def __init__(self, accounts, scan, interval, parallel, host="127.0.0.1", port=8080, on_cycle=None,
+                 count_rows=len):
+        self.snapshot = InventorySnapshot(accounts, count_rows)
+        self.refresher = RollingRefresher(accounts, scan, self.snapshot, interval, parallel, on_cycle)
+        handler = type("InventoryHandler", (_Handler,), {"service": self})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def status(self):
+        return dict(self.snapshot.summary(),
+                    refresh_interval_seconds=self.refresher.interval,
+                    cycles=self.refresher.cycles,
+                    scans_in_progress=self.refresher.in_progress(),
+                    started_at=self.refresher.started_at)
+
+    def serve_forever(self):
+        self.refresher.start()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.refresher.stop()
+            self.server.server_close()
+
+    def shutdown(self):
+        self.server.shutdown()
@@ -0,0 +1,52 @@
+import json
+import os
+import threading
+
+CACHE_DIR = os.path.join("output", ".cache")
+
+
+class JsonCache:
+    """
+    Small persistent key/value store backed by a JSON file under output/.cache.
+    The file is loaded lazily, shared between threads and rewritten atomically on save.
+    Keys saved by other processes (--processes workers) since it was loaded are kept.
+    """
+
+    def __init__(self, filename):
+        self.path = os.path.join(CACHE_DIR, filename)
+        self._lock = threading.Lock()
+        self._data = None
+        self._updated = set()
+
+    def _read(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _load(self):
+        if self._data is None:
+            self._data = self._read()
+        return self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._load().get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._load()[key] = value
+            self._updated.add(key)
+
+    def save(self):
+        with self._lock:
+            data = self._load()
+            for key, value in self._read().items():
+                if key not in self._updated:
+                    data[key] = value
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, sort_keys=True)
+            os.replace(tmp_path, self.path)
@@ -0,0 +1,84 @@
+import threading
+
+# An action is cached as denied for the whole account only after this many regions refused it.
+MIN_DENIED_REGIONS = 2
+
+
+class PermissionCache:
+    """
+    IAM actions each account has denied during this run, so the regional units of a collector
+    whose action was denied skip their API calls instead of being refused in every region.
+    A unit that is skipped returns exactly what the denied call returns (no rows, and the
+    action as its error), so results and the audit report don't change.
+    A denial in a single region may come from a region-scoped SCP, so an action is cached only
+    once MIN_DENIED_REGIONS regions have refused it. An action that has succeeded anywhere in
+    the account is never cached as denied, and every region is still called for it.
+    """
+
+    def __init__(self, collectors):
+        # collector name -> IAM actions it needs
+        self._permissions = {c.name: c.permissions for c in collectors}
+        self._lock = threading.Lock()
+        self._denied = {}
+        self._allowed = {}
+        # account_id -> action -> regions that refused it
+        self._refusals = {}
+        self.denials = 0
+        self.skipped = 0
+        self.probes = 0
+
+    def denied_action(self, account_id, collector_name):
+        """The first cached denied action the collector needs, or None if it should run."""
+        with self._lock:
+            denied = self._denied.get(account_id)
+            if not denied:
+                return None
+            for action in self._permissions.get(collector_name, ()):
+                if action in denied:
+                    self.skipped += 1
+                    return action
+        return None
+
+    def record(self, account_id, collector_name, region, error):
+        """Records the outcome of a collector call (or pre-flight probe) in 'region' for the account."""
+        actions = self._permissions.get(collector_name, ())
+        if not actions:
+            return
+        with self._lock:
+            allowed = self._allowed.setdefault(account_id, set())
+            denied = self._denied.setdefault(account_id, set())
+            if error in actions:
+                if error in allowed or error in denied:
+                    return
+                regions = self._refusals.setdefault(account_id, {}).setdefault(error, set())
+                regions.add(region)
+                if len(regions) >= MIN_DENIED_REGIONS:
+                    denied.add(error)
+                    self.denials += 1
+            elif not error:
+                allowed.update(actions)
+                denied.difference_update(actions)
+
+    def record_probe(self, account_id, collector_name, region, error):
+        """record() for a pre-flight probe; probes are counted in the stats."""
+        with self._lock:
+            self.probes += 1
+        self.record(account_id, collector_name, region, error)
+
+    def take_stats(self):
+        with self._lock:
+            stats = {"denials": self.denials, "skipped": self.skipped, "probes": self.probes}
+            self.denials, self.skipped, self.probes = 0, 0, 0
+        return stats
+
+    def add_stats(self, stats):
+        with self._lock:
+            self.denials += stats["denials"]
+            self.skipped += stats["skipped"]
+            self.probes += stats["probes"]
+
+    def forget(self, account_id):
+        with self._lock:
+            self._denied.pop(account_id, None)
+            self._allowed.pop(account_id, None)
+            self._refusals.pop(account_id, None)
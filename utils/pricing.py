@@ -0,0 +1,90 @@
+import bisect
+import json
+
+HOURS_PER_MONTH = 730
+
+# resource -> cost components; a row costs the sum of its components, each priced as
+#   unit price x quantity x multiplier
+# The unit price is 'price', or looked up by the row's 'key' column in 'prices' (exact
+# value, else 'default') or 'tiers' ([upper bound, price] pairs, first bound >= value).
+# 'quantity' is a numeric column (or its '<column>_total' in --summary output); components
+# without one are priced per resource. All defaults are us-east-1 on-demand list prices
+# in USD per month; replace them with --pricing for negotiated rates or other regions.
+DEFAULT_PRICING = {
+    "ec2": [{
+        "key": "instance_type",
+        "multiplier": HOURS_PER_MONTH,
+        "prices": {
+            "t3.nano": 0.0052, "t3.micro": 0.0104, "t3.small": 0.0208, "t3.medium": 0.0416,
+            "t3.large": 0.0832, "t3.xlarge": 0.1664, "t3.2xlarge": 0.3328,
+            "t3a.micro": 0.0094, "t3a.small": 0.0188, "t3a.medium": 0.0376, "t3a.large": 0.0752,
+            "m5.large": 0.096, "m5.xlarge": 0.192, "m5.2xlarge": 0.384, "m5.4xlarge": 0.768,
+            "m6i.large": 0.096, "m6i.xlarge": 0.192, "m6i.2xlarge": 0.384, "m6i.4xlarge": 0.768,
+            "m7i.large": 0.1008, "m7i.xlarge": 0.2016, "m7g.large": 0.0816, "m7g.xlarge": 0.1632,
+            "c5.large": 0.085, "c5.xlarge": 0.17, "c5.2xlarge": 0.34, "c5.4xlarge": 0.68,
+            "c6i.large": 0.085, "c6i.xlarge": 0.17, "c7g.large": 0.0725, "c7g.xlarge": 0.145,
+            "r5.large": 0.126, "r5.xlarge": 0.252, "r5.2xlarge": 0.504,
+            "r6i.large": 0.126, "r6i.xlarge": 0.252, "r6g.large": 0.1008, "r6g.xlarge": 0.2016
+        },
+        # Unknown types are priced like an m5.large.
+        "default": 0.096
+    }],
+    "asg_ec2_equivalent": [{"quantity": "asg_instance_count", "price": 0.096, "multiplier": HOURS_PER_MONTH}],
+    "ebs": [{
+        "key": "ebs_type",
+        "quantity": "ebs_size_gb",
+        "prices": {"gp2": 0.10, "gp3": 0.08, "io1": 0.125, "io2": 0.125, "st1": 0.045, "sc1": 0.015,
+                   "standard": 0.05},
+        "default": 0.10
+    }],
+    "lambda": [{
+        # Per function and month by configured memory (MB), for a light steady workload.
+        "key": "function_memory_mb",
+        "tiers": [[128, 0.50], [256, 1.00], [512, 2.00], [1024, 4.00], [2048, 8.00], [4096, 16.00],
+                  [10240, 40.00]]
+    }],
+    "s3_bucket": [
+        {"quantity": "bucket_size_gb", "price": 0.023},
+        {"quantity": "bucket_doc_num", "price": 0.0000025}
+    ]
+}
+
+
+class PricingTable:
+    """Cost components per resource type (layout of DEFAULT_PRICING), extendable from JSON files."""
+
+    def __init__(self, pricing=None):
+        self.pricing = {resource: [dict(component) for component in components]
+                        for resource, components in (pricing or DEFAULT_PRICING).items()}
+
+    def extend(self, pricing):
+        """Replaces the components of every resource type in 'pricing'."""
+        for resource, components in pricing.items():
+            self.pricing[resource] = [dict(component) for component in components]
+
+    def load(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            self.extend(json.load(f))
+
+    def components(self, resource):
+        return self.pricing.get(resource, [])
+
+    def resources(self):
+        return list(self.pricing)
+
+    @staticmethod
+    def unit_price(component, key_value=None):
+        """Unit price of 'component' for a row whose key column holds 'key_value'."""
+        if "tiers" in component:
+            tiers = component["tiers"]
+            try:
+                value = float(key_value)
+            except (TypeError, ValueError):
+                return tiers[0][1]
+            i = bisect.bisect_left([bound for bound, _ in tiers], value)
+            return tiers[min(i, len(tiers) - 1)][1]
+        if "prices" in component:
+            prices = component["prices"]
+            price = prices.get(key_value if isinstance(key_value, str) else str(key_value))
+            return component.get("default", 0.0) if price is None else price
+        return component.get("price", 0.0)
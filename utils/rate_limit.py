@@ -0,0 +1,306 @@
+import asyncio
+import threading
+import time
+from utils.api_metrics import THROTTLING_CODES
+
+INITIAL_LIMIT = 4
+MIN_LIMIT = 1
+MAX_LIMIT = 50
+DECREASE_FACTOR = 0.7
+CONTEXT_KEY = "scanner_rate_limit"
+# How often the live limiters are logged during a scan.
+REPORT_SECONDS = 60
+
+
+class AimdLimiter:
+    """
+    Concurrency limit for one (account, service, region), adjusted by AIMD: every successful
+    call raises the limit by 1/limit (about +1 per round of calls), and a throttled attempt
+    multiplies it by DECREASE_FACTOR. Only attempts sent after the previous decrease can
+    lower it again, so one burst of throttles costs a single step instead of a collapse.
+    Until the first throttle, each success adds a whole slot (slow start), so bursts reach
+    the service's real capacity quickly.
+    """
+
+    def __init__(self, initial=INITIAL_LIMIT, minimum=MIN_LIMIT, maximum=MAX_LIMIT):
+        self._cond = threading.Condition()
+        self.minimum = minimum
+        self.maximum = maximum
+        self.limit = float(initial)
+        self.peak_limit = self.limit
+        self.in_flight = 0
+        self.calls = 0
+        self.throttles = 0
+        self.decreases = 0
+        self.wait_seconds = 0.0
+        self.first_call = None
+        self.last_call = None
+        self._last_decrease = 0.0
+        # (loop, future) of coroutines waiting in acquire_async()
+        self._async_waiters = []
+
+    def acquire(self):
+        """Blocks until a slot is free; returns the time the call was let through."""
+        start = time.monotonic()
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            return self._take(start)
+
+    async def acquire_async(self):
+        """acquire() for coroutines: waits on the event loop, so a throttled limiter holds no thread."""
+        loop = asyncio.get_running_loop()
+        start = time.monotonic()
+        while True:
+            with self._cond:
+                if self.in_flight < int(self.limit):
+                    return self._take(start)
+                waiter = (loop, loop.create_future())
+                self._async_waiters.append(waiter)
+            try:
+                await waiter[1]
+            except asyncio.CancelledError:
+                with self._cond:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+                    else:
+                        # Already woken for a free slot: pass the wake-up on.
+                        self._wake_async(1)
+                raise
+
+    def _take(self, start):
+        self.in_flight += 1
+        now = time.monotonic()
+        self.wait_seconds += now - start
+        if self.first_call is None:
+            self.first_call = now
+        return now
+
+    def _wake(self):
+        free = max(1, int(self.limit) - self.in_flight)
+        self._cond.notify(free)
+        self._wake_async(free)
+
+    def _wake_async(self, count):
+        waiters, self._async_waiters = self._async_waiters[:count], self._async_waiters[count:]
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_set_done, future)
+            except RuntimeError:
+                # The event loop is closed.
+                pass
+
+    def throttled(self, sent_at):
+        with self._cond:
+            self.throttles += 1
+            if sent_at >= self._last_decrease:
+                self.limit = max(self.minimum, self.limit * DECREASE_FACTOR)
+                self._last_decrease = time.monotonic()
+                self.decreases += 1
+
+    def release(self, success):
+        with self._cond:
+            self.in_flight -= 1
+            self.calls += 1
+            self.last_call = time.monotonic()
+            if success:
+                step = 1.0 / self.limit if self.decreases else 1.0
+                self.limit = min(self.maximum, self.limit + step)
+                self.peak_limit = max(self.peak_limit, self.limit)
+            self._wake()
+
+    def unused(self):
+        """Returns a slot that was taken for a call that was never sent."""
+        with self._cond:
+            self.in_flight -= 1
+            self._wake()
+
+    def stats(self):
+        with self._cond:
+            elapsed = (self.last_call - self.first_call) if self.calls and self.last_call else 0.0
+            return {
+                "limit": self.limit,
+                "peak_limit": self.peak_limit,
+                "in_flight": self.in_flight,
+                "calls": self.calls,
+                "calls_per_second": (self.calls / elapsed) if elapsed > 0 else 0.0,
+                "throttles": self.throttles,
+                "decreases": self.decreases,
+                "wait_seconds": self.wait_seconds,
+            }
+
+
+def _set_done(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class _Reservation:
+    """A limiter slot taken on the event loop for the next API call of an I/O thread."""
+
+    def __init__(self, limiter, sent_at):
+        self.limiter = limiter
+        self.sent_at = sent_at
+        self._lock = threading.Lock()
+        self._claimed = False
+
+    def claim(self):
+        with self._lock:
+            claimed, self._claimed = self._claimed, True
+        return not claimed
+
+    def cancel(self):
+        """Gives the slot back unless run_reserved() already took it over."""
+        if self.claim():
+            self.limiter.unused()
+
+
+_reserved = threading.local()
+
+
+async def reserve(limiter):
+    """Waits on the event loop for a slot of 'limiter'; pass the result to run_reserved()."""
+    return _Reservation(limiter, await limiter.acquire_async())
+
+
+def run_reserved(reservation, func, *args):
+    """Runs 'func' on this thread; its first call through the reservation's limiter uses the reserved slot."""
+    if not reservation.claim():
+        return func(*args)
+    _reserved.slot = reservation
+    try:
+        return func(*args)
+    finally:
+        if _reserved.slot is not None:
+            # No call was sent (e.g. the paginator had no pages left).
+            _reserved.slot = None
+            reservation.limiter.unused()
+
+
+class _Attempt:
+    __slots__ = ("limiter", "sent_at", "throttled")
+
+    def __init__(self, limiter, sent_at):
+        self.limiter = limiter
+        self.sent_at = sent_at
+        self.throttled = False
+
+
+class RateController:
+    """
+    Shares one AimdLimiter per (account_id, service, region) between every client, thread
+    and coroutine of the run. Calls pass through botocore events on the session: a slot
+    is taken before the call, throttled attempts (seen on every retry) lower the limit,
+    and the slot is returned when the call completes. This replaces botocore's adaptive
+    retry mode, whose token bucket belongs to a single client.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._limiters = {}
+        # Stats of limiters that ran in --processes workers.
+        self._finished = []
+
+    def limiter(self, account_id, service, region):
+        key = (account_id, service, region)
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                limiter = self._limiters[key] = AimdLimiter()
+            return limiter
+
+    def register(self, session, account_id):
+        """Routes the calls of every client created from 'session' afterwards through the shared limiters."""
+        events = session.events
+
+        def before_call(model, context, **kwargs):
+            limiter = self.limiter(account_id, model.service_model.service_name,
+                                   context.get("client_region") or "global")
+            reservation = getattr(_reserved, "slot", None)
+            if reservation is not None and reservation.limiter is limiter:
+                _reserved.slot = None
+                sent_at = reservation.sent_at
+            else:
+                sent_at = limiter.acquire()
+            context[CONTEXT_KEY] = _Attempt(limiter, sent_at)
+
+        events.register("before-call", before_call, unique_id=f"{CONTEXT_KEY}-acquire")
+        events.register("needs-retry", self._on_attempt, unique_id=f"{CONTEXT_KEY}-attempt")
+        events.register("after-call", self._on_response, unique_id=f"{CONTEXT_KEY}-release")
+        events.register("after-call-error", self._on_exception, unique_id=f"{CONTEXT_KEY}-error")
+
+    def _on_attempt(self, request_dict, response=None, **kwargs):
+        attempt = request_dict.get("context", {}).get(CONTEXT_KEY)
+        if attempt is not None and response is not None:
+            if response[1].get("Error", {}).get("Code") in THROTTLING_CODES:
+                attempt.limiter.throttled(attempt.sent_at)
+                attempt.throttled = True
+            attempt.sent_at = time.monotonic()
+        return None
+
+    def _on_response(self, http_response, parsed, context, **kwargs):
+        attempt = context.pop(CONTEXT_KEY, None)
+        if attempt is None:
+            return
+        if not attempt.throttled and parsed.get("Error", {}).get("Code") in THROTTLING_CODES:
+            attempt.limiter.throttled(attempt.sent_at)
+        attempt.limiter.release(success=http_response.status_code < 300)
+
+    def _on_exception(self, context, **kwargs):
+        attempt = context.pop(CONTEXT_KEY, None)
+        if attempt is not None:
+            attempt.limiter.release(success=False)
+
+    def take_stats(self, account_id):
+        """Removes the limiters of a finished account and returns their stats rows."""
+        with self._lock:
+            keys = [key for key in self._limiters if key[0] == account_id]
+            limiters = [(key, self._limiters.pop(key)) for key in keys]
+        return [key + (limiter.stats(),) for key, limiter in limiters]
+
+    def add_stats(self, rows):
+        with self._lock:
+            self._finished.extend(rows)
+
+    def live_stats(self):
+        """(account_id, service, region, limiter stats) for the limiters of this process, as they are now."""
+        with self._lock:
+            items = list(self._limiters.items())
+        return [key + (limiter.stats(),) for key, limiter in items]
+
+    def stats(self):
+        """(account_id, service, region, limiter stats) for every limiter, most throttled first."""
+        with self._lock:
+            items = list(self._limiters.items())
+            finished = list(self._finished)
+        rows = [key + (limiter.stats(),) for key, limiter in items] + finished
+        return sorted(rows, key=lambda row: (-row[3]["throttles"], -row[3]["calls"]))
+
+
+_RATE_CONTROLLER = RateController()
+
+
+def rate_limit_session(session, account_id):
+    _RATE_CONTROLLER.register(session, account_id)
+    return session
+
+
+def rate_limiter(account_id, service, region):
+    """The shared limiter of an (account, service, region), for AsyncEngine.paginate()."""
+    return _RATE_CONTROLLER.limiter(account_id, service, region)
+
+
+def rate_limit_stats():
+    return _RATE_CONTROLLER.stats()
+
+
+def live_rate_limit_stats():
+    return _RATE_CONTROLLER.live_stats()
+
+
+def take_rate_limit_stats(account_id):
+    return _RATE_CONTROLLER.take_stats(account_id)
+
+
+def add_rate_limit_stats(rows):
+    _RATE_CONTROLLER.add_stats(rows)
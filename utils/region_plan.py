@@ -0,0 +1,117 @@
+import csv
+import threading
+import time
+from utils.json_cache import JsonCache
+
+REGION_PLAN_TTL = 24 * 3600
+DEFAULT_RECHECK_DAYS = 7
+
+
+class RegionPlanner:
+    """
+    Organization-wide region planning shared by every account scan.
+    Enabled regions from DescribeRegions are cached per account for REGION_PLAN_TTL, and
+    the number of resources found per (account, region) is remembered between runs.
+    Regions that were empty in their last scan are pruned until 'recheck_days' have
+    passed; regions without history are probed first, and regions whose last scan had
+    errors are always scanned. Every decision is kept for the report.
+    """
+
+    def __init__(self, recheck_days=DEFAULT_RECHECK_DAYS):
+        self.recheck_seconds = recheck_days * 86400
+        self._plans = JsonCache("region_plans.json")
+        self._activity = JsonCache("region_activity.json")
+        self._lock = threading.Lock()
+        self._decisions = []
+
+    def cached_regions(self, account_id):
+        plan = self._plans.get(account_id)
+        if plan and time.time() - plan["checked_at"] < REGION_PLAN_TTL:
+            return plan["regions"]
+        return None
+
+    def store_regions(self, account_id, regions):
+        self._plans.set(account_id, {"regions": regions, "checked_at": time.time()})
+
+    def classify(self, account_id, regions):
+        """
+        Splits 'regions' into (scan, probe, pruned); 'pruned' maps each skipped
+        region to the reason it was skipped.
+        """
+        activity = self._activity.get(account_id, {})
+        now = time.time()
+        scan, probe, pruned = [], [], {}
+        for region in regions:
+            seen = activity.get(region)
+            if seen is None:
+                probe.append(region)
+            elif seen["resources"] > 0 or seen.get("failed"):
+                scan.append(region)
+            elif now - seen["checked_at"] < self.recheck_seconds:
+                age_days = (now - seen["checked_at"]) / 86400
+                pruned[region] = f"no resources found {age_days:.1f} days ago"
+            else:
+                probe.append(region)
+        return scan, probe, pruned
+
+    def busiest_first(self, account_id, regions):
+        """Orders regions by resources found last time, largest first; regions without history go last."""
+        activity = self._activity.get(account_id, {})
+        return sorted(regions, key=lambda region: -activity.get(region, {}).get("resources", -1))
+
+    def record(self, account_id, region, resources):
+        """Remembers a region whose units all succeeded."""
+        activity = dict(self._activity.get(account_id, {}))
+        activity[region] = {"resources": resources, "checked_at": time.time()}
+        self._activity.set(account_id, activity)
+
+    def record_failed(self, account_id, region):
+        """
+        Marks a region whose scan had errors: its resource count is unknown, so it is scanned
+        again by the next run instead of being pruned on an older empty result.
+        """
+        activity = dict(self._activity.get(account_id, {}))
+        seen = activity.get(region, {"resources": 0})
+        activity[region] = {"resources": seen["resources"], "checked_at": time.time(), "failed": True}
+        self._activity.set(account_id, activity)
+
+    def record_decisions(self, account_id, scanned, pruned):
+        with self._lock:
+            self._decisions.extend((account_id, region, "scanned", "") for region in scanned)
+            self._decisions.extend((account_id, region, "pruned", reason) for region, reason in pruned.items())
+
+    def take_stats(self, account_id):
+        """The plan, region activity and decisions of a finished account, for the parent of a --processes worker."""
+        with self._lock:
+            decisions = [d for d in self._decisions if d[0] == account_id]
+            self._decisions = [d for d in self._decisions if d[0] != account_id]
+        return {"plan": self._plans.get(account_id), "activity": self._activity.get(account_id),
+                "decisions": decisions}
+
+    def add_stats(self, account_id, stats):
+        if stats["plan"] is not None:
+            self._plans.set(account_id, stats["plan"])
+        if stats["activity"] is not None:
+            self._activity.set(account_id, stats["activity"])
+        with self._lock:
+            self._decisions.extend(stats["decisions"])
+
+    def pruned_count(self):
+        with self._lock:
+            return sum(1 for decision in self._decisions if decision[2] == "pruned")
+
+    def write_report(self, path):
+        """Writes one CSV row per (account, region): whether it was scanned or pruned, and why."""
+        with self._lock:
+            decisions = sorted(self._decisions)
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["account_id", "region", "action", "reason"])
+            writer.writerows(decisions)
+
+    def save(self):
+        for cache in (self._plans, self._activity):
+            try:
+                cache.save()
+            except OSError:
+                pass
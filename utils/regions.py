@@ -1,8 +1,12 @@
 import boto3
+from utils.config_helper import get_client
+
+# DescribeRegions is called here, so an account that answers it has this region enabled.
+DISCOVERY_REGION = 'us-east-1'
 
 
 def list_regions(session=None):
-    client = session.client('ec2', region_name='us-east-1') if session else boto3.client('ec2')
+    client = get_client(session, 'ec2', region_name=DISCOVERY_REGION) if session else boto3.client('ec2')
     default_regions = ['ap-northeast-1', 'ap-northeast-2', 'ap-northeast-3', 'ap-south-1', 'ap-southeast-1', 'ap-southeast-2', 'ca-central-1', 'eu-central-1', 'eu-north-1', 'eu-west-1', 'eu-west-2', 'eu-west-3', 'sa-east-1', 'us-east-1', 'us-east-2', 'us-west-1', 'us-west-2']
     try:
         response = client.describe_regions(
@@ -17,3 +21,19 @@ def list_regions(session=None):
         return default_regions, e
 
 
+def probe_region(session, region):
+    """
+    Cheap check for whether a region holds any scannable resources: one DescribeVolumes call
+    (every EC2 instance, including ASG members, has at least an EBS root volume) and one
+    Lambda GetAccountSettings call (which reports the region's function count).
+    Returns False only when both calls succeed and find nothing.
+    """
+    try:
+        volumes = get_client(session, 'ec2', region_name=region).describe_volumes(MaxResults=5)
+        if volumes.get('Volumes'):
+            return True
+        settings = get_client(session, 'lambda', region_name=region).get_account_settings()
+        return settings.get('AccountUsage', {}).get('FunctionCount', 0) > 0
+    except Exception:
+        # Unknown is treated as non-empty, so permission errors still surface in the full scan.
+        return True
@@ -0,0 +1,134 @@
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+from utils.json_cache import CACHE_DIR
+
+RESULT_CACHE_PATH = os.path.join(CACHE_DIR, "results.sqlite")
+DEFAULT_MAX_ENTRIES = 100000
+
+
+class ResultCache:
+    """
+    Persistent cache of (account, region, collector) unit results shared between runs.
+    Entries younger than 'max_age' seconds are served instead of calling AWS; the cache
+    keeps at most 'max_entries' units and evicts the least recently used ones on close().
+    'signature' describes the scan options, so results of differently configured runs never mix.
+    Every unit served or stored is recorded with its age for the end-of-run report.
+    """
+
+    def __init__(self, signature, max_age, max_entries=DEFAULT_MAX_ENTRIES, path=RESULT_CACHE_PATH):
+        self.path = path
+        self.max_age = max_age
+        self.max_entries = max(1, max_entries)
+        self.signature = json.dumps(signature, sort_keys=True)
+        self.hits = 0
+        self.stale = 0
+        self._ages = {}
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS units ("
+            "signature TEXT, account_id TEXT, region TEXT, collector TEXT, results TEXT, error TEXT, "
+            "scanned_at REAL, last_used REAL, PRIMARY KEY (signature, account_id, region, collector))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS units_last_used ON units (last_used)")
+        self._conn.commit()
+
+    def get(self, account_id, region, collector):
+        """Returns the cached (results, error) of a unit if it is fresh enough, or None."""
+        now = time.time()
+        key = (self.signature, account_id, region, collector)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, error, scanned_at FROM units "
+                "WHERE signature = ? AND account_id = ? AND region = ? AND collector = ?",
+                key
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[2] > self.max_age:
+                self.stale += 1
+                return None
+            self._conn.execute(
+                "UPDATE units SET last_used = ? "
+                "WHERE signature = ? AND account_id = ? AND region = ? AND collector = ?",
+                (now,) + key
+            )
+            self._conn.commit()
+            self.hits += 1
+            self._ages[key[1:]] = ("cache", now - row[2])
+        return json.loads(row[0]), json.loads(row[1])
+
+    def peek(self, account_id, region, collector):
+        """Like get(), without counting the unit as served or marking it as used."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT results, error, scanned_at FROM units "
+                "WHERE signature = ? AND account_id = ? AND region = ? AND collector = ?",
+                (self.signature, account_id, region, collector)
+            ).fetchone()
+        if row is None or time.time() - row[2] > self.max_age:
+            return None
+        return json.loads(row[0]), json.loads(row[1])
+
+    def put(self, account_id, region, collector, results, error):
+        now = time.time()
+        payload = (json.dumps(results, default=str), json.dumps(error, default=str))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO units VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.signature, account_id, region, collector, payload[0], payload[1], now, now)
+            )
+            self._conn.commit()
+            self._ages[(account_id, region, collector)] = ("fresh", 0.0)
+
+    def take_stats(self):
+        with self._lock:
+            stats = {"hits": self.hits, "stale": self.stale, "ages": self._ages}
+            self.hits, self.stale, self._ages = 0, 0, {}
+        return stats
+
+    def add_stats(self, stats):
+        with self._lock:
+            self.hits += stats["hits"]
+            self.stale += stats["stale"]
+            self._ages.update(stats["ages"])
+
+    def oldest_age(self):
+        with self._lock:
+            return max((age for _, age in self._ages.values()), default=0.0)
+
+    def write_report(self, path):
+        """Writes one CSV row per unit used in this run: where it came from and how old it is."""
+        with self._lock:
+            entries = sorted(self._ages.items())
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["account_id", "region", "collector", "source", "age_hours"])
+            for (account_id, region, collector), (source, age) in entries:
+                writer.writerow([account_id, region, collector, source, round(age / 3600, 2)])
+
+    def evict(self):
+        """Drops the least recently used units beyond 'max_entries'."""
+        with self._lock:
+            count = self._conn.execute("SELECT COUNT(*) FROM units").fetchone()[0]
+            excess = count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM units WHERE rowid IN (SELECT rowid FROM units ORDER BY last_used ASC LIMIT ?)",
+                    (excess,)
+                )
+                self._conn.commit()
+            return max(0, excess)
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,237 @@
+import csv
+import json
+import math
+import random
+import re
+from utils.summary import SUMMARY_SPEC
+
+
+def _name_tokens(*tokens):
+    """Matches a whole token of an account name, optionally numbered: 'prod' in 'acme-prod2', not in 'product'."""
+    return re.compile(r"(?:^|[-_.\s])(?:" + "|".join(tokens) + r")\d*(?:[-_.\s]|$)", re.IGNORECASE)
+
+
+# Accounts are stratified by the environment their name suggests; resource volumes differ
+# far more between environments than within one. Checked in order, first match wins.
+STRATUM_PATTERNS = [
+    ("staging", _name_tokens("staging", "stage", "stg", "pre-?prod", "uat", "qa")),
+    ("production", _name_tokens("production", "prod", "prd", "live")),
+    ("development", _name_tokens("development", "dev", "test", "testing", "sandbox", "sbx", "playground", "play",
+                                 "labs?", "poc", "demo")),
+    ("shared", _name_tokens("shared", "logs?", "logging", "audit", "security", "network(?:ing)?",
+                            "infra(?:structure)?", "backups?", "management", "master", "billing")),
+]
+OTHER_STRATUM = "other"
+# Accounts scanned in every stratum before allocation follows the observed variance.
+PILOT_SIZE = 2
+Z_95 = 1.96
+SEED = 1
+
+
+def account_stratum(account):
+    for stratum, pattern in STRATUM_PATTERNS:
+        if pattern.search(account.get("name") or ""):
+            return stratum
+    return OTHER_STRATUM
+
+
+def parse_sample_size(value, population):
+    """'--sample' as a number of accounts ('200') or a share of them ('5%')."""
+    value = value.strip()
+    if value.endswith("%"):
+        size = math.ceil(population * float(value[:-1]) / 100)
+    else:
+        size = int(value)
+    if size <= 0:
+        raise ValueError(f"Invalid sample size '{value}'")
+    return min(size, population)
+
+
+def account_metrics(rows):
+    """(resource, metric) -> value for one account: resource counts plus the summed numeric columns."""
+    metrics = {}
+    for row in rows:
+        resource = row.get("resource")
+        key = (resource, "count")
+        metrics[key] = metrics.get(key, 0) + row.get("count", 1)
+        for column in SUMMARY_SPEC.get(resource, ((), ()))[1]:
+            value = row.get(column, row.get(f"{column}_total"))
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                metrics[(resource, column)] = metrics.get((resource, column), 0) + value
+    return metrics
+
+
+def _variance(values):
+    if len(values) < 2:
+        return None
+    mean = sum(values) / len(values)
+    return sum((v - mean) ** 2 for v in values) / (len(values) - 1)
+
+
+class _Stratum:
+    def __init__(self, name, accounts):
+        self.name = name
+        self.accounts = accounts
+        self.selected = 0
+        # account_id -> metrics of observed (fully scanned) accounts
+        self.observed = {}
+        # Selected accounts whose scans the time budget stopped (non-response).
+        self.stopped = 0
+
+    @property
+    def size(self):
+        return len(self.accounts)
+
+
+class StratifiedSampler:
+    """
+    Chooses which accounts to scan when only a sample fits in the time budget, and
+    extrapolates the organization's totals from them.
+    Every stratum first gets PILOT_SIZE accounts, largest strata first. After that, each
+    pick goes to the stratum where one more account reduces the variance of the estimated
+    total the most (N_h^2 s_h^2 / (n_h (n_h + 1)), with s_h measured on resource counts),
+    so high-variance strata are sampled first and most. Accounts are random within a stratum.
+    Totals use the stratified estimator sum(N_h * mean_h) with a 95% normal confidence interval.
+    """
+
+    def __init__(self, accounts, size=None, seed=SEED):
+        self.population = len(accounts)
+        self.size = size or self.population
+        rng = random.Random(seed)
+        groups = {}
+        for account in accounts:
+            groups.setdefault(account_stratum(account), []).append(account)
+        self.strata = {}
+        for name, members in sorted(groups.items(), key=lambda item: -len(item[1])):
+            members = list(members)
+            rng.shuffle(members)
+            self.strata[name] = _Stratum(name, members)
+        self._stratum_of = {acc["id"]: s for s in self.strata.values() for acc in s.accounts}
+        self.selected = 0
+        self.failed = 0
+        self.stopped = 0
+
+    def _priority(self, stratum):
+        counts = [m.get("_resources", 0) for m in stratum.observed.values()]
+        variance = _variance(counts)
+        if variance is None:
+            variance = self._pooled_variance()
+        return stratum.size ** 2 * variance / (stratum.selected * (stratum.selected + 1))
+
+    def _pooled_variance(self):
+        counts = [m.get("_resources", 0) for s in self.strata.values() for m in s.observed.values()]
+        return _variance(counts) or 1.0
+
+    def next_account(self):
+        """The next account to scan, or None once the sample size is reached or every account is taken."""
+        if self.selected >= self.size:
+            return None
+        candidates = [s for s in self.strata.values() if s.selected < s.size]
+        if not candidates:
+            return None
+        pilot = [s for s in candidates if s.selected < PILOT_SIZE]
+        stratum = pilot[0] if pilot else max(candidates, key=self._priority)
+        account = stratum.accounts[stratum.selected]
+        stratum.selected += 1
+        self.selected += 1
+        return account
+
+    def accounts(self):
+        while True:
+            account = self.next_account()
+            if account is None:
+                return
+            yield account
+
+    def record(self, account_id, rows):
+        """Records a fully scanned account's rows (None for an account that couldn't be scanned)."""
+        if rows is None:
+            self.failed += 1
+            return
+        metrics = account_metrics(rows)
+        metrics["_resources"] = sum(v for (resource, metric), v in metrics.items() if metric == "count")
+        self._stratum_of[account_id].observed[account_id] = metrics
+
+    def stop(self, account_id):
+        """Records a selected account whose scan was stopped before it finished."""
+        self.stopped += 1
+        self._stratum_of[account_id].stopped += 1
+
+    def observed_accounts(self):
+        return sum(len(s.observed) for s in self.strata.values())
+
+    def estimate(self):
+        """Rows of resource, metric, observed value, estimated total and its 95% confidence interval."""
+        keys = sorted({k for s in self.strata.values() for m in s.observed.values() for k in m if k != "_resources"},
+                      key=lambda k: (str(k[0]), k[1] != "count", k[1]))
+        observed_all = [m for s in self.strata.values() for m in s.observed.values()]
+        if not observed_all:
+            return []
+        rows = []
+        for key in keys:
+            all_values = [m.get(key, 0) for m in observed_all]
+            overall_mean = sum(all_values) / len(all_values)
+            overall_variance = _variance(all_values) or 0.0
+            total, variance = 0.0, 0.0
+            for stratum in self.strata.values():
+                values = [m.get(key, 0) for m in stratum.observed.values()]
+                n, size = len(values), stratum.size
+                if n == 0:
+                    # Unobserved stratum: extrapolated from the other strata, with their spread.
+                    total += size * overall_mean
+                    variance += size ** 2 * overall_variance * (1 + 1 / len(all_values))
+                    continue
+                stratum_variance = _variance(values)
+                if stratum_variance is None:
+                    stratum_variance = overall_variance
+                total += size * sum(values) / n
+                variance += size ** 2 * (1 - n / size) * stratum_variance / n
+            observed = sum(all_values)
+            margin = Z_95 * math.sqrt(variance)
+            rows.append({
+                "resource": key[0],
+                "metric": key[1],
+                "observed": round(observed, 2),
+                "estimate": round(total, 2),
+                "ci95_low": round(max(observed, total - margin), 2),
+                "ci95_high": round(total + margin, 2),
+            })
+        return rows
+
+    def strata_report(self):
+        report = []
+        for stratum in self.strata.values():
+            counts = [m.get("_resources", 0) for m in stratum.observed.values()]
+            report.append({
+                "stratum": stratum.name,
+                "accounts": stratum.size,
+                "selected": stratum.selected,
+                "observed": len(counts),
+                "stopped": stratum.stopped,
+                "mean_resources": round(sum(counts) / len(counts), 2) if counts else None,
+                "sd_resources": round(math.sqrt(_variance(counts)), 2) if len(counts) > 1 else None,
+            })
+        return report
+
+    def coverage(self):
+        return {
+            "accounts": self.population,
+            "selected": self.selected,
+            "observed": self.observed_accounts(),
+            "failed": self.failed,
+            "stopped": self.stopped,
+            "observed_share": round(self.observed_accounts() / self.population, 4) if self.population else 0.0,
+            "strata": len(self.strata),
+            "unobserved_strata": sorted(s.name for s in self.strata.values() if not s.observed),
+        }
+
+    def write_reports(self, csv_path, json_path, extra=None):
+        estimate = self.estimate()
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["resource", "metric", "observed", "estimate", "ci95_low", "ci95_high"])
+            writer.writeheader()
+            writer.writerows(estimate)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"coverage": dict(self.coverage(), **(extra or {})), "strata": self.strata_report(),
+                       "estimate": estimate}, f, indent=2, default=str)
+        return estimate
@@ -0,0 +1,144 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+def _cancel(future):
+    # cancel() alone leaves a Future that concurrent.futures.wait() never counts as done.
+    if future.cancel():
+        future.set_running_or_notify_cancel()
+
+
+class ScanScheduler:
+    """
+    Runs (account, region, collector) work units from many accounts on one shared pool.
+    'max_workers' caps the number of units in flight across the whole run, and
+    'per_account' caps how many of them may belong to a single account at once.
+    """
+
+    is_async = False
+
+    def __init__(self, max_workers=32, per_account=5):
+        self.max_workers = max(1, max_workers)
+        self.per_account = max(1, min(per_account, self.max_workers))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scan")
+        self._lock = threading.Lock()
+        self._running = {}
+        self._pending = {}
+        self._cancelled = False
+
+    def submit(self, account_id, func, *args, **kwargs):
+        """Queues a unit for 'account_id' and returns a Future for its result."""
+        future = Future()
+        unit = (future, func, args, kwargs)
+
+        with self._lock:
+            if self._cancelled:
+                # Units of accounts still winding down after a cancelling shutdown never start.
+                _cancel(future)
+                return future
+            running = self._running.get(account_id, 0)
+            if running < self.per_account:
+                self._running[account_id] = running + 1
+            else:
+                self._pending.setdefault(account_id, deque()).append(unit)
+                return future
+
+        self._dispatch(account_id, unit)
+        return future
+
+    def map(self, account_id, func, items):
+        """
+        Runs func(item) for every item from inside a running unit of 'account_id' and returns the
+        results in order. The calling thread works through the items together with up to
+        per_account - 1 helper units of the account, so the calls stay within the run's and the
+        account's limits; it never waits for a helper that hasn't started, so a unit can't block
+        on slots its own account holds.
+        """
+        items = list(items)
+        results = [None] * len(items)
+        done = [threading.Event() for _ in items]
+        claim = threading.Lock()
+        next_item = [0]
+
+        def work():
+            while True:
+                with claim:
+                    i = next_item[0]
+                    next_item[0] += 1
+                if i >= len(items):
+                    return
+                try:
+                    results[i] = (True, func(items[i]))
+                except BaseException as e:
+                    results[i] = (False, e)
+                finally:
+                    done[i].set()
+
+        helpers = [self.submit(account_id, work) for _ in range(min(self.per_account, len(items)) - 1)]
+        work()
+        for future in helpers:
+            # Helpers still queued have nothing left to do.
+            future.cancel()
+        for event in done:
+            event.wait()
+        for ok, value in results:
+            if not ok:
+                raise value
+        return [value for _, value in results]
+
+    def _dispatch(self, account_id, unit):
+        try:
+            self._executor.submit(self._run, account_id, unit)
+        except RuntimeError:
+            # The pool was shut down while this unit was still queued.
+            _cancel(unit[0])
+
+    def _run(self, account_id, unit):
+        future, func, args, kwargs = unit
+        try:
+            if self._cancelled:
+                future.cancel()
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+        finally:
+            self._release(account_id)
+
+    def _release(self, account_id):
+        # Hand the freed account slot straight to that account's next queued unit.
+        with self._lock:
+            queue = self._pending.get(account_id)
+            if queue:
+                next_unit = queue.popleft()
+                if not queue:
+                    del self._pending[account_id]
+            else:
+                next_unit = None
+                self._running[account_id] -= 1
+                if not self._running[account_id]:
+                    del self._running[account_id]
+
+        if next_unit:
+            self._dispatch(account_id, next_unit)
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        if cancel_pending:
+            with self._lock:
+                self._cancelled = True
+                queued = [unit for queue in self._pending.values() for unit in queue]
+                self._pending.clear()
+            for future, _, _, _ in queued:
+                _cancel(future)
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=exc_type is None, cancel_pending=exc_type is not None)
+        return False
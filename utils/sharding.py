@@ -0,0 +1,105 @@
+import hashlib
+import json
+import os
+from utils.json_cache import JsonCache
+
+SHARD_META_FILENAME = "shard.json"
+# Per-account scan cost from previous runs (seconds). Shards are balanced on a copy of this file
+# passed to every runner with --shard-costs, never on the host-local one.
+account_costs = JsonCache("account_costs.json")
+
+
+def parse_shard(spec):
+    """Parses 'i/N' (1-based) into (i, N)."""
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}': expected i/N, e.g. 1/4")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{spec}': i must be between 1 and N")
+    return index, count
+
+
+def shard_dir(index, count, output_dir="output"):
+    return os.path.join(output_dir, f"shard-{index}-of-{count}")
+
+
+def _stable_hash(account_id):
+    return int(hashlib.sha1(str(account_id).encode("utf-8")).hexdigest(), 16)
+
+
+def assign_shards(accounts, count, costs=None):
+    """
+    Deterministically maps every account id to a shard number (1..count).
+    Without 'costs' accounts are spread by a stable hash of their id. With 'costs'
+    (account_id -> seconds from previous runs) the most expensive accounts are placed
+    first on the least loaded shard; accounts without history get the average cost.
+    Every runner computes the same assignment from the same account list and costs.
+    """
+    if not costs:
+        return {acc["id"]: _stable_hash(acc["id"]) % count + 1 for acc in accounts}
+
+    known = [costs[acc["id"]] for acc in accounts if acc["id"] in costs]
+    default_cost = sum(known) / len(known) if known else 1.0
+    ordered = sorted(accounts, key=lambda acc: (-costs.get(acc["id"], default_cost), acc["id"]))
+
+    loads = [0.0] * count
+    assignment = {}
+    for acc in ordered:
+        shard = min(range(count), key=lambda s: (loads[s], s))
+        loads[shard] += costs.get(acc["id"], default_cost)
+        assignment[acc["id"]] = shard + 1
+    return assignment
+
+
+def load_shard_costs(path):
+    """
+    Reads a shared account costs file (an account_costs.json written by a previous run or 'merge').
+    Returns the account_id -> seconds map and a fingerprint of the file, which 'merge' compares
+    across shards to catch runners that balanced on different files.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    costs = json.loads(data).get("seconds", {})
+    return costs, hashlib.sha256(data).hexdigest()[:16]
+
+
+def select_shard(accounts, index, count, costs=None):
+    """Returns the accounts of shard 'index', keeping their original order."""
+    assignment = assign_shards(accounts, count, costs)
+    return [acc for acc in accounts if assignment[acc["id"]] == index]
+
+
+def longest_first(accounts):
+    """
+    Positions of 'accounts' ordered by the scan times recorded by previous runs, slowest first,
+    so a slow account doesn't start last and set the wall time. Accounts without history count
+    as average; ties keep their order.
+    """
+    costs = account_costs.get("seconds", {})
+    if not costs:
+        return list(range(len(accounts)))
+    known = [costs[acc["id"]] for acc in accounts if acc["id"] in costs]
+    default_cost = sum(known) / len(known) if known else 0.0
+    return sorted(range(len(accounts)), key=lambda i: -costs.get(accounts[i]["id"], default_cost))
+
+
+def record_account_costs(seconds_by_account):
+    """Stores the scan time of each account for future shard balancing."""
+    costs = dict(account_costs.get("seconds", {}))
+    costs.update(seconds_by_account)
+    account_costs.set("seconds", costs)
+    try:
+        account_costs.save()
+    except OSError:
+        pass
+
+
+def write_shard_meta(directory, meta):
+    with open(os.path.join(directory, SHARD_META_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2, sort_keys=True)
+
+
+def read_shard_meta(directory):
+    with open(os.path.join(directory, SHARD_META_FILENAME), "r", encoding="utf-8") as f:
+        return json.load(f)
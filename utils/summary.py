@@ -0,0 +1,88 @@
+SUMMARY_LEVELS = ["region", "account", "organization"]
+
+# resource -> (extra group-by columns, columns that are summed)
+SUMMARY_SPEC = {
+    "ec2": (["instance_type"], []),
+    "ebs": (["ebs_type", "ebs_state"], ["ebs_size_gb"]),
+    "lambda": (["function_memory_mb"], []),
+    "asg_ec2_equivalent": ([], ["asg_instance_count"]),
+    "s3_bucket": ([], ["bucket_size_gb", "bucket_doc_num", "bucket_size_gb_by_class"]),
+}
+
+
+def _is_metric_column(column):
+    return column == "count" or column.endswith("_total")
+
+
+def count_resources(rows):
+    """Number of resources behind a list of rows, whether per-resource or aggregated."""
+    return sum(row.get("count", 1) for row in rows)
+
+
+class ResourceSummary:
+    """
+    Grouped counts and sums of collected resources.
+    Collectors feed per-resource rows through add_resource() while paging; the
+    resulting rows carry a 'count' column plus '<field>_total' sums and can be merged
+    into another summary with add_rows(), so aggregates combine across regions and accounts.
+    'level' controls which location columns are kept: region, account or organization.
+    """
+
+    def __init__(self, level="region"):
+        self.level = level
+        self._dropped = {"region": (), "account": ("region",), "organization": ("account_id", "region")}[level]
+        self._groups = {}
+
+    def _entry(self, key_items):
+        key = tuple(item for item in key_items if item[0] not in self._dropped)
+        entry = self._groups.get(key)
+        if entry is None:
+            entry = self._groups[key] = {"count": 0}
+        return entry
+
+    @staticmethod
+    def _accumulate(entry, column, value):
+        if isinstance(value, dict):
+            totals = entry.setdefault(column, {})
+            for k, v in value.items():
+                totals[k] = totals.get(k, 0) + (v or 0)
+        else:
+            entry[column] = entry.get(column, 0) + (value or 0)
+
+    def add_resource(self, row):
+        group_by, summed = SUMMARY_SPEC[row["resource"]]
+        key_items = [("account_id", row["account_id"]), ("resource", row["resource"]), ("region", row["region"])]
+        key_items.extend((column, row.get(column)) for column in group_by)
+
+        entry = self._entry(key_items)
+        entry["count"] += 1
+        for column in summed:
+            self._accumulate(entry, f"{column}_total", row.get(column))
+
+    def add_rows(self, rows):
+        for row in rows:
+            key_items = [(k, v) for k, v in row.items() if not _is_metric_column(k)]
+            entry = self._entry(key_items)
+            for column, value in row.items():
+                if _is_metric_column(column):
+                    self._accumulate(entry, column, value)
+
+    def rows(self, rounded=False):
+        """
+        The summary rows. Sums keep full precision so rows of collectors, accounts and workers
+        merge exactly; 'rounded' rounds them to 2 decimals for the final report.
+        """
+        results = []
+        for key, entry in self._groups.items():
+            row = dict(key)
+            for column, value in entry.items():
+                if isinstance(value, float) and rounded:
+                    value = round(value, 2)
+                elif isinstance(value, dict):
+                    value = {k: round(v, 2) if rounded else v for k, v in sorted(value.items())}
+                row[column] = value
+            results.append(row)
+        return results
+
+    def __len__(self):
+        return len(self._groups)
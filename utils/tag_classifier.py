@@ -0,0 +1,106 @@
+import json
+import re
+
+KUBERNETES = "kubernetes"
+AUTOSCALING = "autoscaling"
+
+# category -> rules. 'keys' are exact tag keys, 'key_prefixes' match the start of a key and
+# 'tokens' match whole words (separated by anything but letters and digits) in keys or values,
+# so "eks-node" matches "eks" but "weeks" does not. All comparisons are case-insensitive.
+DEFAULT_RULES = {
+    KUBERNETES: {
+        "keys": ["KubernetesCluster"],
+        "key_prefixes": ["kubernetes.io/", "k8s.io/", "eks:", "aws:eks:", "alpha.eksctl.io/",
+                         "eksctl.amazonaws.com/", "karpenter.sh/", "karpenter.k8s.aws/"],
+        "tokens": ["eks", "k8s", "kubernetes", "cluster-autoscaler"]
+    },
+    AUTOSCALING: {
+        "keys": ["aws:autoscaling:groupName"],
+        "key_prefixes": [],
+        "tokens": []
+    }
+}
+
+
+def _token_pattern(tokens):
+    tokens = sorted({t.lower() for t in tokens}, key=len, reverse=True)
+    if not tokens:
+        return None
+    return r"(?<![a-z0-9])(?:" + "|".join(re.escape(t) for t in tokens) + r")(?![a-z0-9])"
+
+
+class TagClassifier:
+    """
+    Decides whether a resource's tags fall into an exclusion category (Kubernetes, Auto Scaling, ...).
+    The rules of each requested category set are compiled once: exact keys into a set, key
+    prefixes into one startswith() tuple and word tokens into a single regex that only runs
+    when a plain substring check has already found one of the tokens.
+    """
+
+    def __init__(self, rules=None):
+        self.rules = {category: {field: list(values) for field, values in spec.items()}
+                      for category, spec in (rules or DEFAULT_RULES).items()}
+        self._matchers = {}
+
+    def extend(self, rules):
+        """Adds rules (same layout as DEFAULT_RULES) to the existing ones."""
+        for category, spec in rules.items():
+            target = self.rules.setdefault(category, {"keys": [], "key_prefixes": [], "tokens": []})
+            for field, values in spec.items():
+                target.setdefault(field, []).extend(values)
+        self._matchers = {}
+
+    def load(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            self.extend(json.load(f))
+
+    def _matcher(self, categories):
+        matcher = self._matchers.get(categories)
+        if matcher is None:
+            specs = [self.rules[c] for c in categories if c in self.rules]
+            tokens = tuple(sorted({t.lower() for spec in specs for t in spec.get("tokens", [])}))
+            pattern = _token_pattern(tokens)
+            matcher = self._matchers[categories] = (
+                frozenset(k.lower() for spec in specs for k in spec.get("keys", [])),
+                tuple(p.lower() for spec in specs for p in spec.get("key_prefixes", [])),
+                tokens,
+                re.compile(pattern) if pattern else None
+            )
+        return matcher
+
+    def is_excluded(self, tags, categories):
+        """
+        True if any tag matches a rule of 'categories' (a tuple of category names).
+        'tags' is the AWS list form: [{'Key': ..., 'Value': ...}].
+        """
+        if not tags:
+            return False
+        matcher = self._matchers.get(categories) or self._matcher(categories)
+        keys, key_prefixes, tokens, token_re = matcher
+        for tag in tags:
+            key = tag['Key'].lower()
+            if key in keys or key.startswith(key_prefixes):
+                return True
+        if not tokens:
+            return False
+
+        text = "\n".join([tag['Key'] + "\n" + str(tag.get('Value', '')) for tag in tags]).lower()
+        for token in tokens:
+            if token in text:
+                return token_re.search(text) is not None
+        return False
+
+
+_CLASSIFIER = TagClassifier()
+
+
+def is_excluded(tags, categories):
+    return _CLASSIFIER.is_excluded(tags, categories)
+
+
+def load_tag_rules(path):
+    _CLASSIFIER.load(path)
+
+
+def tag_rules():
+    return _CLASSIFIER.rules
@@ -0,0 +1,69 @@
+import threading
+from utils.json_cache import JsonCache
+
+
+class UnitCostHistory:
+    """
+    Seconds spent on each (account, region, collector) unit in previous runs, used to
+    start the longest units first (longest processing time first lowers the makespan).
+    Units without history are estimated from the collector's average over all accounts;
+    collectors without any history keep their registry order.
+    """
+
+    def __init__(self, filename="unit_costs.json"):
+        self._cache = JsonCache(filename)
+        self._lock = threading.Lock()
+        self._averages = None
+        self._recorded = {}
+
+    def _collector_averages(self):
+        with self._lock:
+            if self._averages is None:
+                totals = {}
+                for account_id, units in self._cache.get("accounts", {}).items():
+                    for unit_key, seconds in units.items():
+                        collector = unit_key.split("/", 1)[1]
+                        total = totals.setdefault(collector, [0.0, 0])
+                        total[0] += seconds
+                        total[1] += 1
+                self._averages = {collector: s / n for collector, (s, n) in totals.items()}
+            return self._averages
+
+    def estimate(self, account_id, region, collector_name):
+        seconds = self._cache.get("accounts", {}).get(account_id, {}).get(f"{region}/{collector_name}")
+        if seconds is None:
+            seconds = self._collector_averages().get(collector_name, 0.0)
+        return seconds
+
+    def longest_first(self, account_id, units):
+        """Sorts (region, collector) pairs by estimated cost, longest first; ties keep their order."""
+        return sorted(units, key=lambda unit: -self.estimate(account_id, unit[0], unit[1].name))
+
+    def record(self, account_id, region, collector_name, seconds):
+        with self._lock:
+            self._recorded.setdefault(account_id, {})[f"{region}/{collector_name}"] = round(seconds, 3)
+
+    def take_stats(self):
+        """Returns and clears the unit times recorded so far (sent from --processes workers to the parent)."""
+        with self._lock:
+            recorded, self._recorded = self._recorded, {}
+        return recorded
+
+    def add_stats(self, recorded):
+        with self._lock:
+            for account_id, units in recorded.items():
+                self._recorded.setdefault(account_id, {}).update(units)
+
+    def save(self):
+        with self._lock:
+            recorded, self._recorded = self._recorded, {}
+        if not recorded:
+            return
+        accounts = dict(self._cache.get("accounts", {}))
+        for account_id, units in recorded.items():
+            accounts[account_id] = dict(accounts.get(account_id, {}), **units)
+        self._cache.set("accounts", accounts)
+        try:
+            self._cache.save()
+        except OSError:
+            pass
@@ -0,0 +1,264 @@
+"""
+Multi-process account scans (--processes). botocore response parsing, tag filtering and row
+construction are CPU-bound and share one GIL per process, so accounts are spread over worker
+processes, each with its own scheduler, sessions and clients. Every worker scans several
+accounts at once and sends each account back as one compressed batch as soon as it finishes.
+"""
+import multiprocessing
+import os
+import pickle
+import signal
+import threading
+import zlib
+from collections import deque
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from multiprocessing.connection import wait as wait_connections
+
+# Rows compress several times over at the fastest level; higher levels cost more CPU than they save.
+COMPRESSION_LEVEL = 1
+POLL_SECONDS = 1.0
+
+
+def encode_batch(value):
+    return zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), COMPRESSION_LEVEL)
+
+
+def decode_batch(data):
+    return pickle.loads(zlib.decompress(data))
+
+
+class WorkerError(RuntimeError):
+    """An account scan that raised in its worker process, or whose worker process exited."""
+
+
+class _Worker:
+    """The account slots of one worker process."""
+
+    def __init__(self, results, scan, cancel, accounts):
+        self.results = results
+        self.scan = scan
+        self.cancel = cancel
+        self.pool = ThreadPoolExecutor(max_workers=accounts, thread_name_prefix="account")
+        self._send_lock = threading.Lock()
+
+    def run(self, tasks):
+        """Scans the accounts sent on 'tasks' until the parent closes it, then waits for them to finish."""
+        parent = multiprocessing.parent_process()
+        try:
+            while True:
+                ready = wait_connections([tasks, parent.sentinel], timeout=POLL_SECONDS)
+                if tasks not in ready:
+                    # Forked siblings hold copies of the parent's pipe ends, so a parent that died
+                    # without closing the pool is noticed by this process being re-parented.
+                    if ready or os.getppid() != parent.pid:
+                        self.cancel()
+                        return
+                    continue
+                try:
+                    message = tasks.recv()
+                except EOFError:
+                    return
+                if message is None:
+                    return
+                if message[0] == "stop":
+                    self.cancel()
+                else:
+                    _, key, args = message
+                    self.pool.submit(self._run, key, args)
+        finally:
+            # Accounts in progress finish before the process exits: once the interpreter starts
+            # shutting down, thread pools refuse new work and the scans would record that as unit errors.
+            self.pool.shutdown()
+
+    def _run(self, key, args):
+        try:
+            batch = encode_batch((self.scan(*args), None))
+        except Exception as e:
+            batch = encode_batch((None, f"{type(e).__name__}: {str(e)}"))
+        with self._send_lock:
+            self.results.send((key, batch))
+
+
+def _worker_main(tasks, results, setup, config, accounts):
+    # Ctrl-C is handled by the parent, which stops the workers through their task pipes.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    scan, cancel = setup(config)
+    _Worker(results, scan, cancel, accounts).run(tasks)
+
+
+class _Process:
+    """A worker process, its pipes and the keys of the accounts it is scanning."""
+
+    def __init__(self, process, tasks, results):
+        self.process = process
+        self.tasks = tasks
+        self.results = results
+        self.keys = set()
+        self.closed = False
+        # Set once the results pipe reports end of file; the process is about to exit.
+        self.drained = False
+
+
+class ProcessAccountPool:
+    """
+    Runs account scans in 'processes' worker processes, up to 'accounts_per_process' at a time in each.
+    'setup(config)' runs once in every worker and returns (scan, cancel): 'scan(*args)' scans one
+    account there, 'cancel()' stops its scans in progress. submit(*args) returns a Future of the
+    result, which arrives through the worker's pipe as a compressed pickle as soon as the account is done.
+    Every worker has its own pipes, so a worker that dies (e.g. out of memory) only fails its own
+    accounts with a WorkerError; the remaining workers take over the accounts not started yet.
+    """
+
+    def __init__(self, processes, accounts_per_process, setup, config):
+        context = multiprocessing.get_context()
+        self.processes = processes
+        self.accounts_per_process = max(1, accounts_per_process)
+        self._lock = threading.Lock()
+        self._futures = {}
+        # (key, args) of accounts not handed to a worker yet
+        self._pending = deque()
+        self._next_key = 0
+        self._closed = False
+        self.batches = 0
+        self.bytes_received = 0
+        self.lost_workers = 0
+        # Every worker is started before the pool's own thread: forking a multi-threaded process
+        # can leave the child with locks that no thread will ever release.
+        self._workers = [self._start(context, setup, config) for _ in range(processes)]
+        self._reader = threading.Thread(target=self._read, name="results", daemon=True)
+        self._reader.start()
+
+    def _start(self, context, setup, config):
+        task_reader, task_writer = context.Pipe(duplex=False)
+        result_reader, result_writer = context.Pipe(duplex=False)
+        process = context.Process(target=_worker_main, name="scan-worker",
+                                  args=(task_reader, result_writer, setup, config, self.accounts_per_process))
+        process.start()
+        # Only the worker keeps these ends, so its death shows up as end of file on our side.
+        task_reader.close()
+        result_writer.close()
+        return _Process(process, task_writer, result_reader)
+
+    def submit(self, *args):
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("cannot schedule new accounts after shutdown")
+            key = self._next_key
+            self._next_key += 1
+            self._futures[key] = future
+            self._pending.append((key, args))
+            self._dispatch()
+        return future
+
+    def _dispatch(self):
+        """Hands pending accounts to the least busy workers; called with the lock held."""
+        while self._pending:
+            workers = [w for w in self._workers if not w.closed and len(w.keys) < self.accounts_per_process]
+            if not workers:
+                break
+            worker = min(workers, key=lambda w: len(w.keys))
+            key, args = self._pending.popleft()
+            worker.keys.add(key)
+            self._send(worker, ("scan", key, args))
+        if not self._workers:
+            # Every worker died: the accounts left can't be scanned.
+            for key, _ in self._pending:
+                self._fail(key, WorkerError("No worker processes left"))
+            self._pending.clear()
+        elif self._closed and not self._pending:
+            for worker in self._workers:
+                if not worker.closed:
+                    worker.closed = True
+                    self._send(worker, None)
+
+    def _send(self, worker, message):
+        try:
+            worker.tasks.send(message)
+        except OSError:
+            # The worker is gone; its accounts fail once the reader sees it exit.
+            pass
+
+    def _fail(self, key, error):
+        future = self._futures.pop(key, None)
+        if future is None:
+            return
+        if isinstance(error, CancelledError):
+            future.cancel()
+            future.set_running_or_notify_cancel()
+        else:
+            future.set_exception(error)
+
+    def _read(self):
+        while True:
+            with self._lock:
+                workers = list(self._workers)
+            if not workers:
+                return
+            handles = [w.results for w in workers if not w.drained] + [w.process.sentinel for w in workers]
+            ready = wait_connections(handles, timeout=POLL_SECONDS)
+            for worker in workers:
+                if worker.results in ready:
+                    self._receive(worker)
+                if worker.process.sentinel in ready:
+                    self._exited(worker)
+
+    def _receive(self, worker):
+        try:
+            key, batch = worker.results.recv()
+        except (EOFError, OSError):
+            worker.drained = True
+            return
+        with self._lock:
+            worker.keys.discard(key)
+            future = self._futures.pop(key, None)
+            self.batches += 1
+            self.bytes_received += len(batch)
+            self._dispatch()
+        if future is None:
+            return
+        try:
+            value, error = decode_batch(batch)
+        except Exception as e:
+            future.set_exception(WorkerError(f"Unreadable result batch: {str(e)}"))
+            return
+        if error:
+            future.set_exception(WorkerError(error))
+        else:
+            future.set_result(value)
+
+    def _exited(self, worker):
+        # Results the worker sent before it exited come first.
+        while not worker.drained and worker.results.poll():
+            self._receive(worker)
+        worker.process.join()
+        worker.results.close()
+        worker.tasks.close()
+        code = worker.process.exitcode
+        with self._lock:
+            self._workers.remove(worker)
+            lost = sorted(worker.keys)
+            if lost or code:
+                self.lost_workers += 1
+            for key in lost:
+                self._fail(key, WorkerError(f"Worker process exited with code {code} during the scan"))
+            # The other workers take over the accounts not started yet.
+            self._dispatch()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """
+        Stops taking accounts. With 'cancel_futures', accounts not started are cancelled and the
+        workers cancel their scans in progress. Workers exit once their accounts are done.
+        """
+        with self._lock:
+            self._closed = True
+            if cancel_futures:
+                for key, _ in self._pending:
+                    self._fail(key, CancelledError())
+                self._pending.clear()
+                for worker in self._workers:
+                    if not worker.closed:
+                        self._send(worker, ("stop",))
+            self._dispatch()
+        if wait:
+            self._reader.join()